@@ -59,7 +59,8 @@ from qfluentwidgets import (
     setTheme,
 )
 
-from tools.danqing.entry import load_cards_export, run as run_danqing
+from tools.danqing.cache import ResultCache
+from tools.danqing.entry import load_card_catalog, run as run_danqing
 from tools.tianshu.entry import find_talents_dir as find_tianshu_talents_dir
 from tools.hongjun.qt_interface import HongjunInterface
 
@@ -529,6 +530,8 @@ class DanqingParams:
     base_dps: float
     max_time: float
     seed: int | None
+    runs: int = 1
+    ci_stop: float | None = None
 
 
 class DanqingWorker(QObject):
@@ -536,14 +539,16 @@ class DanqingWorker(QObject):
     finished = pyqtSignal(str)
     failed = pyqtSignal(str)
 
-    def __init__(self, params: DanqingParams):
+    def __init__(self, params: DanqingParams, cache: ResultCache | None = None):
         super().__init__()
         self.params = params
+        self.cache = cache
 
     def run(self):
         started_at = time.time()
         self.log.emit(
-            f"开始运行：卡牌数={len(self.params.deck_ids)} 等级={self.params.level} 攻击={int(self.params.base_atk)} 气血={int(self.params.base_hp)} 秒伤={int(self.params.base_dps)} 时长={int(self.params.max_time)}秒"
+            f"开始运行：卡牌数={len(self.params.deck_ids)} 等级={self.params.level} 攻击={int(self.params.base_atk)} 气血={int(self.params.base_hp)} 秒伤={int(self.params.base_dps)} 时长={int(self.params.max_time)}秒 次数={self.params.runs}"
+            + (f"（95%置信区间半宽≤{self.params.ci_stop * 100:g}% 时提前停止）" if self.params.ci_stop else "")
         )
         try:
             result = run_danqing(
@@ -554,10 +559,13 @@ class DanqingWorker(QObject):
                 base_dps=self.params.base_dps,
                 max_time=self.params.max_time,
                 seed=self.params.seed,
+                runs=self.params.runs,
+                cache=self.cache,
+                ci_stop=self.params.ci_stop,
             )
             payload = json.dumps(result, ensure_ascii=False, indent=2)
             elapsed = time.time() - started_at
-            self.log.emit(f"运行完成：{elapsed:.2f}s")
+            self.log.emit(f"运行完成：{elapsed:.2f}s{'（命中缓存）' if result.get('cached') else ''}")
             self.finished.emit(payload)
         except Exception:
             err = traceback.format_exc()
@@ -618,20 +626,33 @@ class _DanqingBoardCard(CardWidget):
 
 
 class DanqingInterface(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, storage_dir: str | None = None, parent=None):
         super().__init__(parent=parent)
         self.setObjectName("danqing")
         self._thread: QThread | None = None
         self._worker: DanqingWorker | None = None
+        self._cache: ResultCache | None = None
+        if storage_dir:
+            try:
+                self._cache = ResultCache(os.path.join(storage_dir, "results-v1"))
+            except OSError:
+                self._cache = None
         self._deck_history: list[str] = []
         self._cards: list[dict] = []
         self._id_to_name: dict[str, str] = {}
         self._name_to_id: dict[str, str] = {}
         self._stats_table: dict[int, list[dict]] = {}
+        self._value_table = None
         self._default_level = 6
         self._base_atk = 10000.0
         self._base_hp = 200000.0
         self._base_dps = 50000.0
+        self._runs = 20
+        # 提前停止：95% 置信区间半宽占均值的比例（0 为关闭，固定模拟 _runs 次），开启时 _ci_max_runs 为次数上限
+        self._ci_stop = 0.0
+        self._ci_max_runs = 500
+        # 主种子：默认不固定（每次点击重新抽样）；在属性设置里填了种子后结果可复现，也只有这时才读写结果缓存
+        self._seed: int | None = None
         self._accent = "#00E5FF"
         self._bg = "#121212"
         self._panel = "#1E1E1E"
@@ -892,7 +913,7 @@ class DanqingInterface(QWidget):
             deck_ids.append(t)
         level = self._default_level
         max_time = 180.0
-        seed = None
+        seed = self._seed
 
         params = DanqingParams(
             deck_ids=deck_ids,
@@ -902,6 +923,8 @@ class DanqingInterface(QWidget):
             base_dps=float(self._base_dps),
             max_time=max_time,
             seed=seed,
+            runs=int(self._ci_max_runs if self._ci_stop > 0 else self._runs),
+            ci_stop=float(self._ci_stop) if self._ci_stop > 0 else None,
         )
 
         self.run_btn.setEnabled(False)
@@ -915,7 +938,7 @@ class DanqingInterface(QWidget):
         InfoBar.info("开始", "丹青模拟器正在运行", parent=self, position=InfoBarPosition.TOP, duration=1500)
 
         thread = QThread(self)
-        worker = DanqingWorker(params)
+        worker = DanqingWorker(params, cache=self._cache)
         worker.moveToThread(thread)
 
         thread.started.connect(worker.run)
@@ -1010,51 +1033,23 @@ class DanqingInterface(QWidget):
 
     def _load_cards(self):
         try:
-            raw = load_cards_export()
-            cards = raw.get("cards") if isinstance(raw, dict) else None
-            if not isinstance(cards, list):
-                cards = []
-            stats_table = raw.get("statsTable") if isinstance(raw, dict) else None
+            catalog = load_card_catalog()
         except Exception:
-            cards = []
-            stats_table = None
-        self._cards = [c for c in cards if isinstance(c, dict)]
-        self._cards.sort(key=lambda c: (int(c.get("cost", 0) or 0), str(c.get("name", ""))))
-
-        self._id_to_name = {}
-        self._name_to_id = {}
-        for c in self._cards:
-            cid = str(c.get("id", "") or "").strip()
-            name = str(c.get("name", "") or "").strip()
-            if cid:
-                self._id_to_name[cid] = name or cid
-            if name and cid and name not in self._name_to_id:
-                self._name_to_id[name] = cid
-
-        self._stats_table = {}
-        if isinstance(stats_table, dict):
-            for k, v in stats_table.items():
-                try:
-                    cost_key = int(k)
-                except Exception:
-                    continue
-                if not isinstance(v, list):
-                    continue
-                rows = [x for x in v if isinstance(x, dict)]
-                if rows:
-                    self._stats_table[cost_key] = rows
-
-        cats = []
-        seen = set()
-        for c in self._cards:
-            cat = c.get("category")
-            if not isinstance(cat, str) or not cat:
-                continue
-            if cat in seen:
-                continue
-            seen.add(cat)
-            cats.append(cat)
-        cats.sort()
+            catalog = None
+        if catalog is None:
+            self._cards = []
+            self._value_table = None
+            self._id_to_name = {}
+            self._name_to_id = {}
+            self._stats_table = {}
+            cats = []
+        else:
+            self._cards = sorted(catalog.cards, key=lambda c: (int(c.get("cost", 0) or 0), str(c.get("name", ""))))
+            self._value_table = catalog.value_table
+            self._id_to_name = {cid: str(c.get("name", "") or "").strip() or cid for cid, c in catalog.by_id.items()}
+            self._name_to_id = {name: c["id"] for name, c in catalog.by_name.items() if isinstance(c.get("id"), str) and c["id"]}
+            self._stats_table = {cost: list(rows) for cost, rows in catalog.stats_table.items()}
+            cats = sorted(catalog.by_category)
         self.board_category.blockSignals(True)
         self.board_category.clear()
         self.board_category.addItem("全部", None)
@@ -1179,6 +1174,26 @@ class DanqingInterface(QWidget):
         row_dps.addWidget(dps_input, 1)
         layout.addLayout(row_dps)
 
+        row_ci = QHBoxLayout()
+        row_ci.setSpacing(10)
+        row_ci.addWidget(BodyLabel("提前停止（%）"), 0)
+        ci_input = LineEdit()
+        ci_input.setText(f"{self._ci_stop * 100:g}")
+        ci_input.setPlaceholderText("0 为关闭")
+        ci_input.setToolTip(f"95% 置信区间半宽不超过 DPS 均值的该百分比时停止模拟（最多 {self._ci_max_runs} 次）；0 为固定模拟 {self._runs} 次")
+        row_ci.addWidget(ci_input, 1)
+        layout.addLayout(row_ci)
+
+        row_seed = QHBoxLayout()
+        row_seed.setSpacing(10)
+        row_seed.addWidget(BodyLabel("种子"), 0)
+        seed_input = LineEdit()
+        seed_input.setText("" if self._seed is None else str(self._seed))
+        seed_input.setPlaceholderText("留空为随机")
+        seed_input.setToolTip("填入整数后同样的卡组和属性结果可复现，重复运行直接读取缓存；留空时每次运行重新抽样，不使用缓存")
+        row_seed.addWidget(seed_input, 1)
+        layout.addLayout(row_seed)
+
         btns = QHBoxLayout()
         btns.setSpacing(10)
         btns.addStretch(1)
@@ -1197,6 +1212,21 @@ class DanqingInterface(QWidget):
             if atk is None or hp is None or dps is None or atk <= 0 or hp <= 0 or dps < 0:
                 InfoBar.error("输入无效", "请填入有效数字（如 10000 / 20w / 50k）", parent=self, position=InfoBarPosition.TOP, duration=2000)
                 return
+            try:
+                ci_pct = float(ci_input.text().strip().rstrip("%") or 0)
+            except ValueError:
+                ci_pct = -1.0
+            if ci_pct < 0 or ci_pct >= 100:
+                InfoBar.error("输入无效", "提前停止请填入 0~100 之间的百分比（0 为关闭）", parent=self, position=InfoBarPosition.TOP, duration=2000)
+                return
+            seed_text = seed_input.text().strip()
+            try:
+                seed = int(seed_text) if seed_text else None
+            except ValueError:
+                InfoBar.error("输入无效", "种子请填入整数（留空为随机）", parent=self, position=InfoBarPosition.TOP, duration=2000)
+                return
+            self._seed = seed
+            self._ci_stop = ci_pct / 100.0
             self._base_atk = float(atk)
             self._base_hp = float(hp)
             self._base_dps = float(dps)
@@ -1204,7 +1234,7 @@ class DanqingInterface(QWidget):
             self._render_board()
             InfoBar.success(
                 "已更新",
-                f"攻击={int(self._base_atk)} 气血={int(self._base_hp)} 秒伤={int(self._base_dps)}",
+                f"攻击={int(self._base_atk)} 气血={int(self._base_hp)} 秒伤={int(self._base_dps)} 种子={'随机' if self._seed is None else self._seed}",
                 parent=self,
                 position=InfoBarPosition.TOP,
                 duration=1500,
@@ -1303,6 +1333,21 @@ class DanqingInterface(QWidget):
             return ""
         return f"核心+{core}  体+{body}"
 
+    def _card_value(self, card: dict, level: int) -> float:
+        cid = str(card.get("id", "") or "")
+        if self._value_table is not None:
+            try:
+                v = self._value_table.value(cid, int(level))
+            except Exception:
+                v = None
+            if v is not None:
+                return float(v)
+        model = card.get("dpsModel") if isinstance(card.get("dpsModel"), dict) else {}
+        scaling = model.get("scaling") if isinstance(model.get("scaling"), dict) else {}
+        base = float(scaling.get("base", 0) or 0)
+        step = float(scaling.get("step", 0) or 0)
+        return base + float(level) * step
+
     def _display_skill_text(self, card: dict, level: int) -> str:
         level = int(getattr(self, "_default_level", level) or level)
         desc = str(card.get("skillDescription", "") or "")
@@ -1311,10 +1356,7 @@ class DanqingInterface(QWidget):
         cid = str(card.get("id", "") or "")
         if t != "ATTRIBUTE_CONVERSION":
             if t == "ATTACK_SCALING":
-                scaling = model.get("scaling") if isinstance(model.get("scaling"), dict) else {}
-                base = float(scaling.get("base", 0) or 0)
-                step = float(scaling.get("step", 0) or 0)
-                ratio = base + float(level) * step
+                ratio = self._card_value(card, level)
                 dmg = ratio * float(self._base_atk)
                 params = model.get("params") if isinstance(model.get("params"), dict) else {}
                 cd = params.get("cd")
@@ -1336,10 +1378,7 @@ class DanqingInterface(QWidget):
                 return self._resolve_skill_formula(desc, level)
 
             if t == "GLOBAL_MULTIPLIER":
-                scaling = model.get("scaling") if isinstance(model.get("scaling"), dict) else {}
-                base = float(scaling.get("base", 0) or 0)
-                step = float(scaling.get("step", 0) or 0)
-                value = base + float(level) * step
+                value = self._card_value(card, level)
                 pct = value * 100
                 try:
                     pct_text = f"{pct:.2f}%"
@@ -1352,10 +1391,7 @@ class DanqingInterface(QWidget):
                 return desc
 
             if t == "SPECIAL_DMG_MULTIPLIER":
-                scaling = model.get("scaling") if isinstance(model.get("scaling"), dict) else {}
-                base = float(scaling.get("base", 0) or 0)
-                step = float(scaling.get("step", 0) or 0)
-                value = base + float(level) * step
+                value = self._card_value(card, level)
                 pct = value * 100
                 try:
                     pct_text = f"{pct:.0f}%"
@@ -1366,10 +1402,7 @@ class DanqingInterface(QWidget):
                 return desc
 
             if t == "SYNERGY_MULTIPLIER":
-                scaling = model.get("scaling") if isinstance(model.get("scaling"), dict) else {}
-                base = float(scaling.get("base", 0) or 0)
-                step = float(scaling.get("step", 0) or 0)
-                value = base + float(level) * step
+                value = self._card_value(card, level)
                 pct = (value - 1) * 100
                 try:
                     pct_text = f"{pct:.0f}%"
@@ -1380,10 +1413,7 @@ class DanqingInterface(QWidget):
                 return desc
 
             if t == "STACK_EXPLODE":
-                scaling = model.get("scaling") if isinstance(model.get("scaling"), dict) else {}
-                base = float(scaling.get("base", 0) or 0)
-                step = float(scaling.get("step", 0) or 0)
-                ratio = base + float(level) * step
+                ratio = self._card_value(card, level)
                 dmg = ratio * float(self._base_atk)
                 try:
                     dmg_int = int(round(dmg))
@@ -1394,10 +1424,7 @@ class DanqingInterface(QWidget):
                 return desc
 
             return self._resolve_skill_formula(desc, level)
-        scaling = model.get("scaling") if isinstance(model.get("scaling"), dict) else {}
-        base = float(scaling.get("base", 0) or 0)
-        step = float(scaling.get("step", 0) or 0)
-        value = base + float(level) * step
+        value = self._card_value(card, level)
         attr = ""
         params = model.get("params") if isinstance(model.get("params"), dict) else {}
         a = str(params.get("attribute", "") or "")
@@ -1542,6 +1569,25 @@ class DanqingInterface(QWidget):
             lines.append(f"战斗时长：{combat_time_f:.1f} 秒")
         if dps_int is not None:
             lines.append(f"最终 DPS：{dps_int:,}")
+        runs = obj.get("runs")
+        dps_stats = obj.get("dps_stats") if isinstance(obj.get("dps_stats"), dict) else {}
+        if runs and dps_stats:
+            try:
+                lines.append(
+                    f"模拟次数：{int(runs)}    标准差：{int(dps_stats.get('stdev') or 0):,}    "
+                    f"P5/P50/P95：{int(dps_stats.get('p5') or 0):,} / {int(dps_stats.get('p50') or 0):,} / {int(dps_stats.get('p95') or 0):,}"
+                )
+            except Exception:
+                pass
+        ci_stop = obj.get("ci_stop") if isinstance(obj.get("ci_stop"), dict) else None
+        if ci_stop:
+            try:
+                lines.append(
+                    f"提前停止：95% 置信区间 ±{float(ci_stop.get('relative_half_width') or 0) * 100:.2f}%    "
+                    f"{'已达到' if ci_stop.get('stopped_early') else '未达到'}目标 ±{float(ci_stop.get('target') or 0) * 100:g}%（上限 {int(ci_stop.get('max_runs') or 0)} 次）"
+                )
+            except Exception:
+                pass
         if unknown_text:
             lines.append(f"未识别卡牌：{unknown_text}")
 
@@ -4236,12 +4282,13 @@ class MainWindow(FluentWindow):
         tianshu_talents_dir: str | None,
         wiki_dir: str,
         wiki_res2_dir: str | None,
+        danqing_storage_dir: str | None = None,
     ):
         super().__init__()
         self.setWindowTitle(f"{app_name} v{version}")
         self.resize(1180, 720)
 
-        danqing = DanqingInterface(self)
+        danqing = DanqingInterface(storage_dir=danqing_storage_dir, parent=self)
         self.addSubInterface(danqing, FluentIcon.APPLICATION, "丹青模拟器", position=NavigationItemPosition.TOP)
 
         rili_web = WebViewInterface(
@@ -4344,9 +4391,11 @@ def start(app_name: str = "OK-ZhuXian World", version: str = "1.0"):
         storage_root = os.path.join(_user_data_root(app_name), "storage")
         rili_storage_dir = os.path.join(storage_root, "rili")
         tianshu_storage_dir = os.path.join(storage_root, "tianshu")
+        danqing_storage_dir = os.path.join(storage_root, "danqing")
     else:
         rili_storage_dir = os.path.join(project_root, "tools", "rili", "storage")
         tianshu_storage_dir = os.path.join(project_root, "tools", "tianshu", "storage")
+        danqing_storage_dir = os.path.join(project_root, "tools", "danqing", "storage")
     tianshu_talents_dir = find_tianshu_talents_dir(project_root)
     wiki_dir = os.path.join(project_root, "tools", "wiki", "res1")
     wiki_res2_dir = os.path.join(project_root, "tools", "wiki", "res2")
@@ -4360,6 +4409,7 @@ def start(app_name: str = "OK-ZhuXian World", version: str = "1.0"):
         tianshu_talents_dir=tianshu_talents_dir,
         wiki_dir=wiki_dir,
         wiki_res2_dir=wiki_res2_dir,
+        danqing_storage_dir=danqing_storage_dir,
     )
     w.show()
     app.exec()
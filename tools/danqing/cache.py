@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_FORMAT = 1
+
+
+def file_digest(path: str) -> str:
+    """文件内容的 sha256；文件不可读时返回空串（此时缓存键仍然可用，只是不随文件失效）"""
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                h.update(block)
+    except OSError:
+        return ""
+    return h.hexdigest()
+
+
+# 影响模拟结果的模块；core 包下能枚举到的其他模块也会并入，新增模块忘了登记也能让旧缓存失效
+ENGINE_MODULES = (
+    "tools.danqing.core.cards_sim_ver1",
+    "tools.danqing.core.catalog",
+    "tools.danqing.core.deck_search",
+    "tools.danqing.core.event_queue",
+    "tools.danqing.core.expected",
+    "tools.danqing.core.lockstep",
+    "tools.danqing.core.multi_target",
+    "tools.danqing.core.racing",
+    "tools.danqing.core.timeline",
+    "tools.danqing.core.upgrade_search",
+    "tools.danqing.core.variance",
+    "tools.danqing.entry",
+)
+# core 包下不参与模拟的模块：基准脚本与改版前引擎的冻结副本
+NON_ENGINE_MODULES = ("tools.danqing.core.bench", "tools.danqing.core.reference_sim")
+
+
+def _core_module_names() -> list:
+    """core 包下可枚举的模块名；打包后（PyInstaller）或目录缺失时枚举不到也不报错"""
+    try:
+        import pkgutil
+
+        from tools.danqing import core
+
+        return [f"{core.__name__}.{info.name}" for info in pkgutil.iter_modules(core.__path__)]
+    except Exception:
+        return []
+
+
+def module_digest(name: str) -> str:
+    """已导入模块的指纹：优先取源码，取不到（打包后只有字节码）时取 code 对象的 marshal 序列化；都取不到时返回空串"""
+    import importlib
+    import marshal
+    import sys
+
+    try:
+        module = importlib.import_module(name)
+        loader = getattr(module, "__loader__", None) or getattr(getattr(module, "__spec__", None), "loader", None)
+        source = loader.get_source(name) if hasattr(loader, "get_source") else None
+        if source is not None:
+            return hashlib.sha256(source.encode("utf-8")).hexdigest()
+        code = loader.get_code(name) if hasattr(loader, "get_code") else None
+        if code is not None:
+            # marshal 格式随解释器版本变化，版本号一并计入
+            return hashlib.sha256(f"{sys.version_info[:2]}".encode("ascii") + marshal.dumps(code)).hexdigest()
+    except Exception:
+        pass
+    return ""
+
+
+def engine_version() -> str:
+    """模拟引擎代码的指纹：任一引擎模块或结果组装代码改动后旧缓存自动失效
+
+    按模块名导入后取源码或字节码，不依赖 core 目录存在（打包后的程序模块在归档里，没有这个目录）。
+    某个模块取不到指纹时退回记录所在程序的路径与版本：缓存仍然可用，只是换版本前不会因该模块改动而失效。
+    """
+    import sys
+
+    names = sorted(set(ENGINE_MODULES) | set(_core_module_names()) - set(NON_ENGINE_MODULES))
+    parts = [f"format={CACHE_FORMAT}"]
+    for name in names:
+        # 模块名也计入指纹，新增或删除模块同样会让旧缓存失效
+        parts.append(f"{name}={module_digest(name) or 'unavailable'}")
+    if getattr(sys, "frozen", False) or any(part.endswith("=unavailable") for part in parts):
+        parts.append(f"executable={sys.executable}|{sys.version}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def make_cache_key(params: dict) -> str:
+    """规范化参数后的哈希：卡组按ID排序，数值统一为浮点/整数"""
+    canonical = {
+        "deck": sorted(str(x).strip() for x in (params.get("deck_ids") or []) if str(x).strip()),
+        "level": int(params.get("level") or 0),
+        "card_levels": {str(k): int(v) for k, v in sorted((params.get("card_levels") or {}).items())},
+        "base_atk": float(params.get("base_atk") or 0.0),
+        "base_hp": float(params.get("base_hp") or 0.0),
+        "base_dps": float(params.get("base_dps") or 0.0),
+        "max_time": float(params.get("max_time") or 0.0),
+        "seed": params.get("seed"),
+        "runs": int(params.get("runs") or 1),
+        "steady_state": bool(params.get("steady_state")),
+        "timeline": float(params["timeline"]) if params.get("timeline") else None,
+        "n_targets": max(1, int(params.get("n_targets") or 1)),
+        "ci_stop": float(params["ci_stop"]) if params.get("ci_stop") else None,
+        "backend": str(params.get("backend") or "event"),
+        "engine": str(params.get("engine") or ""),
+        "cards": str(params.get("cards") or ""),
+    }
+    raw = json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """模拟结果缓存：内存 LRU 在前，磁盘目录在后
+
+    磁盘上每个结果一个 JSON 文件，总大小超过 max_disk_bytes 时按最近访问时间淘汰。
+    结果以 JSON 文本保存，命中时返回新解析的对象，调用方修改不会污染缓存。
+    """
+
+    def __init__(self, storage_dir: str, max_memory_entries: int = 256, max_disk_bytes: int = 64 * 1024 * 1024):
+        self.storage_dir = storage_dir
+        os.makedirs(self.storage_dir, exist_ok=True)
+        self.max_memory_entries = max(1, int(max_memory_entries))
+        self.max_disk_bytes = max(0, int(max_disk_bytes))
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.storage_dir, f"{key}.json")
+
+    def _remember(self, key: str, payload: str):
+        self._memory[key] = payload
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+            else:
+                path = self._path(key)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        payload = f.read()
+                    os.utime(path)
+                except OSError:
+                    payload = None
+                if payload is not None:
+                    self._remember(key, payload)
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        try:
+            return json.loads(payload)
+        except ValueError:
+            self.invalidate(key)
+            return None
+
+    def put(self, key: str, result) -> None:
+        payload = json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._remember(key, payload)
+            if self.max_disk_bytes <= 0:
+                return
+            path = self._path(key)
+            tmp_path = f"{path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except OSError:
+                return
+            self._evict_disk()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            for name in os.listdir(self.storage_dir):
+                if name.endswith(".json"):
+                    try:
+                        os.remove(os.path.join(self.storage_dir, name))
+                    except OSError:
+                        pass
+
+    def _evict_disk(self):
+        """磁盘总量超限时删除最久未访问的结果文件"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.storage_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.storage_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        if total <= self.max_disk_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,1164 @@
+"""丹青模拟器微基准
+
+用法: python -m tools.danqing.core.bench
+      python -m tools.danqing.core.bench check [名称...]   # 只运行统计一致性检查，未通过时退出码非零
+"""
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import deque
+from typing import List, Optional
+
+from tools.danqing.cache import ENGINE_MODULES, engine_version, file_digest, module_digest
+from tools.danqing.core.cards_sim_ver1 import MAX_CARD_LEVEL, CardValueTable, DanqingEventSimulator, SteadyStateDetector, Event, iter_deck_combinations, spawn_seeds
+from tools.danqing.core.catalog import CardCatalog
+from tools.danqing.core.event_queue import QUEUE_BACKENDS, make_event_queue
+from tools.danqing.core.expected import ExpectedValueSimulator
+from tools.danqing.core.lockstep import LockstepSimulator
+from tools.danqing.core.multi_target import MultiTargetSimulator
+from tools.danqing.core.racing import race_decks
+from tools.danqing.core.reference_sim import ReferenceSimulator
+from tools.danqing.core.upgrade_search import AllocationEvaluator, optimize_upgrades
+from tools.danqing.core.variance import rank_decks
+
+
+def _default_cards_path() -> str:
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "cards_export.json"))
+
+
+def load_bench_deck(cards_path: Optional[str] = None) -> List[dict]:
+    """读取全部卡牌作为基准卡组"""
+    with open(cards_path or _default_cards_path(), "r", encoding="utf-8") as f:
+        return list(json.load(f).get("cards") or [])
+
+
+def record_event_trace(deck: List[dict], max_time: float = 3600.0, seed: int = 1) -> List[tuple]:
+    """记录一场战斗的队列操作序列：('push', 时间, 优先级, 类型, 槽位) 或 ('pop',)"""
+    sim = DanqingEventSimulator(10000.0, 50000.0)
+    trace = []
+    make_queue = sim._make_queue
+
+    def recording_queue():
+        queue = make_queue()
+        push, pop = queue.push, queue.pop
+
+        def recording_push(entry):
+            trace.append(("push", entry[0], entry[1], entry[3], entry[4]))
+            push(entry)
+
+        def recording_pop():
+            trace.append(("pop",))
+            return pop()
+
+        queue.push = recording_push
+        queue.pop = recording_pop
+        return queue
+
+    sim._make_queue = recording_queue
+    sim.simulate(deck, max_time=max_time, seed=seed, stop_on_target=False)
+    return trace
+
+
+def _replay_dataclass(trace: List[tuple], keep: list):
+    queue = []
+    for op in trace:
+        if op[0] == "push":
+            _, event_time, priority, kind, slot = op
+            heapq.heappush(queue, Event(time=event_time, event_type=kind, data={"slot": slot, "cooldown": 0.0}, priority=priority))
+        else:
+            keep.append(heapq.heappop(queue))
+
+
+def _replay_tuple(trace: List[tuple], keep: list):
+    queue = []
+    seq = 0
+    for op in trace:
+        if op[0] == "push":
+            _, event_time, priority, kind, slot = op
+            heapq.heappush(queue, (event_time, priority, seq, kind, slot))
+            seq += 1
+        else:
+            keep.append(heapq.heappop(queue))
+
+
+def bench_event_queue(max_time: float = 3600.0, repeat: int = 5, cards_path: Optional[str] = None) -> dict:
+    """对比 Event 数据类与元组条目的堆吞吐量和分配量"""
+    trace = record_event_trace(load_bench_deck(cards_path), max_time=max_time)
+    ops = len(trace)
+    result = {"max_time": max_time, "ops": ops}
+    for name, replay in (("dataclass", _replay_dataclass), ("tuple", _replay_tuple)):
+        best = None
+        for _ in range(repeat):
+            keep = []
+            start = time.perf_counter()
+            replay(trace, keep)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        # 保留弹出的条目，使统计值为累计分配量
+        keep = []
+        tracemalloc.start()
+        replay(trace, keep)
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result[name] = {
+            "seconds": best,
+            "ops_per_sec": ops / best if best else 0.0,
+            "allocated_bytes": allocated,
+            "bytes_per_event": allocated / max(1, len(keep)),
+        }
+    return result
+
+
+ICE_ARROW_DECK = ("yanhong", "wenmin", "linfeng", "shangguance", "bear", "icearrow_card", "qihao")
+
+
+def record_bear_trace(deck: List[dict], max_time: float, seed: int = 1) -> List[tuple]:
+    """记录雪地熊层数的施加时间与查询时间：('add', 过期时间) 或 ('query', 时间)"""
+    sim = DanqingEventSimulator(10000.0, 50000.0)
+    trace = []
+    trigger = sim._trigger_ice_arrow_effects
+    multiplier = sim._get_ice_arrow_multiplier
+
+    def recording_trigger(state, plan):
+        for _ in plan.bear_multipliers:
+            trace.append(("add", state.current_time + 10.0))
+        trigger(state, plan)
+
+    def recording_multiplier(state):
+        trace.append(("query", state.current_time))
+        return multiplier(state)
+
+    sim._trigger_ice_arrow_effects = recording_trigger
+    sim._get_ice_arrow_multiplier = recording_multiplier
+    sim.simulate(deck, max_time=max_time, seed=seed, stop_on_target=False)
+    return trace
+
+
+def _replay_bear_list(trace: List[tuple], mult: float) -> float:
+    expires = []
+    total = 0.0
+    for op, t in trace:
+        if op == "add":
+            expires.append(t)
+        else:
+            expires = [e for e in expires if float(e) > t]
+            total += mult ** len(expires)
+    return total
+
+
+def _replay_bear_deque(trace: List[tuple], mult: float) -> float:
+    expires = deque()
+    powers = [1.0]
+    total = 0.0
+    for op, t in trace:
+        if op == "add":
+            expires.append(t)
+        else:
+            while expires and expires[0] <= t:
+                expires.popleft()
+            stacks = len(expires)
+            while len(powers) <= stacks:
+                powers.append(mult ** len(powers))
+            total += powers[stacks]
+    return total
+
+
+def bench_bear_stacks(horizons=(600.0, 3600.0), repeat: int = 5, cards_path: Optional[str] = None) -> List[dict]:
+    """对比列表重建与双端队列的雪地熊层数追踪，并测量冰箭卡组整场耗时"""
+    deck = [c for c in load_bench_deck(cards_path) if c.get("id") in ICE_ARROW_DECK]
+    rows = []
+    for max_time in horizons:
+        trace = record_bear_trace(deck, max_time)
+        row = {"max_time": max_time, "adds": sum(1 for op, _ in trace if op == "add"), "queries": sum(1 for op, _ in trace if op == "query")}
+        for name, replay in (("list", _replay_bear_list), ("deque", _replay_bear_deque)):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                replay(trace, 1.01)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            row[name] = best
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            DanqingEventSimulator(10000.0, 50000.0).simulate(deck, max_time=max_time, seed=1, stop_on_target=False)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        row["simulate"] = best
+        rows.append(row)
+    return rows
+
+
+ANALYTIC_DECKS = {
+    "确定性": ("yanhong", "fan", "zuogui", "tiger", "banner", "woodsword"),
+    "齐昊折扇": ("qihao", "fan", "zuogui", "zhouyixian"),
+    "混合": ("yanhong", "wenmin", "fan", "ant", "twotails", "sixtails"),
+}
+
+
+def bench_analytic(max_time: float = 300.0, stop_on_target: bool = True, repeat: int = 20, cards_path: Optional[str] = None) -> List[dict]:
+    """对比确定性来源走闭式解与全部走事件循环的单场耗时"""
+    cards = load_bench_deck(cards_path)
+    rows = []
+    for name, ids in ANALYTIC_DECKS.items():
+        deck = [c for c in cards if c.get("id") in ids]
+        row = {"deck": name}
+        for mode, analytic in (("event", False), ("analytic", True)):
+            sim = DanqingEventSimulator(10000.0, 50000.0, analytic=analytic)
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                sim.simulate(deck, max_time=max_time, seed=1, stop_on_target=stop_on_target)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            row[mode] = best
+        rows.append(row)
+    return rows
+
+
+def _combinations_dp_table(costs: List[int], target_cost: int) -> List[List[int]]:
+    """旧版优化器的组合生成：保存每个中间费用的全部组合"""
+    dp = [[] for _ in range(target_cost + 1)]
+    dp[0] = [[]]
+    for i, card_cost in enumerate(costs):
+        for cost in range(target_cost, card_cost - 1, -1):
+            for combo in dp[cost - card_cost]:
+                dp[cost].append(combo + [i])
+    return dp[target_cost]
+
+
+def bench_combinations(target_costs=(10, 16), cards_path: Optional[str] = None) -> List[dict]:
+    """对比动态规划表与流式生成器的组合枚举耗时和内存峰值"""
+    costs = [int(c.get("cost", 0) or 0) for c in load_bench_deck(cards_path)]
+    rows = []
+    for target_cost in target_costs:
+        row = {"cost": target_cost}
+        for name, enumerate_all in (
+            ("dp", lambda: len(_combinations_dp_table(costs, target_cost))),
+            ("stream", lambda: sum(1 for _ in iter_deck_combinations(costs, target_cost))),
+        ):
+            start = time.perf_counter()
+            row["count"] = enumerate_all()
+            elapsed = time.perf_counter() - start
+            # 内存峰值单独再跑一遍，避免 tracemalloc 的开销计入耗时
+            tracemalloc.start()
+            enumerate_all()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            row[name] = {"seconds": elapsed, "peak_bytes": peak}
+        rows.append(row)
+    return rows
+
+
+PROC_DECKS = {
+    "冰箭燃烧": ("linfeng", "shangguance", "icearrow_card", "qihao", "ant", "yanhong"),
+    "脉冲触发": ("fan", "dice", "mirror", "suishou", "zuogui", "wenmin"),
+}
+
+
+def check_binomial_equivalence(n_seeds: int = 300, max_time: float = 180.0, cards_path: Optional[str] = None) -> List[dict]:
+    """二项分布抽样与逐次掷骰的统计等价性：同一组种子下比较各项均值的 Welch z 值"""
+    cards = load_bench_deck(cards_path)
+    card_levels = {"linfeng": 3}
+    rows = []
+    for name, ids in PROC_DECKS.items():
+        deck = [c for c in cards if c.get("id") in ids]
+        samples = {}
+        for mode, binomial in (("trial", False), ("binomial", True)):
+            sim = DanqingEventSimulator(10000.0, 50000.0, binomial=binomial)
+            metrics = {}
+            start = time.perf_counter()
+            for seed in range(n_seeds):
+                res = sim.simulate(deck, max_time=max_time, seed=seed, stop_on_target=False, card_levels=card_levels)
+                metrics.setdefault("total_damage", []).append(res["total_damage"])
+                for key, value in res["event_counts"].items():
+                    metrics.setdefault(key, []).append(value)
+            samples[mode] = (metrics, time.perf_counter() - start)
+        row = {"deck": name, "trial_seconds": samples["trial"][1], "binomial_seconds": samples["binomial"][1], "z": {}}
+        for key, a in samples["trial"][0].items():
+            b = samples["binomial"][0][key]
+            se = math.sqrt(statistics.variance(a) / len(a) + statistics.variance(b) / len(b))
+            row["z"][key] = _z_score(statistics.fmean(b) - statistics.fmean(a), se, statistics.fmean(a))
+        rows.append(row)
+    return rows
+
+
+def _z_score(diff: float, se: float, scale: float) -> float:
+    """均值差除以标准误；两边都没有方差时，相等（相对误差 1e-9 以内）记 0，否则记无穷大"""
+    if se > 0:
+        return diff / se
+    return 0.0 if abs(diff) <= 1e-9 * max(1.0, abs(scale)) else math.copysign(float("inf"), diff)
+
+
+def assert_binomial_equivalence(n_seeds: int = 300, z_limit: float = 3.0, cards_path: Optional[str] = None) -> List[dict]:
+    """check_binomial_equivalence 的断言版：任一卡组任一指标 |z| >= z_limit 即抛出 AssertionError"""
+    rows = check_binomial_equivalence(n_seeds, cards_path=cards_path)
+    failures = [f"{row['deck']} {key} z={z:+.2f}" for row in rows for key, z in row["z"].items() if not abs(z) < z_limit]
+    if failures:
+        raise AssertionError(f"二项分布抽样与逐次掷骰不一致（|z| >= {z_limit}）：" + "；".join(failures))
+    return rows
+
+
+MIRROR_DECKS = {
+    "折扇六合镜": ("fan", "dice", "mirror", "zuogui"),
+    "冰箭脉冲": ("fan", "dice", "mirror", "icearrow_card", "yanhong", "wenmin", "linfeng"),
+}
+
+
+def peak_queue_size(trace: List[tuple]) -> int:
+    """由队列操作序列求堆的最大长度"""
+    size = peak = 0
+    for op in trace:
+        size += 1 if op[0] == "push" else -1
+        peak = max(peak, size)
+    return peak
+
+
+def bench_mirror_echo(horizons=(180.0, 3600.0), repeat: int = 10, cards_path: Optional[str] = None) -> List[dict]:
+    """六合镜卡组的队列峰值、入队次数与整场耗时"""
+    cards = load_bench_deck(cards_path)
+    rows = []
+    for name, ids in MIRROR_DECKS.items():
+        deck = [c for c in cards if c.get("id") in ids]
+        for max_time in horizons:
+            trace = record_event_trace(deck, max_time=max_time)
+            sim = DanqingEventSimulator(10000.0, 50000.0)
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                sim.simulate(deck, max_time=max_time, seed=1, stop_on_target=False)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            rows.append({
+                "deck": name,
+                "max_time": max_time,
+                "pushes": sum(1 for op in trace if op[0] == "push"),
+                "peak": peak_queue_size(trace),
+                "simulate": best,
+            })
+    return rows
+
+
+QUEUE_DECKS = {
+    "全部卡牌": None,
+    "冰箭燃烧": ("linfeng", "shangguance", "icearrow_card", "qihao", "ant", "yanhong", "bear"),
+    "脉冲触发": ("fan", "dice", "mirror", "suishou", "zuogui", "wenmin"),
+    "燃烧爆燃": ("ant", "twotails", "sixtails", "dog", "linfeng"),
+}
+
+
+def _replay_backend(trace: List[tuple], kind: str) -> List[tuple]:
+    queue = make_event_queue(kind)
+    push, pop = queue.push, queue.pop
+    out = []
+    seq = 0
+    for op in trace:
+        if op[0] == "push":
+            _, event_time, priority, kind_, slot = op
+            push((event_time, priority, seq, kind_, slot))
+            seq += 1
+        else:
+            out.append(pop())
+    return out
+
+
+def bench_queue_backends(max_time: float = 3600.0, repeat: int = 10, cards_path: Optional[str] = None) -> List[dict]:
+    """各卡组原型下二叉堆与时间轮的队列回放耗时、整场耗时，并核对出队顺序一致"""
+    cards = load_bench_deck(cards_path)
+    rows = []
+    for name, ids in QUEUE_DECKS.items():
+        deck = cards if ids is None else [c for c in cards if c.get("id") in ids]
+        trace = record_event_trace(deck, max_time=max_time)
+        orders = {}
+        row = {"deck": name, "ops": len(trace), "peak": peak_queue_size(trace)}
+        for kind in QUEUE_BACKENDS:
+            orders[kind] = _replay_backend(trace, kind)
+            sim = DanqingEventSimulator(10000.0, 50000.0, queue=kind)
+            replay_best = sim_best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                _replay_backend(trace, kind)
+                elapsed = time.perf_counter() - start
+                replay_best = elapsed if replay_best is None else min(replay_best, elapsed)
+                start = time.perf_counter()
+                sim.simulate(deck, max_time=max_time, seed=1, stop_on_target=False)
+                elapsed = time.perf_counter() - start
+                sim_best = elapsed if sim_best is None else min(sim_best, elapsed)
+            row[kind] = {"replay": replay_best, "simulate": sim_best}
+        row["same_order"] = all(orders[kind] == orders["heap"] for kind in QUEUE_BACKENDS)
+        rows.append(row)
+    return rows
+
+
+EXPECTED_DECKS = {
+    "确定性": ("yanhong", "fan", "zuogui", "tiger"),
+    "燃烧爆燃": ("ant", "twotails", "sixtails", "linfeng", "wenmin", "zuogui"),
+    "冰箭燃烧": ("linfeng", "shangguance", "icearrow_card", "qihao", "ant", "yanhong", "bear"),
+    "脉冲触发": ("fan", "dice", "mirror", "suishou", "zuogui", "wenmin", "sixtails"),
+}
+
+
+def check_expected_engine(n_runs: int = 2000, max_time: float = 180.0, cards_path: Optional[str] = None) -> List[dict]:
+    """期望值引擎与蒙特卡洛批量均值的对照：z 为均值差除以蒙特卡洛标准误"""
+    cards = load_bench_deck(cards_path)
+    card_levels = {"linfeng": 1, "suishou": 1, "shangguance": 1}
+    rows = []
+    for name, ids in EXPECTED_DECKS.items():
+        deck = [c for c in cards if c.get("id") in ids]
+        start = time.perf_counter()
+        expected = ExpectedValueSimulator(10000.0, 50000.0).simulate(deck, max_time=max_time, card_levels=card_levels)
+        expected_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        batch = DanqingEventSimulator(10000.0, 50000.0).simulate_batch(deck, n_runs, max_time=max_time, seed=1, stop_on_target=False, card_levels=card_levels)
+        batch_seconds = time.perf_counter() - start
+        se = batch["dps"]["stdev"] / math.sqrt(n_runs)
+        diff = expected["total_dps"] - batch["dps"]["mean"]
+        rows.append({
+            "deck": name,
+            "states": expected["states_peak"],
+            "expected_dps": expected["total_dps"],
+            "mc_dps": batch["dps"]["mean"],
+            "mc_se": se,
+            "z": _z_score(diff, se, batch["dps"]["mean"]),
+            "expected_seconds": expected_seconds,
+            "mc_seconds": batch_seconds,
+        })
+    return rows
+
+
+def assert_expected_engine(n_runs: int = 2000, z_limit: float = 3.0, cards_path: Optional[str] = None) -> List[dict]:
+    """check_expected_engine 的断言版：任一卡组期望值与蒙特卡洛均值的 |z| >= z_limit 即抛出 AssertionError"""
+    rows = check_expected_engine(n_runs, cards_path=cards_path)
+    failures = [f"{row['deck']} 期望 {row['expected_dps']:.1f} / 蒙特卡洛 {row['mc_dps']:.1f} z={row['z']:+.2f}" for row in rows if not abs(row["z"]) < z_limit]
+    if failures:
+        raise AssertionError(f"期望值引擎与蒙特卡洛均值不一致（|z| >= {z_limit}）：" + "；".join(failures))
+    return rows
+
+
+STEADY_DECKS = {
+    "周期循环": ("fan", "woodsword", "yanhong", "kite", "xiaohuan", "threetails", "qihao", "sixtails", "zuogui"),
+    "燃烧爆燃": ("ant", "twotails", "sixtails", "linfeng", "wenmin", "zuogui"),
+    "冰箭燃烧": ("linfeng", "shangguance", "icearrow_card", "qihao", "ant", "yanhong", "bear"),
+    "脉冲触发": ("fan", "dice", "mirror", "suishou", "zuogui", "wenmin", "sixtails"),
+    "全部卡牌": None,
+}
+
+
+def bench_steady_state(max_time: float = 3600.0, n_seeds: int = 5, cards_path: Optional[str] = None) -> List[dict]:
+    """稳态外推与完整模拟的耗时和结果差异（同一种子，耗时为每次模拟的平均值）"""
+    cards = load_bench_deck(cards_path)
+    detector = SteadyStateDetector()
+    card_levels = {"linfeng": 1, "suishou": 1, "shangguance": 1}
+    rows = []
+    for name, ids in STEADY_DECKS.items():
+        deck = [c for c in cards if ids is None or c.get("id") in ids]
+        sim = DanqingEventSimulator(10000.0, 50000.0)
+        full_seconds = steady_seconds = 0.0
+        diffs = []
+        infos = []
+        for seed in range(n_seeds):
+            start = time.perf_counter()
+            full = sim.simulate(deck, max_time=max_time, seed=seed, stop_on_target=False, card_levels=card_levels)
+            full_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            steady = sim.simulate(deck, max_time=max_time, seed=seed, stop_on_target=False, card_levels=card_levels, steady_state=detector)
+            steady_seconds += time.perf_counter() - start
+            diffs.append((steady["total_damage"] - full["total_damage"]) / full["total_damage"])
+            infos.append(steady["steady_state"])
+        detected = [info["detected_at"] for info in infos if info["mode"] is not None]
+        rows.append({
+            "deck": name,
+            "modes": sorted({str(info["mode"]) for info in infos}),
+            "detected_at": statistics.fmean(detected) if detected else None,
+            "relative_error": max(info["relative_error"] for info in infos),
+            "max_diff": max(abs(d) for d in diffs),
+            "full_seconds": full_seconds / n_seeds,
+            "steady_seconds": steady_seconds / n_seeds,
+        })
+    return rows
+
+
+HORIZONS = (60.0, 120.0, 180.0, 300.0, 600.0)
+
+
+def bench_horizon_sweep(horizons=HORIZONS, n_seeds: int = 20, cards_path: Optional[str] = None) -> List[dict]:
+    """多个战斗时长：一次推进取各时长结果 vs 每个时长单独模拟（同一种子，耗时为每个种子的平均值）"""
+    cards = load_bench_deck(cards_path)
+    decks = dict(ANALYTIC_DECKS)
+    decks["全卡"] = None
+    rows = []
+    for name, ids in decks.items():
+        deck = [c for c in cards if ids is None or c.get("id") in ids]
+        sim = DanqingEventSimulator(10000.0, 50000.0)
+        sweep_seconds = separate_seconds = 0.0
+        max_diff = 0.0
+        for seed in range(n_seeds):
+            start = time.perf_counter()
+            swept = sim.simulate_horizons(deck, horizons, seed=seed)
+            sweep_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            separate = [sim.simulate(deck, max_time=h, seed=seed, stop_on_target=False) for h in horizons]
+            separate_seconds += time.perf_counter() - start
+            for a, b in zip(swept, separate):
+                max_diff = max(max_diff, abs(a["total_damage"] - b["total_damage"]) / max(1.0, b["total_damage"]))
+        rows.append({
+            "deck": name,
+            "max_diff": max_diff,
+            "sweep_seconds": sweep_seconds / n_seeds,
+            "separate_seconds": separate_seconds / n_seeds,
+        })
+    return rows
+
+
+def bench_timeline(resolution: float = 0.1, max_time: float = 300.0, n_targets: int = 20, repeat: int = 10, cards_path: Optional[str] = None) -> List[dict]:
+    """时间线记录的额外耗时，以及用时间线读出多个目标的达标时刻 vs 每个目标单独模拟"""
+    cards = load_bench_deck(cards_path)
+    decks = dict(ANALYTIC_DECKS)
+    decks["全卡"] = None
+    # 预先导入 numpy，避免计入第一个卡组的耗时
+    DanqingEventSimulator(10000.0, 50000.0).simulate(cards, max_time=1.0, stop_on_target=False, timeline=resolution)
+    rows = []
+    for name, ids in decks.items():
+        deck = [c for c in cards if ids is None or c.get("id") in ids]
+        sim = DanqingEventSimulator(10000.0, 50000.0)
+        plain_seconds = timeline_seconds = 0.0
+        for seed in range(repeat):
+            start = time.perf_counter()
+            sim.simulate(deck, max_time=max_time, seed=seed, stop_on_target=False)
+            plain_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            result = sim.simulate(deck, max_time=max_time, seed=seed, stop_on_target=False, timeline=resolution)
+            timeline_seconds += time.perf_counter() - start
+        timeline = result["timeline"]
+        targets = [timeline.total[-1] * (i + 1) / (n_targets + 1) for i in range(n_targets)]
+        start = time.perf_counter()
+        read = [timeline.time_to_damage(target) for target in targets]
+        read_seconds = time.perf_counter() - start
+        rerun = []
+        start = time.perf_counter()
+        for target in targets:
+            sim.target_damage = target
+            rerun.append(sim.simulate(deck, max_time=max_time, seed=repeat - 1, stop_on_target=True)["combat_time"])
+        rerun_seconds = time.perf_counter() - start
+        sim.target_damage = 10_000_000
+        rows.append({
+            "deck": name,
+            "plain_seconds": plain_seconds / repeat,
+            "timeline_seconds": timeline_seconds / repeat,
+            "read_seconds": read_seconds,
+            "rerun_seconds": rerun_seconds,
+            "max_ttk_gap": max(a - b for a, b in zip(read, rerun)),
+        })
+    return rows
+
+
+def bench_ttk(n_targets: int = 20, n_runs: int = 10, max_time: float = 300.0, resolution: float = 0.1, cards_path: Optional[str] = None) -> List[dict]:
+    """多个目标血量的击杀时间：ttk_distribution 一次读出 vs 每个目标、每个随机流单独做达标即停的模拟"""
+    cards = load_bench_deck(cards_path)
+    decks = dict(ANALYTIC_DECKS)
+    decks["全卡"] = None
+    # 预先导入 numpy，避免计入第一个卡组的耗时
+    DanqingEventSimulator(10000.0, 50000.0).simulate(cards, max_time=1.0, stop_on_target=False, timeline=resolution)
+    rows = []
+    for name, ids in decks.items():
+        deck = [c for c in cards if ids is None or c.get("id") in ids]
+        sim = DanqingEventSimulator(10000.0, 50000.0)
+        full = sim.simulate(deck, max_time=max_time, seed=0, stop_on_target=False)["total_damage"]
+        targets = [full * (i + 1) / (n_targets + 1) for i in range(n_targets)]
+        start = time.perf_counter()
+        dist = sim.ttk_distribution(deck, targets, n_runs, max_time=max_time, seed=1, resolution=resolution)
+        api_seconds = time.perf_counter() - start
+        max_gap = 0.0
+        start = time.perf_counter()
+        for j, run_seed in enumerate(spawn_seeds(1, n_runs)):
+            for k, target in enumerate(targets):
+                sim.target_damage = target
+                exact = sim.simulate(deck, max_time=max_time, stop_on_target=True, rng=random.Random(run_seed))
+                got = dist["ttk_samples"][k][j]
+                if got is not None:
+                    max_gap = max(max_gap, got - exact["combat_time"])
+        rerun_seconds = time.perf_counter() - start
+        sim.target_damage = 10_000_000
+        rows.append({
+            "deck": name,
+            "api_seconds": api_seconds,
+            "rerun_seconds": rerun_seconds,
+            "max_gap": max_gap,
+            "kill_rate": dist["ttk"][-1]["kill_rate"],
+        })
+    return rows
+
+
+AOE_DECK = ("ant", "sixtails", "fan", "suishou", "linfeng", "twotails", "mirror", "dice")
+
+
+def bench_multi_target(target_counts=(1, 4, 16, 64), max_time: float = 300.0, repeat: int = 10, cards_path: Optional[str] = None) -> List[dict]:
+    """范围卡组在不同目标数下的单场耗时与秒伤；1 个目标时与单目标模拟器逐项对照"""
+    cards = load_bench_deck(cards_path)
+    deck = [c for c in cards if c.get("id") in AOE_DECK]
+    single = DanqingEventSimulator(10000.0, 50000.0)
+    single_seconds = 0.0
+    for seed in range(repeat):
+        start = time.perf_counter()
+        single.simulate(deck, max_time=max_time, seed=seed, stop_on_target=False)
+        single_seconds += time.perf_counter() - start
+    rows = []
+    for n in target_counts:
+        sim = MultiTargetSimulator(10000.0, 50000.0, n_targets=n)
+        seconds = 0.0
+        dps = []
+        same = 0
+        for seed in range(repeat):
+            start = time.perf_counter()
+            result = sim.simulate(deck, max_time=max_time, seed=seed, stop_on_target=False)
+            seconds += time.perf_counter() - start
+            dps.append(result["total_dps"])
+            if n == 1:
+                same += result["total_damage"] == single.simulate(deck, max_time=max_time, seed=seed, stop_on_target=False)["total_damage"]
+        rows.append({
+            "targets": n,
+            "seconds": seconds / repeat,
+            "single_seconds": single_seconds / repeat,
+            "dps": statistics.fmean(dps),
+            "same_as_single": same if n == 1 else None,
+        })
+    return rows
+
+
+def bench_catalog(repeat: int = 200, cards_path: Optional[str] = None) -> dict:
+    """每次运行前的卡牌准备：逐次读取解析并重建索引与数值表 vs 进程内共享目录"""
+    path = cards_path or _default_cards_path()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        cards_map = {c["id"]: c for c in data["cards"] if isinstance(c, dict) and isinstance(c.get("id"), str) and c["id"]}
+        CardValueTable(list(cards_map.values()))
+        file_digest(path)
+    reparse = (time.perf_counter() - start) / repeat
+
+    CardCatalog.invalidate(path)
+    start = time.perf_counter()
+    catalog = CardCatalog.load(path)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        same = CardCatalog.load(path) is catalog
+    cached = (time.perf_counter() - start) / repeat
+    return {
+        "cards": len(catalog.cards),
+        "reparse_seconds": reparse,
+        "build_seconds": build,
+        "cached_seconds": cached,
+        "same_object": same,
+    }
+
+
+UPGRADE_DECKS = {
+    "技能": ("yanhong", "zhouyixian", "woodsword", "shangguance"),
+    "燃烧": ("ant", "sixtails", "twotails", "mirror"),
+}
+
+
+def bench_upgrade_search(budget: int = 8, n_runs: int = 5, max_time: float = 120.0, seed: int = 1, cards_path: Optional[str] = None) -> List[dict]:
+    """升级分配：贪心 + 局部搜索 vs 穷举预算内的全部分配（同一组随机流）"""
+    cards = load_bench_deck(cards_path)
+    rows = []
+    for name, ids in UPGRADE_DECKS.items():
+        deck = [c for c in cards if c.get("id") in ids]
+        start = time.perf_counter()
+        res = optimize_upgrades(10000.0, 50000.0, deck, budget, n_runs=n_runs, max_time=max_time, seed=seed)
+        search_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        evaluator = AllocationEvaluator(deck, 10000.0, 50000.0, n_runs=n_runs, max_time=max_time, seed=seed)
+        allocations = [levels for levels in itertools.product(range(MAX_CARD_LEVEL + 1), repeat=len(deck)) if sum(levels) <= budget]
+        values = evaluator.evaluate(allocations)
+        brute_seconds = time.perf_counter() - start
+        rows.append({
+            "deck": name,
+            "allocations": len(allocations),
+            "evaluations": res["evaluations"],
+            "search_seconds": search_seconds,
+            "brute_seconds": brute_seconds,
+            "search_dps": res["dps"],
+            "best_dps": max(values),
+            "first": res["path"][0]["card_name"] if res["path"] else None,
+        })
+    return rows
+
+
+RANKING_DECKS = (
+    AOE_DECK,
+    AOE_DECK[:-1] + ("shangguance",),
+    AOE_DECK[:-2] + ("dice", "bear"),
+    tuple(x for x in AOE_DECK if x != "twotails") + ("icearrow_card",),
+)
+
+
+def bench_variance_reduction(n_runs: int = 32, max_time: float = 180.0, seed: int = 5, cards_path: Optional[str] = None) -> List[dict]:
+    """卡组排名：独立种子 vs 公共随机数 / 对偶 / 控制变量，相邻名次差值的标准误与等效模拟次数倍数"""
+    by_id = {c.get("id"): c for c in load_bench_deck(cards_path)}
+    decks = [[by_id[i] for i in ids] for ids in RANKING_DECKS]
+    configs = (
+        ("独立种子", dict(crn=False, antithetic=False, control_variates=False)),
+        ("公共随机数", dict(crn=True, antithetic=False, control_variates=False)),
+        ("+对偶", dict(crn=True, antithetic=True, control_variates=False)),
+        ("+控制变量", dict(crn=True, antithetic=True, control_variates=True)),
+    )
+    rows = []
+    baseline = None
+    for name, flags in configs:
+        start = time.perf_counter()
+        res = rank_decks(decks, n_runs, 10000.0, 50000.0, max_time=max_time, seed=seed, **flags)
+        seconds = time.perf_counter() - start
+        gaps = [e["gap_stderr"] for e in res["ranking"] if e["gap_stderr"] is not None]
+        variance = statistics.fmean(g * g for g in gaps)
+        if baseline is None:
+            baseline = variance
+        rows.append({
+            "config": name,
+            "seconds": seconds,
+            "order": [e["index"] for e in res["ranking"]],
+            "gap_stderr": math.sqrt(variance),
+            "min_confidence": min(e["confidence"] for e in res["ranking"] if e["confidence"] is not None),
+            "speedup": baseline / variance if variance > 0 else float("inf"),
+        })
+    return rows
+
+
+def bench_racing(deck_size: int = 6, top_k: int = 3, max_runs: int = 64, max_time: float = 180.0, seed: int = 2, cards_path: Optional[str] = None) -> dict:
+    """从范围卡牌的全部 deck_size 张组合中选 top_k：赛跑式 vs 每个卡组都模拟 max_runs 次"""
+    by_id = {c.get("id"): c for c in load_bench_deck(cards_path)}
+    decks = [[by_id[i] for i in ids] for ids in itertools.combinations(AOE_DECK, deck_size)]
+    start = time.perf_counter()
+    raced = race_decks(decks, top_k, 10000.0, 50000.0, max_time=max_time, seed=seed, max_runs=max_runs)
+    race_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    fixed = race_decks(decks, top_k, 10000.0, 50000.0, max_time=max_time, seed=seed, initial_runs=max_runs, max_runs=max_runs)
+    fixed_seconds = time.perf_counter() - start
+    pick = lambda res: sorted(e["index"] for e in res["ranking"] if e["selected"])
+    return {
+        "decks": len(decks),
+        "simulations": raced["simulations"],
+        "fixed_simulations": fixed["simulations"],
+        "rounds": raced["rounds"],
+        "race_seconds": race_seconds,
+        "fixed_seconds": fixed_seconds,
+        "same_top": pick(raced) == pick(fixed),
+    }
+
+
+def bench_ci_stop(targets=(0.01, 0.003, 0.001), max_runs: int = 2000, max_time: float = 180.0, seed: int = 1, cards_path: Optional[str] = None) -> List[dict]:
+    """多次模拟按置信区间提前停止：各目标精度下实际用掉的次数"""
+    by_id = {c.get("id"): c for c in load_bench_deck(cards_path)}
+    deck = [by_id[i] for i in AOE_DECK]
+    sim = DanqingEventSimulator(10000.0, 50000.0)
+    rows = []
+    for target in targets:
+        start = time.perf_counter()
+        batch = sim.simulate_batch(deck, max_runs, max_time=max_time, seed=seed, stop_on_target=False, ci_stop=target)
+        rows.append({
+            "target": target,
+            "runs": batch["n_runs"],
+            "max_runs": max_runs,
+            "half_width": batch["ci_stop"]["relative_half_width"],
+            "seconds": time.perf_counter() - start,
+        })
+    return rows
+
+
+LOCKSTEP_DECKS = {
+    "范围": AOE_DECK,
+    "冰箭燃烧": ICE_ARROW_DECK,
+    "冰箭巨蚁": ICE_ARROW_DECK + ("ant",),
+    "脉冲触发": ("fan", "dice", "mirror", "suishou", "zuogui", "wenmin"),
+    "全部卡牌": None,
+}
+
+
+def _ks_two_sample(a: List[float], b: List[float]) -> tuple:
+    """两样本 KS 统计量与渐近 p 值（样本先取到 0.001，避免浮点求和顺序造成的假差异）"""
+    a = sorted(round(x, 3) for x in a)
+    b = sorted(round(x, 3) for x in b)
+    n, m = len(a), len(b)
+    i = j = 0
+    d = 0.0
+    while i < n and j < m:
+        x = min(a[i], b[j])
+        while i < n and a[i] == x:
+            i += 1
+        while j < m and b[j] == x:
+            j += 1
+        d = max(d, abs(i / n - j / m))
+    en = math.sqrt(n * m / (n + m))
+    lam = (en + 0.12 + 0.11 / en) * d
+    if lam < 1e-3:
+        return d, 1.0
+    p = 2.0 * sum((-1) ** (k - 1) * math.exp(-2.0 * k * k * lam * lam) for k in range(1, 101))
+    return d, min(1.0, max(0.0, p))
+
+
+# 达标即停时锁步后端会把达标所在时间格里剩余的事件也处理完，平均秒伤允许额外偏差均值的这个比例。
+# 实测冰箭卡组的系统偏差约为 5e-6（方差极小，单看 z 值会超过 2），这里留 40 倍余量
+LOCKSTEP_OVERSHOOT = 2e-4
+
+
+def bench_lockstep(n_runs: int = 4000, max_time: float = 180.0, cards_path: Optional[str] = None) -> List[dict]:
+    """锁步向量化后端与事件引擎的分布对照：均值 z、标准差之比、KS 检验与耗时
+
+    allowance 为达标即停时允许的越界偏差（LOCKSTEP_OVERSHOOT 乘以事件引擎均值，打满时长时为 0）。
+    """
+    cards = load_bench_deck(cards_path)
+    rows = []
+    for name, ids in LOCKSTEP_DECKS.items():
+        deck = [c for c in cards if ids is None or c.get("id") in ids]
+        table = CardValueTable(deck)
+        for stop in (False, True):
+            start = time.perf_counter()
+            ref = DanqingEventSimulator(10000.0, 50000.0, value_table=table).simulate_batch(deck, n_runs, max_time=max_time, seed=1, stop_on_target=stop)
+            event_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            vec = LockstepSimulator(10000.0, 50000.0, value_table=table).simulate_batch(deck, n_runs, max_time=max_time, seed=2, stop_on_target=stop)
+            lockstep_seconds = time.perf_counter() - start
+            se = math.hypot(ref["dps"]["stdev"], vec["dps"]["stdev"]) / math.sqrt(n_runs)
+            diff = vec["dps"]["mean"] - ref["dps"]["mean"]
+            d, p = _ks_two_sample(ref["dps_samples"], vec["dps_samples"])
+            rows.append({
+                "deck": name,
+                "stop_on_target": stop,
+                "event_mean": ref["dps"]["mean"],
+                "lockstep_mean": vec["dps"]["mean"],
+                "diff": diff,
+                "se": se,
+                "allowance": LOCKSTEP_OVERSHOOT * abs(ref["dps"]["mean"]) if stop else 0.0,
+                "z": _z_score(diff, se, ref["dps"]["mean"]),
+                "stdev_ratio": vec["dps"]["stdev"] / ref["dps"]["stdev"] if ref["dps"]["stdev"] > 0 else 1.0,
+                "ks_d": d,
+                "ks_p": p,
+                "combat_time": (ref["combat_time"], vec["combat_time"]),
+                "event_seconds": event_seconds,
+                "lockstep_seconds": lockstep_seconds,
+            })
+    return rows
+
+
+def lockstep_consistent(row: dict, z_limit: float = 4.0, ks_alpha: float = 0.001) -> bool:
+    """bench_lockstep 的一行是否一致：|均值差| <= z_limit 个标准误 + 越界允许量，且 KS 检验的 p > ks_alpha"""
+    return abs(row["diff"]) <= z_limit * row["se"] + row["allowance"] and row["ks_p"] > ks_alpha
+
+
+def assert_lockstep(n_runs: int = 4000, z_limit: float = 4.0, ks_alpha: float = 0.001, cards_path: Optional[str] = None) -> List[dict]:
+    """bench_lockstep 的断言版：打满时长与达标即停两种模式下，任一卡组不一致即抛出 AssertionError"""
+    rows = bench_lockstep(n_runs, cards_path=cards_path)
+    failures = [
+        f"{row['deck']} {'达标即停' if row['stop_on_target'] else '打满时长'} 均值差 {row['diff']:+.2f}"
+        f"（允许 {z_limit * row['se'] + row['allowance']:.2f}） KS p={row['ks_p']:.4f}"
+        for row in rows if not lockstep_consistent(row, z_limit, ks_alpha)
+    ]
+    if failures:
+        raise AssertionError("锁步后端与事件引擎的分布不一致：" + "；".join(failures))
+    return rows
+
+
+def bench_lockstep_throughput(sizes=(1000, 10000, 50000), max_time: float = 180.0, event_runs: int = 500, cards_path: Optional[str] = None) -> List[dict]:
+    """全部卡牌打满时长：锁步后端不同批量下每秒模拟次数，与事件引擎逐次模拟对比"""
+    deck = load_bench_deck(cards_path)
+    table = CardValueTable(deck)
+    start = time.perf_counter()
+    DanqingEventSimulator(10000.0, 50000.0, value_table=table).simulate_batch(deck, event_runs, max_time=max_time, seed=1, stop_on_target=False)
+    event_rate = event_runs / (time.perf_counter() - start)
+    rows = []
+    for size in sizes:
+        start = time.perf_counter()
+        LockstepSimulator(10000.0, 50000.0, value_table=table).simulate_batch(deck, size, max_time=max_time, seed=1, stop_on_target=False)
+        rate = size / (time.perf_counter() - start)
+        rows.append({"n_runs": size, "runs_per_sec": rate, "event_runs_per_sec": event_rate, "speedup": rate / event_rate})
+    return rows
+
+
+def _close(a: float, b: float, rel: float = 1e-9) -> bool:
+    """浮点结果在相对误差 rel 内相等（闭式解与逐次累加的求和顺序不同）"""
+    return abs(a - b) <= rel * max(1.0, abs(a), abs(b))
+
+
+def check_reference_agreement(n_decks: int = 120, seeds=(1, 7), cards_path: Optional[str] = None) -> List[dict]:
+    """改版前引擎（reference_sim）与当前引擎逐次掷骰模式的逐场对照，返回结果不一致的场次
+
+    随机卡组、固定种子，打满 180s 与达标即停 600s 两种模式各跑一遍；事件数与施放次数须完全相同，
+    战斗时长、总伤害和各来源伤害允许 1e-9 的相对误差。默认的二项分布抽样与逐次掷骰的等价性由 binomial 检查负责。
+    """
+    cards = load_bench_deck(cards_path)
+    ids = [c["id"] for c in cards]
+    rng = random.Random(0)
+    decks = [cards] + [[c for c in cards if c["id"] in set(rng.sample(ids, rng.randint(1, 10)))] for _ in range(n_decks - 1)]
+    card_levels = {"linfeng": 3}
+    reference = ReferenceSimulator(10000.0, 50000.0)
+    current = DanqingEventSimulator(10000.0, 50000.0, binomial=False)
+    rows = []
+    for deck in decks:
+        for seed in seeds:
+            for max_time, stop in ((180.0, False), (600.0, True)):
+                a = reference.simulate(deck, max_time=max_time, seed=seed, stop_on_target=stop, card_levels=card_levels)
+                b = current.simulate(deck, max_time=max_time, seed=seed, stop_on_target=stop, card_levels=card_levels)
+                same = (
+                    a["event_counts"] == b["event_counts"] and a["cast_counts"] == b["cast_counts"]
+                    and _close(a["combat_time"], b["combat_time"]) and _close(a["total_damage"], b["total_damage"])
+                    and a["damage_breakdown"].keys() == b["damage_breakdown"].keys()
+                    and all(_close(v, b["damage_breakdown"][k]) for k, v in a["damage_breakdown"].items())
+                )
+                if not same:
+                    rows.append({
+                        "deck": [c["id"] for c in deck], "seed": seed, "max_time": max_time, "stop_on_target": stop,
+                        "reference_damage": a["total_damage"], "current_damage": b["total_damage"],
+                    })
+    return rows
+
+
+def assert_reference_agreement(n_decks: int = 120, cards_path: Optional[str] = None) -> List[dict]:
+    """check_reference_agreement 的断言版：有任一场不一致即抛出 AssertionError"""
+    rows = check_reference_agreement(n_decks, cards_path=cards_path)
+    if rows:
+        shown = "；".join(
+            f"{','.join(row['deck'])} 种子 {row['seed']} {row['max_time']:.0f}s {row['reference_damage']:.6g} vs {row['current_damage']:.6g}"
+            for row in rows[:3]
+        )
+        raise AssertionError(f"当前引擎与改版前引擎有 {len(rows)} 场结果不一致：{shown}")
+    return rows
+
+
+class _BytecodeOnlyLoader:
+    """只提供 get_code 的加载器，模拟打包后没有源码的模块"""
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def get_code(self, name):
+        return self._loader.get_code(name)
+
+
+def check_engine_version_without_sources() -> dict:
+    """core 目录不存在、模块只有字节码时计算缓存指纹（模拟 PyInstaller 打包后的运行环境）"""
+    from tools.danqing import core
+
+    normal = engine_version()
+    saved = core.__file__, core.__path__
+    missing = os.path.join(os.path.dirname(saved[0]), "__missing_core__", "__init__.py")
+    core.__file__, core.__path__ = missing, [os.path.dirname(missing)]
+    try:
+        without_dir = engine_version()
+    finally:
+        core.__file__, core.__path__ = saved
+    modules = [sys.modules[name] for name in ENGINE_MODULES if name in sys.modules]
+    loaders = [module.__loader__ for module in modules]
+    for module, loader in zip(modules, loaders):
+        module.__loader__ = _BytecodeOnlyLoader(loader)
+    try:
+        bytecode_only = [engine_version(), engine_version()]
+        digests = {name: module_digest(name) for name in ENGINE_MODULES}
+    finally:
+        for module, loader in zip(modules, loaders):
+            module.__loader__ = loader
+    return {"normal": normal, "without_dir": without_dir, "bytecode_only": bytecode_only, "digests": digests}
+
+
+def assert_engine_version_without_sources() -> dict:
+    """check_engine_version_without_sources 的断言版：抛出异常、目录缺失时指纹改变、只有字节码时有模块取不到指纹或指纹不稳定都算失败"""
+    try:
+        res = check_engine_version_without_sources()
+    except Exception as exc:
+        raise AssertionError(f"缺少 core 目录或源码时计算缓存指纹出错：{exc!r}") from exc
+    if not res["without_dir"] or res["without_dir"] != res["normal"]:
+        raise AssertionError("core 目录不存在时缓存指纹与正常情况不同")
+    missing = [name for name, digest in res["digests"].items() if not digest]
+    if missing:
+        raise AssertionError(f"只有字节码时取不到模块指纹：{', '.join(missing)}")
+    first, second = res["bytecode_only"]
+    if first != second:
+        raise AssertionError("只有字节码时两次计算的缓存指纹不同")
+    return res
+
+
+# bench check 运行的一致性检查：全部使用固定种子，结果可复现；不通过时抛出 AssertionError
+STATISTICAL_CHECKS = {
+    "binomial": assert_binomial_equivalence,
+    "expected": assert_expected_engine,
+    "lockstep": assert_lockstep,
+    "reference": assert_reference_agreement,
+    "engine_version": assert_engine_version_without_sources,
+}
+
+
+def run_checks(names: Optional[List[str]] = None) -> int:
+    """运行统计一致性检查（不给 names 时全部运行），逐项打印结果，返回未通过的项数"""
+    names = list(names or STATISTICAL_CHECKS)
+    unknown = [name for name in names if name not in STATISTICAL_CHECKS]
+    if unknown:
+        raise ValueError(f"未知的检查项: {', '.join(unknown)}（可选 {', '.join(STATISTICAL_CHECKS)}）")
+    failed = 0
+    for name in names:
+        start = time.perf_counter()
+        try:
+            STATISTICAL_CHECKS[name]()
+        except AssertionError as exc:
+            failed += 1
+            print(f"FAIL {name}: {exc}")
+        else:
+            print(f"ok   {name} ({time.perf_counter() - start:.1f} s)")
+    return failed
+
+
+def main(argv: Optional[List[str]] = None):
+    """不带参数时运行全部基准；`check [名称...]` 只运行统计一致性检查，有未通过项时以非零状态退出"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["check"]:
+        raise SystemExit(1 if run_checks(argv[1:]) else 0)
+    res = bench_event_queue()
+    print(f"战斗时长 {res['max_time']:.0f}s，队列操作 {res['ops']} 次")
+    for name in ("dataclass", "tuple"):
+        r = res[name]
+        print(
+            f"{name:>9}: {r['seconds'] * 1000:8.2f} ms  {r['ops_per_sec'] / 1e6:6.2f} Mops/s  "
+            f"分配 {r['allocated_bytes'] / 1024:9.1f} KiB  ({r['bytes_per_event']:.0f} B/事件)"
+        )
+
+    print("雪地熊层数追踪（冰箭卡组）")
+    for row in bench_bear_stacks():
+        print(
+            f"{row['max_time']:>6.0f}s: 施加 {row['adds']} 次 查询 {row['queries']} 次  "
+            f"列表 {row['list'] * 1000:8.2f} ms  队列 {row['deque'] * 1000:6.2f} ms  整场 {row['simulate'] * 1000:7.2f} ms"
+        )
+
+    for max_time, stop in ((300.0, True), (3600.0, False)):
+        print(f"确定性来源闭式解（{max_time:.0f}s，{'达标即停' if stop else '打满时长'}）")
+        for row in bench_analytic(max_time, stop):
+            print(f"{row['deck']:>6}: 事件循环 {row['event'] * 1e6:8.1f} us  闭式解 {row['analytic'] * 1e6:8.1f} us")
+
+    print("卡组组合枚举（动态规划表 vs 流式生成器）")
+    for row in bench_combinations():
+        dp, stream = row["dp"], row["stream"]
+        print(
+            f"{row['cost']:>3} cost: {row['count']} 个组合  动态规划 {dp['seconds']:6.2f} s 峰值 {dp['peak_bytes'] / 2**20:8.1f} MiB  "
+            f"流式 {stream['seconds']:6.2f} s 峰值 {stream['peak_bytes'] / 1024:6.1f} KiB"
+        )
+
+    print("事件队列后端（3600s，队列回放 / 整场耗时）")
+    for row in bench_queue_backends():
+        heap, wheel = row["heap"], row["wheel"]
+        print(
+            f"{row['deck']:>6}: 操作 {row['ops']:6d} 峰值 {row['peak']:3d}  "
+            f"二叉堆 {heap['replay'] * 1000:6.2f} / {heap['simulate'] * 1000:7.2f} ms  "
+            f"时间轮 {wheel['replay'] * 1000:6.2f} / {wheel['simulate'] * 1000:7.2f} ms  "
+            f"{'顺序一致' if row['same_order'] else '顺序不一致'}"
+        )
+
+    print("六合镜回响（队列峰值 / 入队次数 / 整场耗时）")
+    for row in bench_mirror_echo():
+        print(f"{row['deck']:>6} {row['max_time']:>6.0f}s: 峰值 {row['peak']:4d}  入队 {row['pushes']:6d}  耗时 {row['simulate'] * 1000:7.2f} ms")
+
+    print("期望值引擎 vs 蒙特卡洛（180s，2000 次）")
+    for row in check_expected_engine():
+        print(
+            f"{row['deck']:>6}: 分支 {row['states']:4d}  期望 {row['expected_dps']:10.1f} ({row['expected_seconds'] * 1000:7.1f} ms)  "
+            f"蒙特卡洛 {row['mc_dps']:10.1f}±{row['mc_se']:.1f} ({row['mc_seconds'] * 1000:7.1f} ms)  z {row['z']:+.2f}"
+        )
+
+    print("稳态外推 vs 完整模拟（3600s，同种子；差异含完整模拟剩余时段自身的随机波动）")
+    for row in bench_steady_state():
+        at = f"{row['detected_at']:6.0f}s" if row["detected_at"] is not None else " 未收敛"
+        print(
+            f"{row['deck']:>6}: {'/'.join(row['modes']):>17} 检测于 {at}  误差界 {row['relative_error'] * 100:5.2f}%  "
+            f"差异 {row['max_diff'] * 100:5.2f}%  完整 {row['full_seconds'] * 1000:7.2f} ms  外推 {row['steady_seconds'] * 1000:7.2f} ms"
+        )
+
+    print("多时长结果：共享前缀一次推进 vs 逐个时长单独模拟（" + "/".join(f"{h:.0f}" for h in HORIZONS) + "s）")
+    for row in bench_horizon_sweep():
+        print(
+            f"{row['deck']:>6}: 一次推进 {row['sweep_seconds'] * 1000:7.2f} ms  单独模拟 {row['separate_seconds'] * 1000:7.2f} ms  "
+            f"最大相对差异 {row['max_diff']:.1e}"
+        )
+
+    print("累计伤害时间线（0.1s 分辨率，300s）与 20 个目标的达标时刻")
+    for row in bench_timeline():
+        print(
+            f"{row['deck']:>6}: 模拟 {row['plain_seconds'] * 1000:7.2f} ms  含时间线 {row['timeline_seconds'] * 1000:7.2f} ms  "
+            f"读出 {row['read_seconds'] * 1000:6.3f} ms vs 逐个模拟 {row['rerun_seconds'] * 1000:7.2f} ms  最大偏差 {row['max_ttk_gap']:.2f}s"
+        )
+
+    print("击杀时间分布（20 个目标血量 x 10 个随机流，300s，0.1s 分辨率）")
+    for row in bench_ttk():
+        print(
+            f"{row['deck']:>6}: 曲线读出 {row['api_seconds'] * 1000:8.1f} ms  逐个达标即停 {row['rerun_seconds'] * 1000:8.1f} ms  "
+            f"最大偏差 {row['max_gap']:.2f}s  最高目标击杀率 {row['kill_rate']:.0%}"
+        )
+
+    print("多目标模式（范围卡组，300s）")
+    for row in bench_multi_target():
+        same = f"  与单目标一致 {row['same_as_single']}/10" if row["same_as_single"] is not None else ""
+        print(
+            f"{row['targets']:>3} 个目标: {row['seconds'] * 1000:7.2f} ms（单目标模拟器 {row['single_seconds'] * 1000:6.2f} ms）  "
+            f"秒伤 {row['dps']:12.0f}{same}"
+        )
+
+    res = bench_catalog()
+    print(
+        f"卡牌目录（{res['cards']} 张）：逐次读取重建 {res['reparse_seconds'] * 1e6:8.1f} us/次  "
+        f"首次构建 {res['build_seconds'] * 1e6:8.1f} us  之后 {res['cached_seconds'] * 1e6:6.1f} us/次"
+        f"{'' if res['same_object'] else '  （缓存未命中）'}"
+    )
+
+    print("升级分配（预算 8 级，5 个随机流，120s）：贪心 + 局部搜索 vs 穷举")
+    for row in bench_upgrade_search():
+        print(
+            f"{row['deck']:>4}: 评估 {row['evaluations']:4d} / {row['allocations']} 种分配  {row['search_seconds']:6.2f} s vs {row['brute_seconds']:6.2f} s  "
+            f"秒伤 {row['search_dps']:10.1f} / 最优 {row['best_dps']:10.1f}  先升 {row['first']}"
+        )
+
+    print("卡组排名的方差缩减（4 个范围卡组，每组 32 次，180s）")
+    for row in bench_variance_reduction():
+        print(
+            f"{row['config']:>6}: 相邻名次差值标准误 {row['gap_stderr']:7.1f}  等效模拟次数 x{row['speedup']:6.1f}  "
+            f"最低置信度 {row['min_confidence']:.4f}  排名 {row['order']}  {row['seconds'] * 1000:7.1f} ms"
+        )
+
+    res = bench_racing()
+    print(
+        f"赛跑式选 top 3（{res['decks']} 个范围卡组，180s）：{res['simulations']} 次模拟 / {res['rounds']} 轮  "
+        f"vs 固定 64 次 {res['fixed_simulations']} 次  {res['race_seconds']:5.2f} s vs {res['fixed_seconds']:5.2f} s  "
+        f"{'入选相同' if res['same_top'] else '入选不同'}"
+    )
+
+    print("多次模拟按 95% 置信区间提前停止（范围卡组，180s）")
+    for row in bench_ci_stop():
+        print(f"  ±{row['target'] * 100:4.1f}%: {row['runs']:5d} / {row['max_runs']} 次  实际 ±{row['half_width'] * 100:5.3f}%  {row['seconds']:6.2f} s")
+
+    print(f"锁步向量化后端 vs 事件引擎（各 4000 次，180s，|均值差| <= 4 个标准误（达标即停另加均值的 {LOCKSTEP_OVERSHOOT:.2%}）且 KS p > 0.001 视为一致）")
+    for row in bench_lockstep():
+        ok = lockstep_consistent(row)
+        print(
+            f"{row['deck']:>6} {'达标即停' if row['stop_on_target'] else '打满时长'}: 秒伤 {row['event_mean']:10.1f} / {row['lockstep_mean']:10.1f}  "
+            f"z {row['z']:+5.2f}  标准差比 {row['stdev_ratio']:5.3f}  KS D {row['ks_d']:.4f} p {row['ks_p']:.3f}  "
+            f"{row['event_seconds']:6.2f} s vs {row['lockstep_seconds']:5.2f} s  {'一致' if ok else '不一致'}"
+        )
+    for row in bench_lockstep_throughput():
+        print(f"  锁步 {row['n_runs']:6d} 次: {row['runs_per_sec']:9.0f} 次/s  事件引擎 {row['event_runs_per_sec']:6.0f} 次/s  x{row['speedup']:6.1f}")
+
+    print("触发判定：逐次掷骰 vs 二项分布抽样（300 个种子，|z| < 3 视为一致）")
+    for row in check_binomial_equivalence():
+        worst = max(abs(z) for z in row["z"].values())
+        zs = "  ".join(f"{k} {z:+.2f}" for k, z in row["z"].items())
+        print(
+            f"{row['deck']:>6}: 逐次 {row['trial_seconds']:6.2f} s  二项 {row['binomial_seconds']:6.2f} s  "
+            f"{'一致' if worst < 3.0 else '不一致'}  z: {zs}"
+        )
+
+
+if __name__ == "__main__":
+    main()
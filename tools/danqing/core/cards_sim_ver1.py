@@ -1,10 +1,19 @@
+import bisect
+import copy
 import heapq
+import itertools
 from enum import Enum
 from typing import List, Dict, Optional
 from dataclasses import dataclass, field
 import random
 import json
-from collections import defaultdict
+import math
+import operator
+import os
+import statistics
+from collections import defaultdict, deque
+from functools import lru_cache, partial
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 class EventType(Enum):
     """事件类型枚举"""
@@ -17,11 +26,12 @@ class EventType(Enum):
     BURN_APPLY = "burn_apply"
     PULSE = "pulse"
     BURN_EXPLODE = "burn_explode"
+    PULSE_ECHO = "pulse_echo"
     TRIGGER = "trigger"
 
 @dataclass
 class Event:
-    """事件数据结构"""
+    """旧版事件数据结构（模拟器已改用元组队列，保留供基准对比）"""
     time: float
     event_type: EventType
     source_card: Optional[dict] = None
@@ -70,7 +80,9 @@ class CombatState:
         self.burn_add_total = 0
         self.explode_count = 0
         self.bear_stack_multiplier = 1.0
-        self.bear_stack_expires: List[float] = []
+        # 过期时间按施加顺序单调递增，队首即最早过期的层
+        self.bear_stack_expires = deque()
+        self.bear_stack_powers: List[float] = [1.0]  # 层数 -> 倍率的幂
         
         # Buff/Debuff管理
         self.auras: Dict[str, Aura] = {}
@@ -84,6 +96,19 @@ class CombatState:
         self.global_multiplier = 1.0
         self.special_damage_multiplier = 1.0
         
+    def copy(self) -> 'CombatState':
+        """复制战斗状态，容器各自独立（期望值引擎分裂分支时使用）"""
+        other = self.__class__.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
+        other.burn_targets = defaultdict(int, self.burn_targets)
+        other.bear_stack_expires = deque(self.bear_stack_expires)
+        other.bear_stack_powers = list(self.bear_stack_powers)
+        other.auras = {name: copy.copy(aura) for name, aura in self.auras.items()}
+        other.cooldowns = dict(self.cooldowns)
+        other.damage_breakdown = defaultdict(float, self.damage_breakdown)
+        other.cast_counts = defaultdict(int, self.cast_counts)
+        return other
+
     def add_aura(self, aura_name: str, aura: Aura):
         """添加光环效果"""
         if aura_name in self.auras:
@@ -100,41 +125,487 @@ class CombatState:
         """检查技能是否在冷却中"""
         return ability_name in self.cooldowns and self.cooldowns[ability_name] > self.current_time
 
+class DeckPlan:
+    """卡组编译结果：事件处理只读取这里预先算好的标志与参数"""
+    def __init__(self):
+        # 按卡组中出现次数展开的概率/倍率列表（空列表即不存在该卡）
+        self.linfeng_arrow_chances: List[float] = []
+        self.linfeng_burn_chances: List[float] = []
+        self.shangguance_burn_chances: List[float] = []
+        self.twotails_ratios: List[float] = []
+        self.dice_ratios: List[float] = []
+        self.suishou_burn_chances: List[float] = []
+        self.mirror_efficiencies: List[float] = []
+        self.bear_multipliers: List[float] = []
+        self.mirror_card: Optional[dict] = None
+
+        # 燃烧DOT与爆燃
+        self.has_ant = False
+        self.burn_tick_ratio = 0.0
+        self.burn_damage_key = '燃烧-DOT'
+        self.sixtails_card: Optional[dict] = None
+        self.explode_ratio = 0.0
+
+        # 寒冰剑阈值、折扇脉冲倍率
+        self.ice_sword_threshold: Optional[int] = None
+        self.fan_pulse_ratio = 0.0
+
+        # 卡牌ID -> (伤害倍率, 统计键, 伤害类型)
+        self.skill_casts: Dict[str, tuple] = {}
+
+        # 事件负载表：队列条目只携带槽位序号，参数按槽位从这里读取
+        self.cast_slots: List[tuple] = []  # (卡牌, 冷却)
+        self.arrow_slots: List[tuple] = []  # (冰箭数, 间隔)
+        self.pulse_slots: List[tuple] = []  # (是否折扇, 脉冲数, 间隔或None)
+        self.burn_slots: List[tuple] = []  # (层数, 间隔或None)
+        self.burn_proc_slots: Dict[int, int] = {}  # 触发的燃烧层数 -> 槽位
+        self.ice_sword_pulse_slot = -1
+        self.aura_names: List[str] = []
+
+        # 按闭式解计算的确定性周期来源：
+        # (首次时间, 周期, 单次伤害, 伤害统计键, 释放统计键, 冰箭数, 脉冲数)
+        self.analytic_sources: List[tuple] = []
+
+    def add_burn_slot(self, stacks: int, interval: Optional[float] = None) -> int:
+        """登记一个燃烧负载槽位"""
+        self.burn_slots.append((stacks, interval))
+        return len(self.burn_slots) - 1
+
+class SimulationSnapshot:
+    """某一时刻的完整模拟状态，只读；由 DanqingEventSimulator.begin/advance/fork 产生
+
+    同一个快照可以多次 advance/fork/finish，各分支互不影响。
+    """
+
+    __slots__ = ("deck", "level", "card_levels", "plan", "state", "queue_entries", "seq", "rng_state", "echo_slots", "last_update_time", "analytic_start")
+
+    def __init__(self, deck: List[dict], level: int, card_levels: dict, plan: DeckPlan, state: CombatState, queue_entries: List[tuple], seq: int, rng_state: tuple, echo_slots: List[list], last_update_time: float, analytic_start: float):
+        self.deck = deck
+        self.level = level
+        self.card_levels = card_levels
+        self.plan = plan
+        self.state = state
+        self.queue_entries = queue_entries
+        self.seq = seq
+        self.rng_state = rng_state
+        self.echo_slots = echo_slots
+        # 基础秒伤已结算到的时刻；确定性周期来源从 analytic_start 起按当前卡组参数计入
+        self.last_update_time = last_update_time
+        self.analytic_start = analytic_start
+
+    @property
+    def time(self) -> float:
+        return self.state.current_time
+
+MAX_CARD_LEVEL = 6
+
+# 确定性周期来源与其它卡牌的状态耦合：卡组含有这些卡时该来源必须走事件循环
+ANALYTIC_BLOCKERS = {
+    'wenmin': frozenset({'linfeng', 'shangguance', 'bear', 'qihao', 'icearrow_card'}),
+    'fan': frozenset({'dice', 'mirror', 'suishou'}),
+    'yanhong': frozenset({'bear', 'qihao', 'icearrow_card'}),
+    'qihao': frozenset({'yanhong', 'wenmin'}),
+}
+
+# 特殊数值类型：(卡牌ID, 数值类型)，其余情况按 scaling.base + level * scaling.step 计算
+SPECIAL_VALUE_TYPES = {
+    'wenmin': ('interval',),
+    'icearrow_card': ('interval',),
+    'shangguance': ('burn_chance',),
+    'linfeng': ('ice_arrow_chance', 'extra_burn_chance'),
+    'ant': ('burn_tick_ratio',),
+    'sixtails': ('explode_ratio',),
+    'fan': ('pulse_ratio',),
+    'dice': ('dice_ratio',),
+    'mirror': ('mirror_efficiency',),
+    'suishou': ('suishou_burn_chance',),
+}
+
+def card_value(card: dict, level: int, value_type: str = 'damage') -> float:
+    """按等级计算卡牌数值（不处理 card_levels 覆盖）"""
+    model = card.get('dpsModel') or {}
+    scaling = model.get('scaling') or {}
+    base = scaling.get('base', 0)
+    step = scaling.get('step', 0)
+    value = float(base) + level * float(step)
+    
+    # 特殊处理
+    if value_type == 'interval' and card['id'] == 'wenmin':
+        return 16 - level
+    elif value_type == 'interval' and card['id'] == 'icearrow_card':
+        return 16 - level
+    elif value_type == 'burn_chance' and card['id'] == 'shangguance':
+        return 0.38 + 0.02 * level
+    elif value_type == 'ice_arrow_chance' and card['id'] == 'linfeng':
+        return 0.70 + 0.05 * level
+    elif value_type == 'extra_burn_chance' and card['id'] == 'linfeng':
+        return 0.42 + 0.03 * level
+    elif value_type == 'burn_tick_ratio' and card['id'] == 'ant':
+        return 0.014 + 0.001 * level
+    elif value_type == 'explode_ratio' and card['id'] == 'sixtails':
+        return 0.52 + 0.03 * level
+    elif value_type == 'pulse_ratio' and card['id'] == 'fan':
+        return 0.52 + 0.02 * level
+    elif value_type == 'dice_ratio' and card['id'] == 'dice':
+        return 0.7 + 0.05 * level
+    elif value_type == 'mirror_efficiency' and card['id'] == 'mirror':
+        return 1.4 + 0.1 * level
+    elif value_type == 'suishou_burn_chance' and card['id'] == 'suishou':
+        return 0.70 + 0.05 * level
+    
+    return value
+
+class CardValueTable:
+    """卡牌数值表：每张卡每种数值类型在 0~6 级的取值，卡牌目录加载时构建一次"""
+    def __init__(self, cards: List[dict]):
+        self.cards: List[dict] = []
+        self.index: Dict[str, int] = {}
+        # values[卡牌序号][数值类型][等级]
+        self.values: List[Dict[str, tuple]] = []
+        for card in cards:
+            if not isinstance(card, dict):
+                continue
+            card_id = card.get('id')
+            if not isinstance(card_id, str) or not card_id or card_id in self.index:
+                continue
+            row = {}
+            for value_type in ('damage',) + SPECIAL_VALUE_TYPES.get(card_id, ()):
+                row[value_type] = tuple(card_value(card, level, value_type) for level in range(MAX_CARD_LEVEL + 1))
+            self.index[card_id] = len(self.values)
+            self.cards.append(card)
+            self.values.append(row)
+
+    def lookup(self, card_index: int, level: int, value_type: str = 'damage') -> float:
+        """按卡牌序号与等级取值（level 需在 0~6 内）"""
+        row = self.values[card_index]
+        series = row.get(value_type)
+        if series is None:
+            series = row['damage']
+        return series[level]
+
+    def value(self, card_id: str, level: int, value_type: str = 'damage') -> Optional[float]:
+        """按卡牌ID取值；未收录的卡牌返回 None"""
+        card_index = self.index.get(card_id)
+        if card_index is None:
+            return None
+        if 0 <= level <= MAX_CARD_LEVEL:
+            return self.lookup(card_index, level, value_type)
+        return card_value(self.cards[card_index], level, value_type)
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """线性插值分位数（sorted_values 需已升序）"""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, len(sorted_values) - 1)
+    frac = pos - lo
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * frac
+
+def summarize_samples(samples: List[float]) -> dict:
+    """汇总样本：均值、标准差与 p5/p50/p95"""
+    values = sorted(float(x) for x in samples)
+    n = len(values)
+    return {
+        'mean': statistics.fmean(values) if n else 0.0,
+        'stdev': statistics.stdev(values) if n > 1 else 0.0,
+        'min': values[0] if n else 0.0,
+        'max': values[-1] if n else 0.0,
+        'p5': _percentile(values, 0.05),
+        'p50': _percentile(values, 0.50),
+        'p95': _percentile(values, 0.95),
+    }
+
+def summarize_ttk(samples: List[Optional[float]]) -> dict:
+    """汇总击杀时间样本（None 为战斗结束仍未达到）：未达到的按无穷大参与排序，落在其中的统计量为 None"""
+    values = sorted(math.inf if x is None else float(x) for x in samples)
+    n = len(values)
+    reached = sum(1 for x in values if x != math.inf)
+
+    def finite(x: float) -> Optional[float]:
+        return x if math.isfinite(x) else None
+
+    return {
+        'kill_rate': reached / n if n else 0.0,
+        'mean': statistics.fmean(values) if n and reached == n else None,
+        'stdev': (statistics.stdev(values) if n > 1 else 0.0) if n and reached == n else None,
+        'min': finite(values[0]) if n else None,
+        'max': finite(values[-1]) if n else None,
+        'p5': finite(_percentile(values, 0.05)) if n else None,
+        'p50': finite(_percentile(values, 0.50)) if n else None,
+        'p95': finite(_percentile(values, 0.95)) if n else None,
+    }
+
+# 正态分布 97.5% 分位数：95% 双侧置信区间的半宽为 CI95_Z 个标准误
+CI95_Z = 1.959963984540054
+
+def ci_half_width(samples: List[float], z: float = CI95_Z) -> float:
+    """样本均值置信区间的半宽（样本不足两个时为 inf）"""
+    if len(samples) < 2:
+        return math.inf
+    return z * statistics.stdev(samples) / math.sqrt(len(samples))
+
+def spawn_seeds(seed: Optional[int], n: int) -> List[int]:
+    """由一个主种子派生 n 个互不相关的子种子"""
+    master = random.Random(int(seed)) if seed is not None else random.Random()
+    return [master.getrandbits(64) for _ in range(int(n))]
+
+class LinearDamageProfile:
+    """固定时长战斗的伤害线性分解：总伤害 = base_atk * 攻击系数 + base_dps * 秒伤系数
+
+    除 base_dps 外的每一项伤害都是 倍率 * base_atk * 各类乘区，事件时间线与属性无关
+    （不在达标时提前结束），所以一次模拟得到的系数可以换算任意 (攻击, 秒伤) 组合的结果。
+    """
+
+    def __init__(self, atk_coefficients: dict, dps_coefficient: float, combat_time: float, global_multiplier: float, atk_run_totals: Optional[List[float]] = None):
+        # 每个伤害来源对 base_atk 的系数（多次模拟取平均）
+        self.atk_coefficients = dict(atk_coefficients)
+        # base_dps 流的系数：全局乘区 * 战斗时长
+        self.dps_coefficient = float(dps_coefficient)
+        self.combat_time = float(combat_time)
+        self.global_multiplier = float(global_multiplier)
+        self.atk_coefficient = math.fsum(self.atk_coefficients.values())
+        self.atk_run_totals = list(atk_run_totals or [self.atk_coefficient])
+
+    def evaluate(self, base_atk: float, base_dps: float) -> dict:
+        """换算给定属性下的伤害与 DPS"""
+        base_atk = float(base_atk)
+        base_dps = float(base_dps)
+        breakdown = {k: v * base_atk for k, v in self.atk_coefficients.items()}
+        breakdown['base_dps'] = self.dps_coefficient * base_dps
+        total_damage = self.atk_coefficient * base_atk + self.dps_coefficient * base_dps
+        total_dps = total_damage / self.combat_time if self.combat_time > 0 else 0.0
+        return {
+            'combat_time': self.combat_time,
+            'total_damage': total_damage,
+            'total_dps': total_dps,
+            'deck_dps': total_dps - base_dps * self.global_multiplier,
+            'base_dps_contribution': base_dps * self.global_multiplier,
+            'damage_breakdown': breakdown,
+            'deck_dps_samples': [t * base_atk / self.combat_time for t in self.atk_run_totals] if self.combat_time > 0 else [],
+        }
+
+    def sweep(self, atk_values: List[float], dps_values: List[float]) -> List[List[float]]:
+        """属性网格扫描：返回 total_dps[i][j]，对应 atk_values[i] 与 dps_values[j]"""
+        if self.combat_time <= 0:
+            return [[0.0 for _ in dps_values] for _ in atk_values]
+        atk_rate = self.atk_coefficient / self.combat_time
+        dps_rate = self.dps_coefficient / self.combat_time
+        return [[float(a) * atk_rate + float(d) * dps_rate for d in dps_values] for a in atk_values]
+
+    def stat_weights(self, step: float = 1000.0) -> dict:
+        """每增加 step 点攻击 / 基础秒伤带来的 DPS 增量，以及二者的等价换算"""
+        step = float(step)
+        if self.combat_time <= 0:
+            return {'step': step, 'per_atk': 0.0, 'per_dps': 0.0, 'atk_in_dps': 0.0}
+        per_atk = self.atk_coefficient / self.combat_time * step
+        per_dps = self.dps_coefficient / self.combat_time * step
+        return {
+            'step': step,
+            'per_atk': per_atk,
+            'per_dps': per_dps,
+            # step 点攻击相当于多少点基础秒伤
+            'atk_in_dps': per_atk / per_dps * step if per_dps > 0 else 0.0,
+        }
+
+class SteadyStateDetector:
+    """长时战斗的稳态检测参数与平稳性判定
+
+    periodic：某个窗口边界的完整战斗状态（时间按边界平移）与更早的边界相同，且其间没有随机判定，
+    此后的战斗严格按该周期重复；stationary：按 MSER 规则截掉初始过渡段后，窗口事件伤害均值的
+    置信区间半宽折算到剩余时长，不超过预计总伤害的 tolerance。error_bound 为外推部分伤害的 z 倍标准误。
+    """
+
+    def __init__(self, window: float = 10.0, min_windows: int = 8, tolerance: float = 0.005, z: float = 2.0):
+        if window <= 0:
+            raise ValueError("window 必须为正数")
+        if tolerance <= 0:
+            raise ValueError("tolerance 必须为正数")
+        self.window = float(window)
+        self.min_windows = max(2, int(min_windows))
+        self.tolerance = float(tolerance)
+        self.z = float(z)
+
+    def has_trend(self, values: List[float]) -> bool:
+        """最小二乘斜率是否显著（z 倍标准误）不为零"""
+        m = len(values)
+        if m < 3:
+            return False
+        total = sum(values)
+        stt = m * (m * m - 1) / 12.0
+        slope = (sum(map(operator.mul, range(m), values)) - (m - 1) / 2.0 * total) / stt
+        if not slope:
+            return False
+        residual = (sum(map(operator.mul, values, values)) - total * total / m - slope * slope * stt) / (m - 2)
+        return slope * slope * stt >= self.z * self.z * max(residual, 0.0)
+
+    def stationary(self, damages: List[float], levels: List[float], last_random: int, event_damage: float, base_total: float, remaining: float) -> Optional[tuple]:
+        """判定窗口事件伤害序列是否已平稳，返回 (截断窗口数, 均值, 误差界) 或 None
+
+        levels 为各窗口末的燃烧层数，last_random 为最近一个发生随机判定的窗口（从 1 起计，0 表示没有），
+        event_damage 为已模拟的事件伤害，base_total 为整场的基础秒伤伤害。
+        """
+        n = len(damages)
+        if n < 2 * self.min_windows:
+            return None
+        # MSER：取剩余窗口均值标准误最小的截断点，只在前半段中按不超过 16 档的步长选；
+        # 最优截断落在中点说明过渡还没结束
+        sums = list(itertools.accumulate(damages, initial=0.0))
+        squares = list(itertools.accumulate(map(operator.mul, damages, damages), initial=0.0))
+        best = None
+        for d in range(0, n // 2 + 1, max(1, n // 32)):
+            m = n - d
+            total = sums[n] - sums[d]
+            mean = total / m
+            var = (squares[n] - squares[d] - total * mean) / (m - 1)
+            # 前缀和相减的舍入误差不当作波动
+            score = var / m if var > 1e-12 * mean * mean else 0.0
+            if best is None or score < best[0]:
+                best = (score, d, mean)
+        score, cut, mean = best
+        if 2 * cut >= n:
+            return None
+        # 样本内方差为零但仍有随机判定：随机事件尚未在样本中体现，误差无法估计
+        if score == 0.0 and last_random > cut:
+            return None
+        windows_left = remaining / self.window
+        bound = self.z * math.sqrt(score) * windows_left
+        projected = event_damage + mean * windows_left + base_total
+        if projected <= 0 or bound > self.tolerance * projected:
+            return None
+        # 截断后伤害或燃烧层数仍有显著线性趋势（如没有爆燃时层数持续累积）时不能按均值外推
+        if self.has_trend(damages[cut:]) or self.has_trend(levels[cut:]):
+            return None
+        return cut, mean, bound
+
 class DanqingEventSimulator:
     """基于事件的丹青系统模拟器"""
     
-    def __init__(self, base_atk: float, base_dps: float, base_hp: float = 200000.0):
+    def __init__(self, base_atk: float, base_dps: float, base_hp: float = 200000.0, value_table: Optional[CardValueTable] = None, analytic: bool = True, binomial: bool = True, queue: str = 'heap'):
+        from tools.danqing.core.event_queue import make_event_queue
+
         self.base_atk = base_atk
         self.base_dps = base_dps
         self.base_hp = base_hp
+        self.value_table = value_table
+        # 是否把确定性周期来源改用闭式解计算
+        self.analytic = analytic
+        # 多次独立触发判定是否合并为一次二项分布抽样（False 时逐次掷骰）
+        self.binomial = binomial
+        self._successes = self._draw_successes if binomial else self._count_successes
+        self._binomial_cdfs: Dict[tuple, List[float]] = {}
         self.target_damage = 10_000_000
-        self.event_queue = []
+        # 事件队列后端：'heap' 二叉堆，'wheel' 分桶时间轮
+        self.queue = queue
+        self._make_queue = partial(make_event_queue, queue)
+        self.event_queue = self._make_queue()
+        self._push = self.event_queue.push
         self.level = 6
         self.card_levels = {}
+        self.rng = random.Random()
+        # 队列条目为 (时间, 优先级, 序号, 事件类型, 槽位)，序号保证同时同优先级事件按调度顺序处理
+        self._seq = itertools.count()
+        # 六合镜回响：[基础倍率, 效率, 同时成功的次数, 起始时间, 已触发次数]
+        self._echo_slots: List[list] = []
+        # 不提前结束的战斗中回响伤害只需计入总量：在脉冲时刻直接结算 max_time 之前的各次回响
+        self._echo_horizon: Optional[float] = None
+        self._event_handlers = {
+            EventType.SKILL_CAST: self._handle_skill_cast,
+            EventType.ICE_ARROW: self._handle_ice_arrow,
+            EventType.BURN_APPLY: self._handle_burn_apply,
+            EventType.DOT_TICK: self._handle_dot_tick,
+            EventType.PULSE: self._handle_pulse,
+            EventType.PULSE_ECHO: self._handle_pulse_echo,
+            EventType.BURN_EXPLODE: self._handle_burn_explode,
+            EventType.BUFF_EXPIRE: self._handle_buff_expire,
+        }
         
-    def simulate(self, deck: List[dict], level: int = 6, max_time: float = 300.0, seed: Optional[int] = None, stop_on_target: bool = True, card_levels: Optional[dict] = None) -> dict:
-        """运行模拟"""
-        if seed is not None:
-            random.seed(int(seed))
-        self.level = int(level)
-        self.card_levels = dict(card_levels or {})
-        self.event_queue = []
-        # 初始化战斗状态
-        state = CombatState(self.base_atk, self.base_dps, self.base_hp)
-        
-        # 计算静态修正
-        self._calculate_static_modifiers(deck, state)
+    def simulate(self, deck: List[dict], level: int = 6, max_time: float = 300.0, seed: Optional[int] = None, stop_on_target: bool = True, card_levels: Optional[dict] = None, rng: Optional[random.Random] = None, steady_state: Optional[SteadyStateDetector] = None, timeline: Optional[float] = None) -> dict:
+        """运行模拟；传入 steady_state 时在伤害收敛后外推剩余时长（仅限固定时长）
+
+        timeline 为分辨率（秒）时按该分辨率记录累计伤害时间线，结果的 timeline 字段为 DamageTimeline（仅限固定时长）。
+        """
+        # 每次模拟使用独立的随机流，避免污染全局 random 状态
+        if rng is not None:
+            self.rng = rng
+        elif seed is not None:
+            self.rng = random.Random(int(seed))
+        else:
+            self.rng = random.Random()
+        if steady_state is not None and stop_on_target:
+            raise ValueError("稳态外推只适用于固定时长的模拟（stop_on_target=False）")
+        if timeline is not None and (stop_on_target or steady_state is not None):
+            raise ValueError("伤害时间线只适用于不做稳态外推的固定时长模拟")
+        state, plan = self._begin_simulation(deck, level, max_time, stop_on_target, card_levels)
+        if timeline is not None:
+            return self._simulate_timeline(deck, state, plan, max_time, timeline)
         
-        # 初始化事件队列
-        self._initialize_events(deck, state)
+        # 整副卡组都可解析且达标即停时，直接求停止时刻
+        analytic_pending = bool(plan.analytic_sources)
+        if analytic_pending and stop_on_target and not self.event_queue:
+            self._solve_analytic_stop(state, plan, max_time)
+            analytic_pending = False
+            # 停止时刻已求出，事件循环无需再运行
+            max_time = state.current_time
         
         # 主循环
-        last_update_time = 0.0
+        if steady_state is None:
+            self._run_events(state, plan, max_time, stop_on_target, 0.0)
+            steady_info = None
+        else:
+            steady_info = self._run_steady_state(state, plan, max_time, steady_state)
+        
+        if analytic_pending:
+            self._apply_analytic_sources(state, plan, state.current_time)
         
+        result = self._build_result(deck, state)
+        if steady_info is not None:
+            if state.total_damage > 0:
+                steady_info['relative_error'] = steady_info['error_bound'] / state.total_damage
+            result['steady_state'] = steady_info
+        return result
+
+    @staticmethod
+    def _build_result(deck: List[dict], state: CombatState) -> dict:
+        """由结束时的战斗状态计算最终统计"""
+        actual_time = state.current_time
+        total_dps = state.total_damage / actual_time if actual_time > 0 else 0
+        deck_dps = total_dps - state.base_dps * state.global_multiplier
+        
+        return {
+            'combat_time': actual_time,
+            'total_damage': state.total_damage,
+            'total_dps': total_dps,
+            'deck_dps': deck_dps,
+            'base_dps_contribution': state.base_dps * state.global_multiplier,
+            'global_multiplier': state.global_multiplier,
+            'damage_breakdown': dict(state.damage_breakdown),
+            'cast_counts': dict(state.cast_counts),
+            'event_counts': {
+                'ice_arrow': int(state.ice_arrow_total),
+                'burn_add': int(state.burn_add_total),
+                'pulse': int(state.pulse_count),
+                'explode': int(state.explode_count),
+            },
+            'total_cost': sum(int(card.get('cost', 0) or 0) for card in deck)
+        }
+
+    def _run_events(self, state: CombatState, plan: DeckPlan, end_time: float, stop_on_target: bool, last_update_time: float) -> float:
+        """处理 end_time 之前（含）的事件并累计基础秒伤，返回基础秒伤已结算到的时刻"""
+        event_queue = self.event_queue
+        handlers = self._event_handlers
         base_rate = state.base_dps * state.global_multiplier
-        while state.current_time < max_time and (not stop_on_target or state.total_damage < self.target_damage):
-            if not self.event_queue:
-                remaining = max_time - last_update_time
+        peek_time = event_queue.peek_time
+        pop = event_queue.pop
+        # 恰好落在 end_time 上的事件全部处理，与闭式解的计数口径一致
+        while True:
+            queue_time = peek_time()
+            if not (state.current_time < end_time or (queue_time is not None and queue_time <= end_time)):
+                break
+            if stop_on_target and state.total_damage >= self.target_damage:
+                break
+            if queue_time is None:
+                remaining = end_time - last_update_time
                 if remaining <= 0:
                     break
                 if stop_on_target and base_rate > 0:
@@ -151,11 +622,11 @@ class DanqingEventSimulator:
                 base_damage = base_rate * remaining
                 state.total_damage += base_damage
                 state.damage_breakdown['base_dps'] += base_damage
-                state.current_time = max_time
-                last_update_time = max_time
+                state.current_time = end_time
+                last_update_time = end_time
                 break
 
-            next_event_time = min(self.event_queue[0].time, max_time)
+            next_event_time = min(queue_time, end_time)
             time_delta = next_event_time - last_update_time
             if time_delta > 0:
                 if stop_on_target and base_rate > 0:
@@ -174,38 +645,464 @@ class DanqingEventSimulator:
                 state.damage_breakdown['base_dps'] += base_damage
                 last_update_time = next_event_time
 
-            if not self.event_queue:
+            # 下一个事件在本段之后：留在队列中，时间停在段末
+            if queue_time > end_time:
+                state.current_time = end_time
                 break
-            event = heapq.heappop(self.event_queue)
-            if event.time > max_time:
-                state.current_time = max_time
+            event_time, _, _, kind, slot = pop()
+            state.current_time = event_time
+            handlers[kind](state, plan, slot)
+        return last_update_time
+
+    def _simulate_timeline(self, deck: List[dict], state: CombatState, plan: DeckPlan, max_time: float, resolution: float) -> dict:
+        """从一个有事件的网格点跳到下一个并采样，返回附带 timeline 的结果"""
+        from tools.danqing.core.timeline import TimelineRecorder
+
+        recorder = TimelineRecorder(resolution, max_time)
+        times = recorder.times
+        # 回响在脉冲时刻一次结算会让时间线提前出现后续伤害，这里按事件逐次结算
+        self._echo_horizon = None
+        peek_time = self.event_queue.peek_time
+        breakdown = state.damage_breakdown
+        recorder.record(0, breakdown)
+        last_update_time = 0.0
+        while True:
+            queue_time = peek_time()
+            if queue_time is None or queue_time > max_time:
                 break
-            state.current_time = event.time
-            self._process_event(event, state, deck)
+            index = bisect.bisect_left(times, queue_time - 1e-9)
+            last_update_time = self._run_events(state, plan, max(times[index], queue_time), False, last_update_time)
+            recorder.record(index, breakdown)
+        self._run_events(state, plan, max_time, False, last_update_time)
+        # 闭式解来源的时间线由记录器按列填充，这里只把总量计入结果
+        if plan.analytic_sources:
+            self._apply_analytic_sources(state, plan, max_time)
+        result = self._build_result(deck, state)
+        result['timeline'] = recorder.finish(state.base_dps * state.global_multiplier, plan.analytic_sources)
+        return result
+
+    def _run_steady_state(self, state: CombatState, plan: DeckPlan, max_time: float, detector: SteadyStateDetector) -> dict:
+        """按窗口推进事件，检测到稳态后外推剩余时长，返回检测信息"""
+        window = detector.window
+        base_rate = state.base_dps * state.global_multiplier
+        arrow_cap = max((int(math.ceil(cd)) for card, cd in plan.cast_slots if card.get('id') == 'qihao'), default=0)
+        snapshots = [self._steady_snapshot(state)]
+        damages: List[float] = []
+        levels: List[float] = []
+        # 自上次随机判定以来各窗口边界的状态签名 -> 快照序号
+        signatures: Dict[tuple, int] = {}
+        # 实际掷骰的判定次数，以及最近一次发生随机判定的窗口（快照序号）
+        draws = [0]
+        seen_draws = 0
+        last_random = 0
+        successes = self._successes
+
+        def counted_successes(n: int, p: float, source: Optional[str] = None) -> int:
+            if n > 0 and 0.0 < p < 1.0:
+                draws[0] += 1
+            return successes(n, p, source)
+
+        last_update_time = 0.0
+        boundary = 0.0
+        found = None
+        self._successes = counted_successes
+        try:
+            while boundary + window < max_time:
+                boundary += window
+                last_update_time = self._run_events(state, plan, boundary, False, last_update_time)
+                snapshot = self._steady_snapshot(state)
+                damages.append(snapshot[0] - snapshots[-1][0])
+                levels.append(state.burn_stacks)
+                snapshots.append(snapshot)
+                index = len(snapshots) - 1
+                if draws[0] != seen_draws:
+                    seen_draws = draws[0]
+                    last_random = index
+                    signatures.clear()
+                else:
+                    signature = self._steady_signature(state, plan, boundary, arrow_cap)
+                    first = signatures.get(signature)
+                    if first is not None:
+                        found = ('periodic', first, index, 0.0)
+                        break
+                    signatures[signature] = index
+                # 窗口数较多时按比例拉长检测间隔，检测总开销与窗口数近似线性
+                n = len(damages)
+                if n > 32 and n % (n // 16):
+                    continue
+                stationary = detector.stationary(damages, levels, last_random, snapshot[0], base_rate * max_time, max_time - boundary)
+                if stationary is not None:
+                    found = ('stationary', stationary[0], index, stationary[2])
+                    break
+        finally:
+            self._successes = successes
+
+        info = {'mode': None, 'detected_at': None, 'period': None, 'window': window, 'extrapolated_time': 0.0, 'error_bound': 0.0, 'relative_error': 0.0}
+        if found is None:
+            self._run_events(state, plan, max_time, False, last_update_time)
+            return info
+        mode, first, last, bound = found
+        span = (last - first) * window
+        remaining = max_time - boundary
+        if mode == 'periodic':
+            # 周期稳态下任意一个周期长度的区间伤害都相同：先模拟不足一周期的零头，其余按整周期累加
+            cycles = int(remaining // span)
+            last_update_time = self._run_events(state, plan, max_time - cycles * span, False, last_update_time)
+            scale = float(cycles)
+            extrapolated = cycles * span
+        else:
+            scale = remaining / span
+            extrapolated = remaining
+        self._extrapolate_snapshot(state, snapshots[first], snapshots[last], scale)
+        base_damage = base_rate * (max_time - last_update_time)
+        state.total_damage += base_damage
+        state.damage_breakdown['base_dps'] += base_damage
+        state.current_time = max_time
+        info.update(
+            mode=mode,
+            detected_at=boundary,
+            period=span if mode == 'periodic' else None,
+            extrapolated_time=extrapolated,
+            error_bound=bound,
+        )
+        return info
+
+    def _steady_signature(self, state: CombatState, plan: DeckPlan, boundary: float, arrow_cap: int) -> tuple:
+        """窗口边界处的战斗状态，时间取相对边界的偏移；签名相同且其间没有随机判定时后续战斗完全相同"""
+        def rel(t):
+            return None if t is None else round(t - boundary, 6)
+
+        queue = []
+        for entry in sorted(self.event_queue.entries()):
+            event_time, priority, _, kind, slot = entry
+            if kind == EventType.PULSE_ECHO:
+                ratio, efficiency, hits, origin, fired = self._echo_slots[slot]
+                slot = (ratio, efficiency, hits, rel(origin), fired)
+            queue.append((rel(event_time), priority, kind, slot))
+        return (
+            tuple(queue),
+            state.burn_stacks, rel(state.burn_dot_next_time), state.burn_explode_pending,
+            tuple(sorted(state.burn_targets.items())),
+            # 齐昊冷却只看冰箭总数是否超过冷却；没有寒冰剑时冰箭计数器不影响战斗
+            min(state.ice_arrow_total, arrow_cap),
+            state.ice_arrow_sword_counter if plan.ice_sword_threshold and plan.ice_sword_threshold > 0 else 0,
+            state.bear_stack_multiplier, tuple(rel(t) for t in state.bear_stack_expires if t > boundary),
+            tuple(sorted((name, aura.stacks, aura.effect, rel(aura.expire_time)) for name, aura in state.auras.items())),
+            tuple(sorted((name, rel(t)) for name, t in state.cooldowns.items())),
+        )
+
+    @staticmethod
+    def _steady_snapshot(state: CombatState) -> tuple:
+        """窗口边界处的累计量：(事件伤害, 伤害明细, 施放次数, 事件计数)"""
+        breakdown = dict(state.damage_breakdown)
+        event_damage = state.total_damage - breakdown.pop('base_dps', 0.0)
+        counts = (state.ice_arrow_total, state.burn_add_total, state.pulse_count, state.explode_count)
+        return event_damage, breakdown, dict(state.cast_counts), counts
+
+    @staticmethod
+    def _extrapolate_snapshot(state: CombatState, first: tuple, last: tuple, scale: float):
+        """把两个快照之间的增量乘以 scale 计入战斗状态（基础秒伤由调用方单独结算）"""
+        state.total_damage += (last[0] - first[0]) * scale
+        for k, v in last[1].items():
+            state.damage_breakdown[k] += (v - first[1].get(k, 0.0)) * scale
+        for k, v in last[2].items():
+            state.cast_counts[k] += int(round((v - first[2].get(k, 0)) * scale))
+        added = [int(round((b - a) * scale)) for a, b in zip(first[3], last[3])]
+        state.ice_arrow_total += added[0]
+        state.burn_add_total += added[1]
+        state.pulse_count += added[2]
+        state.explode_count += added[3]
+
+    def _begin_simulation(self, deck: List[dict], level: int, max_time: float, stop_on_target: bool, card_levels: Optional[dict]) -> tuple:
+        """重置队列与负载槽位，计算静态修正、编译卡组并安排初始事件，返回 (state, plan)"""
+        self.level = int(level)
+        self.card_levels = dict(card_levels or {})
+        self.event_queue = event_queue = self._make_queue()
+        self._push = event_queue.push
+        self._seq = itertools.count()
+        self._echo_slots = []
+        self._echo_horizon = float(max_time) if self.analytic and not stop_on_target else None
+        # 初始化战斗状态
+        state = self._new_state()
         
-        # 计算最终统计
-        actual_time = state.current_time
-        total_dps = state.total_damage / actual_time if actual_time > 0 else 0
-        deck_dps = total_dps - state.base_dps * state.global_multiplier
+        # 计算静态修正
+        self._calculate_static_modifiers(deck, state)
+        
+        # 编译卡组参数
+        plan = self._compile_deck(deck)
         
+        # 初始化事件队列
+        self._initialize_events(deck, state, plan, stop_on_target)
+        return state, plan
+
+    def _new_state(self) -> CombatState:
+        """新建一场战斗的初始状态"""
+        return CombatState(self.base_atk, self.base_dps, self.base_hp)
+
+    def _with_stats(self, base_atk: float, base_dps: float) -> 'DanqingEventSimulator':
+        """同样配置、不同属性的模拟器"""
+        return DanqingEventSimulator(base_atk, base_dps, self.base_hp, value_table=self.value_table, analytic=self.analytic, binomial=self.binomial, queue=self.queue)
+
+    def begin(self, deck: List[dict], level: int = 6, seed: Optional[int] = None, card_levels: Optional[dict] = None, rng: Optional[random.Random] = None) -> SimulationSnapshot:
+        """开始一场固定时长的模拟，返回 0 秒时的快照（之后用 advance/fork/finish 推进或分支）
+
+        快照分支不知道最终时长，六合镜回响按事件逐次结算；结果与同种子的 simulate 一致（浮点求和顺序除外）。
+        """
+        if rng is None:
+            rng = random.Random(int(seed)) if seed is not None else random.Random()
+        self.rng = rng
+        state, plan = self._begin_simulation(deck, level, 0.0, False, card_levels)
+        self._echo_horizon = None
+        return self._capture(deck, state, plan, 0.0, 0.0)
+
+    def advance(self, snapshot: SimulationSnapshot, until: float) -> SimulationSnapshot:
+        """从快照推进到 until（含该时刻的事件），返回新快照；原快照不变"""
+        until = float(until)
+        if until < snapshot.time:
+            raise ValueError("只能向后推进快照")
+        state, plan, last_update_time = self._restore(snapshot)
+        last_update_time = self._run_events(state, plan, until, False, last_update_time)
+        return self._capture(snapshot.deck, state, plan, last_update_time, snapshot.analytic_start)
+
+    def finish(self, snapshot: SimulationSnapshot, max_time: float) -> dict:
+        """从快照推进到 max_time 并返回与 simulate 相同格式的结果；原快照不变"""
+        max_time = float(max_time)
+        if max_time < snapshot.time:
+            raise ValueError("结束时间早于快照时刻")
+        state, plan, last_update_time = self._restore(snapshot)
+        self._run_events(state, plan, max_time, False, last_update_time)
+        if plan.analytic_sources:
+            self._apply_analytic_sources(state, plan, max_time, snapshot.analytic_start)
+        return self._build_result(snapshot.deck, state)
+
+    def fork(self, snapshot: SimulationSnapshot, seed: Optional[int] = None, rng: Optional[random.Random] = None, card_levels: Optional[dict] = None) -> SimulationSnapshot:
+        """从快照分出一个变体：换随机流（seed/rng）和/或从此刻起按新的 card_levels 计算卡牌数值
+
+        新等级只能改变数值，不能改变卡组结构与确定性来源的周期（否则已排队的事件无法对应），此时抛出 ValueError。
+        """
+        if rng is None and seed is not None:
+            rng = random.Random(int(seed))
+        rng_state = rng.getstate() if rng is not None else snapshot.rng_state
+        if card_levels is None:
+            return SimulationSnapshot(
+                snapshot.deck, snapshot.level, snapshot.card_levels, snapshot.plan, snapshot.state, snapshot.queue_entries,
+                snapshot.seq, rng_state, snapshot.echo_slots, snapshot.last_update_time, snapshot.analytic_start,
+            )
+        old_plan = snapshot.plan
+        fresh, plan = self._begin_simulation(snapshot.deck, snapshot.level, 0.0, False, card_levels)
+        layout = lambda p: (len(p.cast_slots), len(p.arrow_slots), len(p.pulse_slots), p.ice_sword_pulse_slot, [src[:2] for src in p.analytic_sources])
+        initial_burn_slots = len(plan.burn_slots)
+        if layout(plan) != layout(old_plan) or old_plan.burn_slots[:initial_burn_slots] != plan.burn_slots:
+            raise ValueError("新的卡牌等级改变了事件结构或确定性来源周期，无法从快照分支，请从头模拟")
+        # 战斗中按需登记的燃烧触发槽位与等级无关，已排队的事件可能引用它们
+        plan.burn_slots = list(old_plan.burn_slots)
+        plan.burn_proc_slots = dict(old_plan.burn_proc_slots)
+        state = snapshot.state.copy()
+        state.global_multiplier = fresh.global_multiplier
+        state.special_damage_multiplier = fresh.special_damage_multiplier
+        analytic_start = snapshot.analytic_start
+        if old_plan.analytic_sources:
+            # 分支前的确定性来源按旧参数结算，之后的按新参数
+            self._apply_analytic_sources(state, old_plan, state.current_time, analytic_start)
+            analytic_start = state.current_time
+        return SimulationSnapshot(
+            snapshot.deck, snapshot.level, dict(card_levels), plan, state, snapshot.queue_entries,
+            snapshot.seq, rng_state, snapshot.echo_slots, snapshot.last_update_time, analytic_start,
+        )
+
+    def simulate_horizons(self, deck: List[dict], horizons: List[float], level: int = 6, seed: Optional[int] = None, card_levels: Optional[dict] = None, rng: Optional[random.Random] = None) -> List[dict]:
+        """一次模拟得到多个固定时长的结果（按 horizons 的顺序返回），共享的前缀只模拟一遍"""
+        ordered = sorted({float(h) for h in horizons})
+        if ordered and ordered[0] < 0:
+            raise ValueError("horizons 不能为负数")
+        if rng is None:
+            rng = random.Random(int(seed)) if seed is not None else random.Random()
+        self.rng = rng
+        state, plan = self._begin_simulation(deck, level, 0.0, False, card_levels)
+        self._echo_horizon = None
+        # 同一条事件流依次推进到各个时长，每个时长在状态副本上结算确定性来源
+        last_update_time = 0.0
+        results = {}
+        for horizon in ordered:
+            last_update_time = self._run_events(state, plan, horizon, False, last_update_time)
+            closing = state.copy()
+            if plan.analytic_sources:
+                self._apply_analytic_sources(closing, plan, horizon)
+            results[horizon] = self._build_result(deck, closing)
+        return [results[float(h)] for h in horizons]
+
+    def _capture(self, deck: List[dict], state: CombatState, plan: DeckPlan, last_update_time: float, analytic_start: float) -> SimulationSnapshot:
+        """把模拟器当前的队列、随机流与回响负载连同战斗状态复制成快照"""
+        return SimulationSnapshot(
+            deck, self.level, dict(self.card_levels), plan, state.copy(), self.event_queue.entries(), next(self._seq),
+            self.rng.getstate(), [list(echo) for echo in self._echo_slots], last_update_time, analytic_start,
+        )
+
+    def _restore(self, snapshot: SimulationSnapshot) -> tuple:
+        """按快照重建模拟器的队列、随机流与回响负载，返回 (战斗状态副本, 卡组参数, 基础秒伤结算时刻)"""
+        self.level = snapshot.level
+        self.card_levels = dict(snapshot.card_levels)
+        self.event_queue = queue = self._make_queue()
+        self._push = queue.push
+        for entry in snapshot.queue_entries:
+            queue.push(entry)
+        self._seq = itertools.count(snapshot.seq)
+        self.rng = random.Random()
+        self.rng.setstate(snapshot.rng_state)
+        self._echo_slots = [list(echo) for echo in snapshot.echo_slots]
+        self._echo_horizon = None
+        return snapshot.state.copy(), snapshot.plan, snapshot.last_update_time
+
+    def linear_profile(self, deck: List[dict], level: int = 6, max_time: float = 300.0, seed: Optional[int] = None, card_levels: Optional[dict] = None, n_runs: int = 1) -> LinearDamageProfile:
+        """以单位属性模拟固定时长的战斗，得到伤害对 base_atk / base_dps 的线性系数
+
+        n_runs > 1 时按 simulate_batch 的方式派生随机流并取系数平均值；随机流与属性无关，
+        因此同一种子下换算结果与直接模拟一致（仅差浮点舍入）。
+        """
+        n_runs = int(n_runs)
+        if n_runs <= 0:
+            raise ValueError("n_runs 必须为正整数")
+        unit = self._with_stats(1.0, 1.0)
+        if n_runs == 1:
+            rngs = [random.Random(int(seed)) if seed is not None else random.Random()]
+        else:
+            rngs = [random.Random(run_seed) for run_seed in spawn_seeds(seed, n_runs)]
+        atk_coefficients = defaultdict(float)
+        atk_run_totals = []
+        dps_total = 0.0
+        result = {}
+        for rng in rngs:
+            result = unit.simulate(deck, level=level, max_time=max_time, stop_on_target=False, card_levels=card_levels, rng=rng)
+            run_total = 0.0
+            for k, v in result['damage_breakdown'].items():
+                if k == 'base_dps':
+                    dps_total += v
+                else:
+                    atk_coefficients[k] += v
+                    run_total += v
+            atk_run_totals.append(run_total)
+        return LinearDamageProfile(
+            {k: v / n_runs for k, v in atk_coefficients.items()},
+            dps_total / n_runs,
+            result['combat_time'],
+            result['global_multiplier'],
+            atk_run_totals,
+        )
+
+    def simulate_batch(self, deck: List[dict], n_runs: int, level: int = 6, max_time: float = 300.0, seed: Optional[int] = None, stop_on_target: bool = True, card_levels: Optional[dict] = None, steady_state: Optional[SteadyStateDetector] = None, timeline: Optional[float] = None, ci_stop: Optional[float] = None, min_runs: int = 5) -> dict:
+        """蒙特卡洛批量模拟：每次重复使用由主种子派生的独立随机流；timeline 给出时结果附带平均时间线
+
+        ci_stop 给出时 n_runs 为上限：至少模拟 min_runs 次后，total_dps 均值的 95% 置信区间
+        半宽不超过均值的 ci_stop 倍（如 0.01 即 1%）就提前停止，结果中 n_runs 为实际次数。
+        """
+        n_runs = int(n_runs)
+        if n_runs <= 0:
+            raise ValueError("n_runs 必须为正整数")
+        if ci_stop is not None and ci_stop <= 0:
+            raise ValueError("ci_stop 必须为正数")
+        max_runs = n_runs
+        running_mean = running_m2 = 0.0
+        run_seeds = spawn_seeds(seed, n_runs)
+        dps_samples = []
+        deck_dps_samples = []
+        combat_times = []
+        total_damages = []
+        breakdown = defaultdict(float)
+        cast_counts = defaultdict(float)
+        event_counts = defaultdict(float)
+        steady_infos = []
+        timelines = []
+        result = {}
+        for run_seed in run_seeds:
+            result = self.simulate(deck, level=level, max_time=max_time, stop_on_target=stop_on_target, card_levels=card_levels, rng=random.Random(run_seed), steady_state=steady_state, timeline=timeline)
+            if steady_state is not None:
+                steady_infos.append(result['steady_state'])
+            if timeline is not None:
+                timelines.append(result['timeline'])
+            dps_samples.append(result['total_dps'])
+            deck_dps_samples.append(result['deck_dps'])
+            combat_times.append(result['combat_time'])
+            total_damages.append(result['total_damage'])
+            for k, v in result['damage_breakdown'].items():
+                breakdown[k] += v
+            for k, v in result['cast_counts'].items():
+                cast_counts[k] += v
+            for k, v in result['event_counts'].items():
+                event_counts[k] += v
+            if ci_stop is not None:
+                # Welford 递推均值与方差，避免每次都重算整列样本
+                k = len(dps_samples)
+                delta = result['total_dps'] - running_mean
+                running_mean += delta / k
+                running_m2 += delta * (result['total_dps'] - running_mean)
+                if k >= max(2, min_runs) and CI95_Z * math.sqrt(running_m2 / (k - 1) / k) <= ci_stop * abs(running_mean):
+                    break
+        n_runs = len(dps_samples)
+
+        # 明细取每次模拟的平均值
+        batch = {
+            'n_runs': n_runs,
+            'seed': seed,
+            'dps': summarize_samples(dps_samples),
+            'deck_dps': summarize_samples(deck_dps_samples),
+            'dps_samples': dps_samples,
+            'combat_time': statistics.fmean(combat_times),
+            'total_damage': statistics.fmean(total_damages),
+            'base_dps_contribution': result['base_dps_contribution'],
+            'global_multiplier': result['global_multiplier'],
+            'damage_breakdown': {k: v / n_runs for k, v in breakdown.items()},
+            'cast_counts': {k: v / n_runs for k, v in cast_counts.items()},
+            'event_counts': {k: v / n_runs for k, v in event_counts.items()},
+            'total_cost': result['total_cost'],
+        }
+        if steady_state is not None:
+            detected = [info for info in steady_infos if info['mode'] is not None]
+            batch['steady_state'] = {
+                'detected_runs': len(detected),
+                'detected_at': statistics.fmean(info['detected_at'] for info in detected) if detected else None,
+                'relative_error': max((info['relative_error'] for info in detected), default=0.0),
+            }
+        if timelines:
+            batch['timeline'] = timelines[0].mean(timelines)
+        if ci_stop is not None:
+            mean = statistics.fmean(dps_samples)
+            batch['ci_stop'] = {
+                'target': float(ci_stop),
+                'relative_half_width': ci_half_width(dps_samples) / abs(mean) if mean else 0.0,
+                'max_runs': max_runs,
+                'stopped_early': n_runs < max_runs,
+            }
+        return batch
+
+    def ttk_distribution(self, deck: List[dict], targets: List[float], n_runs: int, level: int = 6, max_time: float = 300.0, seed: Optional[int] = None, card_levels: Optional[dict] = None, resolution: float = 0.1) -> dict:
+        """多个目标血量的击杀时间分布：每个随机流只模拟一次，从累计伤害时间线读出全部目标的达标时刻
+
+        随机流与 simulate_batch 相同；击杀时间取达标的网格时刻，不早于实际时刻且误差不超过 resolution。
+        """
+        n_runs = int(n_runs)
+        if n_runs <= 0:
+            raise ValueError("n_runs 必须为正整数")
+        targets = [float(x) for x in targets]
+        if not targets or min(targets) <= 0:
+            raise ValueError("targets 必须为非空的正数列表")
+        samples: List[List[Optional[float]]] = [[] for _ in targets]
+        for run_seed in spawn_seeds(seed, n_runs):
+            result = self.simulate(deck, level=level, max_time=max_time, stop_on_target=False, card_levels=card_levels, rng=random.Random(run_seed), timeline=resolution)
+            timeline = result['timeline']
+            # 累计伤害单调不减，一次二分查找得到所有目标的网格序号
+            indices = timeline.total.searchsorted(targets, side='left')
+            for column, index in zip(samples, indices.tolist()):
+                column.append(float(timeline.times[index]) if index < len(timeline.times) else None)
         return {
-            'combat_time': actual_time,
-            'total_damage': state.total_damage,
-            'total_dps': total_dps,
-            'deck_dps': deck_dps,
-            'base_dps_contribution': state.base_dps * state.global_multiplier,
-            'global_multiplier': state.global_multiplier,
-            'damage_breakdown': dict(state.damage_breakdown),
-            'cast_counts': dict(state.cast_counts),
-            'event_counts': {
-                'ice_arrow': int(state.ice_arrow_total),
-                'burn_add': int(state.burn_add_total),
-                'pulse': int(state.pulse_count),
-                'explode': int(state.explode_count),
-            },
-            'total_cost': sum(int(card.get('cost', 0) or 0) for card in deck)
+            'n_runs': n_runs,
+            'seed': seed,
+            'max_time': float(max_time),
+            'resolution': float(resolution),
+            'targets': targets,
+            'ttk': [summarize_ttk(column) for column in samples],
+            'ttk_samples': samples,
         }
-    
+
     def _calculate_static_modifiers(self, deck: List[dict], state: CombatState):
         """计算静态修正值"""
         # 统计卡组构成
@@ -237,91 +1134,143 @@ class DanqingEventSimulator:
                 bonus = self._calculate_card_value(card, self.level)
                 state.special_damage_multiplier *= (1 + bonus)
     
-    def _initialize_events(self, deck: List[dict], state: CombatState):
+    def _initialize_events(self, deck: List[dict], state: CombatState, plan: DeckPlan, stop_on_target: bool = False):
         """初始化事件系统"""
+        deck_ids = {card.get('id') for card in deck}
+        multiplier = state.global_multiplier * state.special_damage_multiplier
+        # (首次时间, 事件类型, 槽位, 闭式解来源或None)，按卡组顺序登记
+        entries = []
         for card in deck:
             model = card.get('dpsModel') or {}
             model_type = model.get('type')
             card_id = card.get('id')
+            analytic = self.analytic and not (ANALYTIC_BLOCKERS.get(card_id, frozenset()) & deck_ids)
             
             if card_id == 'wenmin':
                 # 文敏的周期性冰箭
                 interval = self._calculate_card_value(card, self.level, 'interval')
-                self._schedule_event(Event(
-                    time=interval,
-                    event_type=EventType.ICE_ARROW,
-                    source_card=card,
-                    data={'count': 3, 'interval': interval}
-                ))
+                plan.arrow_slots.append((3, interval))
+                source = (interval, interval, 0.0, None, None, 3, 0) if analytic and interval > 0 else None
+                entries.append((interval, EventType.ICE_ARROW, len(plan.arrow_slots) - 1, source))
             
             elif card_id == 'fan':
                 # 折扇的脉冲
-                self._schedule_event(Event(
-                    time=15.0,
-                    event_type=EventType.PULSE,
-                    source_card=card,
-                    data={'interval': 15.0}
-                ))
+                plan.pulse_slots.append((True, 1, 15.0))
+                damage = plan.fan_pulse_ratio * 1 * state.base_atk * multiplier
+                source = (15.0, 15.0, damage, '折扇-脉冲', None, 0, 1) if analytic else None
+                entries.append((15.0, EventType.PULSE, len(plan.pulse_slots) - 1, source))
             elif card_id == 'dice':
-                self._schedule_event(Event(
-                    time=0.2,
-                    event_type=EventType.PULSE,
-                    source_card=card,
-                    data={'count': 3}
-                ))
+                plan.pulse_slots.append((False, 3, None))
+                entries.append((0.2, EventType.PULSE, len(plan.pulse_slots) - 1, None))
             
             elif card_id == 'ant':
                 interval = 3.0
-                self._schedule_event(Event(
-                    time=0.5,
-                    event_type=EventType.BURN_APPLY,
-                    source_card=card,
-                    data={'stacks': 1, 'interval': interval}
-                ))
+                entries.append((0.5, EventType.BURN_APPLY, plan.add_burn_slot(1, interval), None))
             elif model_type == 'ATTACK_SCALING':
                 params = model.get('params') or {}
                 cd = params.get('cd', 6)
-                self._schedule_event(Event(
-                    time=0.1,
-                    event_type=EventType.SKILL_CAST,
-                    source_card=card,
-                    data={'cooldown': cd}
-                ))
-    
-    def _process_event(self, event: Event, state: CombatState, deck: List[dict]):
-        """处理事件"""
-        if event.event_type == EventType.SKILL_CAST:
-            self._handle_skill_cast(event, state, deck)
-        elif event.event_type == EventType.ICE_ARROW:
-            self._handle_ice_arrow(event, state, deck)
-        elif event.event_type == EventType.BURN_APPLY:
-            self._handle_burn_apply(event, state, deck)
-        elif event.event_type == EventType.DOT_TICK:
-            self._handle_dot_tick(event, state, deck)
-        elif event.event_type == EventType.PULSE:
-            self._handle_pulse(event, state, deck)
-        elif event.event_type == EventType.BURN_EXPLODE:
-            self._handle_burn_explode(event, state, deck)
-        elif event.event_type == EventType.BUFF_EXPIRE:
-            self._handle_buff_expire(event, state)
+                plan.cast_slots.append((card, cd))
+                source = None
+                if analytic and cd > 0:
+                    damage_ratio, damage_key, dmg_type = plan.skill_casts[card_id]
+                    damage = damage_ratio * state.base_atk * state.global_multiplier
+                    if dmg_type in ('ICE_ARROW', 'STORM'):
+                        damage *= state.special_damage_multiplier
+                    arrows = 1 if dmg_type == 'ICE_ARROW' else 0
+                    source = (0.1, cd, damage, damage_key, damage_key, arrows, 0)
+                entries.append((0.1, EventType.SKILL_CAST, len(plan.cast_slots) - 1, source))
+
+        # 达标即停时确定性来源会影响停止时刻，只有整副卡组都可解析才使用闭式解
+        split = not (stop_on_target and any(source is None for _, _, _, source in entries))
+        for first_time, kind, slot, source in entries:
+            if source is not None and split:
+                plan.analytic_sources.append(source)
+            else:
+                self._schedule_event(first_time, kind, slot)
     
-    def _handle_skill_cast(self, event: Event, state: CombatState, deck: List[dict]):
-        """处理技能释放"""
-        card = event.source_card
-        if not isinstance(card, dict):
+    @staticmethod
+    def _analytic_count(first_time: float, interval: float, end_time: float) -> int:
+        """周期来源在 end_time（含）之前触发的次数"""
+        return max(0, int(math.floor((end_time - first_time) / interval + 1e-9)) + 1)
+
+    @staticmethod
+    def _apply_analytic_source(state: CombatState, source: tuple, n: int):
+        """把一个确定性周期来源触发 n 次的贡献计入战斗状态"""
+        _, _, damage, damage_key, cast_key, arrows, pulses = source
+        if n <= 0:
             return
-        damage_ratio = self._calculate_card_value(card, self.level)
-        damage = damage_ratio * state.base_atk * state.global_multiplier
+        if damage_key is not None:
+            state.total_damage += damage * n
+            state.damage_breakdown[damage_key] += damage * n
+        if cast_key is not None:
+            state.cast_counts[cast_key] += n
+        state.ice_arrow_total += arrows * n
+        state.pulse_count += pulses * n
+
+    def _apply_analytic_sources(self, state: CombatState, plan: DeckPlan, end_time: float, start_time: float = 0.0):
+        """把确定性周期来源在 (start_time, end_time] 内的贡献计入战斗状态（start_time 为 0 时含 0 时刻）"""
+        for source in plan.analytic_sources:
+            n = self._analytic_count(source[0], source[1], end_time)
+            if start_time > 0:
+                n -= self._analytic_count(source[0], source[1], start_time)
+            self._apply_analytic_source(state, source, n)
+
+    def _solve_analytic_stop(self, state: CombatState, plan: DeckPlan, max_time: float):
+        """整副卡组都可解析时求达标时刻：伤害是基础DPS的线性部分加各来源的阶跃"""
+        if max_time <= 0:
+            return
+        sources = plan.analytic_sources
+        base_rate = state.base_dps * state.global_multiplier
+        target = self.target_damage
+
+        def jumps(t: float) -> float:
+            return sum(src[2] * self._analytic_count(src[0], src[1], t) for src in sources)
+
+        end_time = max_time
+        counts = [self._analytic_count(src[0], src[1], max_time) for src in sources]
+        if base_rate * max_time + jumps(max_time) >= target:
+            # 按平均速率求达标时刻的下界，再从下界开始逐个触发推进
+            rate = base_rate + sum(src[2] / src[1] for src in sources)
+            offset = sum(src[2] * (1.0 - src[0] / src[1]) for src in sources)
+            start = min(max_time, max(0.0, (target - offset) / rate)) if rate > 0 else 0.0
+            if base_rate * start + jumps(start) >= target:
+                start = 0.0
+            counts = [self._analytic_count(src[0], src[1], start) for src in sources]
+            jump_total = sum(src[2] * n for src, n in zip(sources, counts))
+            while True:
+                next_time = min(src[0] + n * src[1] for src, n in zip(sources, counts))
+                if base_rate > 0 and base_rate * min(next_time, max_time) + jump_total >= target:
+                    end_time = (target - jump_total) / base_rate
+                    break
+                if next_time > max_time:
+                    break
+                # 同一时刻的触发按事件循环的调度顺序结算：上一次触发越早入队越先处理，首发按卡组顺序
+                hits = []
+                for index, (src, n) in enumerate(zip(sources, counts)):
+                    if abs(src[0] + n * src[1] - next_time) <= 1e-9 * src[1]:
+                        hits.append((next_time - src[1] if n > 0 else -math.inf, index))
+                for _, index in sorted(hits):
+                    counts[index] += 1
+                    jump_total += sources[index][2]
+                    if base_rate * next_time + jump_total >= target:
+                        break
+                if base_rate * next_time + jump_total >= target:
+                    end_time = next_time
+                    break
+
+        base_damage = base_rate * end_time
+        state.total_damage += base_damage
+        state.damage_breakdown['base_dps'] += base_damage
+        state.current_time = end_time
+        for source, n in zip(sources, counts):
+            self._apply_analytic_source(state, source, n)
+
+    def _handle_skill_cast(self, state: CombatState, plan: DeckPlan, slot: int):
+        """处理技能释放"""
+        card, cooldown = plan.cast_slots[slot]
         card_id = card.get('id')
-        card_name = card.get('name') or card_id or '未知'
-        damage_key = card_name
-        dmg_type = None
-        if card_id == 'yanhong':
-            dmg_type = 'ICE_ARROW'
-            damage_key = f"{card_name}-冰箭"
-        elif card_id == 'qihao':
-            dmg_type = 'STORM'
-            damage_key = f"{card_name}-玄冰风暴"
+        damage_ratio, damage_key, dmg_type = plan.skill_casts[card_id]
+        damage = damage_ratio * state.base_atk * state.global_multiplier
         if dmg_type in ('ICE_ARROW', 'STORM'):
             damage *= state.special_damage_multiplier
         if dmg_type == 'ICE_ARROW':
@@ -334,84 +1283,60 @@ class DanqingEventSimulator:
         if dmg_type == 'ICE_ARROW':
             state.ice_arrow_total += 1
             state.ice_arrow_sword_counter += 1
-            self._check_ice_sword_trigger(state, deck)
-            self._trigger_ice_arrow_effects(state, deck)
+            self._check_ice_sword_trigger(state, plan)
+            self._trigger_ice_arrow_effects(state, plan)
         
         # 安排下次释放
-        cd = event.data['cooldown']
+        cd = cooldown
         
         # 齐昊的冷却缩减
         if card_id == 'qihao' and state.ice_arrow_total > 0:
             cd = max(1.0, cd - state.ice_arrow_total)
         
-        self._schedule_event(Event(
-            time=state.current_time + cd,
-            event_type=EventType.SKILL_CAST,
-            source_card=card,
-            data={'cooldown': event.data['cooldown']}
-        ))
+        self._schedule_event(state.current_time + cd, EventType.SKILL_CAST, slot)
     
-    def _handle_ice_arrow(self, event: Event, state: CombatState, deck: List[dict]):
+    def _handle_ice_arrow(self, state: CombatState, plan: DeckPlan, slot: int):
         """处理冰箭事件"""
-        count = event.data['count']
+        count, interval = plan.arrow_slots[slot]
+        successes = self._successes
         
         # 林峰的额外冰箭
-        for card in deck:
-            if card['id'] == 'linfeng':
-                extra_chance = self._calculate_card_value(card, self.level, 'ice_arrow_chance')
-                extra = 0
-                for _ in range(count):
-                    if random.random() < extra_chance:
-                        extra += 1
-                count += extra
+        for extra_chance in plan.linfeng_arrow_chances:
+            count += successes(count, extra_chance, 'linfeng-冰箭')
+        
+        # 上官策的燃烧触发：每支冰箭独立判定，燃烧都在当前时刻入队，只有次数影响结果
+        for burn_chance in plan.shangguance_burn_chances:
+            for _ in range(successes(count, burn_chance, 'shangguance')):
+                self._apply_burn(state, plan, 1)
         
         for _ in range(count):
             state.ice_arrow_total += 1
             state.ice_arrow_sword_counter += 1
-            
-            # 上官策的燃烧触发
-            for card in deck:
-                if card['id'] == 'shangguance':
-                    burn_chance = self._calculate_card_value(card, self.level, 'burn_chance')
-                    if random.random() < burn_chance:
-                        self._apply_burn(state, deck, 1)
-            self._trigger_ice_arrow_effects(state, deck)
+            self._trigger_ice_arrow_effects(state, plan)
         
         # 冰箭相关触发
-        self._check_ice_sword_trigger(state, deck)
+        self._check_ice_sword_trigger(state, plan)
         
         # 安排下次冰箭
-        self._schedule_event(Event(
-            time=state.current_time + event.data['interval'],
-            event_type=EventType.ICE_ARROW,
-            source_card=event.source_card,
-            data=event.data
-        ))
+        self._schedule_event(state.current_time + interval, EventType.ICE_ARROW, slot)
     
-    def _handle_burn_apply(self, event: Event, state: CombatState, deck: List[dict]):
+    def _handle_burn_apply(self, state: CombatState, plan: DeckPlan, slot: int):
         """处理燃烧施加"""
-        stacks = int(event.data.get('stacks', 1) or 0)
+        stacks, interval = plan.burn_slots[slot]
         if stacks <= 0:
             return
         now = float(state.current_time)
         
         # 林峰的额外燃烧
-        for card in deck:
-            if card['id'] == 'linfeng':
-                extra_burn_chance = self._calculate_card_value(card, self.level, 'extra_burn_chance')
-                extra = 0
-                for _ in range(stacks):
-                    if random.random() < extra_burn_chance:
-                        extra += 1
-                stacks += extra
+        for extra_burn_chance in plan.linfeng_burn_chances:
+            stacks += self._successes(stacks, extra_burn_chance, 'linfeng-燃烧')
         
         # 二尾妖狐的燃烧伤害
-        for card in deck:
-            if card['id'] == 'twotails':
-                trigger_damage = self._calculate_card_value(card, self.level) * stacks * state.base_atk
-                trigger_damage *= state.global_multiplier * state.special_damage_multiplier
-                state.total_damage += trigger_damage
-                state.damage_breakdown['二尾妖狐-被动'] += trigger_damage
+        for trigger_ratio in plan.twotails_ratios:
+            trigger_damage = trigger_ratio * stacks * state.base_atk
+            trigger_damage *= state.global_multiplier * state.special_damage_multiplier
+            state.total_damage += trigger_damage
+            state.damage_breakdown['二尾妖狐-被动'] += trigger_damage
         
         state.burn_add_total += int(stacks)
         state.burn_stacks = min(state.burn_stacks + int(stacks), 12)
@@ -420,139 +1345,106 @@ class DanqingEventSimulator:
         if state.burn_stacks > 0 and (state.burn_dot_next_time is None or state.burn_dot_next_time <= now + 1e-9):
             next_time = now + 3.0
             state.burn_dot_next_time = next_time
-            self._schedule_event(Event(
-                time=next_time,
-                event_type=EventType.DOT_TICK,
-                source_card=event.source_card,
-                data={}
-            ))
+            self._schedule_event(next_time, EventType.DOT_TICK)
         
         # 检查爆燃
-        if state.burn_stacks >= 8 and not state.burn_explode_pending:
-            for card in deck:
-                if card['id'] == 'sixtails':
-                    state.burn_explode_pending = True
-                    self._schedule_event(Event(
-                        time=now + 1.5,
-                        event_type=EventType.BURN_EXPLODE,
-                        source_card=card,
-                        priority=-1
-                    ))
-                    break
+        if state.burn_stacks >= 8 and not state.burn_explode_pending and plan.sixtails_card is not None:
+            state.burn_explode_pending = True
+            self._schedule_event(now + 1.5, EventType.BURN_EXPLODE, priority=-1)
 
-        interval = event.data.get('interval')
-        if interval is not None and event.source_card and event.source_card.get('id') == 'ant':
-            try:
-                interval_val = float(interval)
-            except Exception:
-                interval_val = 0.0
-            if interval_val > 0:
-                self._schedule_event(Event(
-                    time=now + interval_val,
-                    event_type=EventType.BURN_APPLY,
-                    source_card=event.source_card,
-                    data={'stacks': 1, 'interval': interval_val}
-                ))
+        # 巨蚁的周期性燃烧
+        if interval is not None and interval > 0:
+            self._schedule_event(now + interval, EventType.BURN_APPLY, slot)
     
-    def _handle_dot_tick(self, event: Event, state: CombatState, deck: List[dict]):
+    def _handle_dot_tick(self, state: CombatState, plan: DeckPlan, slot: int):
         """处理DOT伤害"""
         state.burn_dot_next_time = None
         now = float(state.current_time)
         if state.burn_stacks > 0:
             # 计算燃烧伤害
-            burn_ratio = None
-            has_ant = False
-            for card in deck:
-                if card['id'] == 'ant':
-                    burn_ratio = self._calculate_card_value(card, self.level, 'burn_tick_ratio')
-                    has_ant = True
-                    break
-            if burn_ratio is None:
-                burn_ratio = 0.014 + 0.001 * self.level
-            burn_damage = burn_ratio * state.base_atk * state.burn_stacks
+            burn_damage = plan.burn_tick_ratio * state.base_atk * state.burn_stacks
             burn_damage *= state.global_multiplier * state.special_damage_multiplier
             state.total_damage += burn_damage
-            if has_ant:
-                state.damage_breakdown['猩红巨蚁-燃烧'] += burn_damage
-            else:
-                state.damage_breakdown['燃烧-DOT'] += burn_damage
+            state.damage_breakdown[plan.burn_damage_key] += burn_damage
             
             # 继续DOT
             next_time = now + 3.0
             state.burn_dot_next_time = next_time
-            self._schedule_event(Event(
-                time=next_time,
-                event_type=EventType.DOT_TICK,
-                source_card=event.source_card,
-                data={}
-            ))
+            self._schedule_event(next_time, EventType.DOT_TICK)
     
-    def _handle_pulse(self, event: Event, state: CombatState, deck: List[dict]):
+    def _handle_pulse(self, state: CombatState, plan: DeckPlan, slot: int):
         """处理脉冲事件"""
-        count = int(event.data.get('count', 1) or 1)
-        is_echo = bool(event.data.get('echo'))
-        base_ratio = float(event.data.get('base_ratio', 0.0) or 0.0)
-        efficiency = float(event.data.get('efficiency', 1.0) or 1.0)
-        if is_echo:
-            damage = base_ratio * efficiency * state.base_atk
-            damage *= state.global_multiplier * state.special_damage_multiplier
-            state.total_damage += damage
-            state.damage_breakdown['六合镜-回响'] += damage
-            return
+        is_fan, count, interval = plan.pulse_slots[slot]
+        base_ratio = 0.0
 
         state.pulse_count += count
+        successes = self._successes
         
         # 折扇伤害
-        if event.source_card['id'] == 'fan':
-            pulse_ratio = self._calculate_card_value(event.source_card, self.level, 'pulse_ratio')
+        if is_fan:
+            pulse_ratio = plan.fan_pulse_ratio
             damage = pulse_ratio * count * state.base_atk
             damage *= state.global_multiplier * state.special_damage_multiplier
             state.total_damage += damage
             state.damage_breakdown['折扇-脉冲'] += damage
             base_ratio = pulse_ratio
         
-        for card in deck:
-            if card['id'] == 'dice':
-                extra_ratio = self._calculate_card_value(card, self.level, 'dice_ratio')
-                for _ in range(count):
-                    if random.random() < 0.5:
-                        extra_damage = extra_ratio * state.base_atk
-                        extra_damage *= state.global_multiplier * state.special_damage_multiplier
-                        state.total_damage += extra_damage
-                        state.damage_breakdown['神木骰-追加'] += extra_damage
+        for extra_ratio in plan.dice_ratios:
+            hits = successes(count, 0.5, 'dice')
+            if hits:
+                extra_damage = extra_ratio * state.base_atk
+                extra_damage *= state.global_multiplier * state.special_damage_multiplier
+                state.total_damage += extra_damage * hits
+                state.damage_breakdown['神木骰-追加'] += extra_damage * hits
 
-        for card in deck:
-            if card['id'] == 'suishou':
-                burn_chance = self._calculate_card_value(card, self.level, 'suishou_burn_chance')
-                for _ in range(count):
-                    if random.random() < burn_chance:
-                        self._apply_burn(state, deck, 3)
+        for burn_chance in plan.suishou_burn_chances:
+            for _ in range(successes(count, burn_chance, 'suishou')):
+                self._apply_burn(state, plan, 3)
         
-        # 六合镜效果
-        for card in deck:
-            if card['id'] == 'mirror':
-                if base_ratio > 0:
-                    for _ in range(count):
-                        if random.random() < 0.5:
-                            efficiency = self._calculate_card_value(card, self.level, 'mirror_efficiency')
-                            for i in range(6):
-                                self._schedule_event(Event(
-                                    time=state.current_time + i + 1,
-                                    event_type=EventType.PULSE,
-                                    source_card=card,
-                                    data={'echo': True, 'base_ratio': base_ratio, 'efficiency': efficiency}
-                                ))
+        # 六合镜效果：同一次脉冲成功的回响合并为一个循环事件，每秒触发一次共6次
+        if base_ratio > 0:
+            for efficiency in plan.mirror_efficiencies:
+                hits = successes(count, 0.5, 'mirror')
+                if not hits:
+                    continue
+                if self._echo_horizon is not None:
+                    self._settle_echo(state, base_ratio, efficiency, hits)
+                else:
+                    self._echo_slots.append([base_ratio, efficiency, hits, state.current_time, 0])
+                    self._schedule_event(state.current_time + 1, EventType.PULSE_ECHO, len(self._echo_slots) - 1)
         
         # 安排下次脉冲
-        if 'interval' in event.data:
-            self._schedule_event(Event(
-                time=state.current_time + event.data['interval'],
-                event_type=EventType.PULSE,
-                source_card=event.source_card,
-                data=event.data
-            ))
+        if interval is not None:
+            self._schedule_event(state.current_time + interval, EventType.PULSE, slot)
     
-    def _handle_burn_explode(self, event: Event, state: CombatState, deck: List[dict]):
+    def _settle_echo(self, state: CombatState, base_ratio: float, efficiency: float, hits: int):
+        """一次性结算回响：乘区在战斗中不变，只需统计不晚于 max_time 的触发次数"""
+        origin = state.current_time
+        horizon = self._echo_horizon
+        ticks = 0
+        for i in range(6):
+            if origin + i + 1 <= horizon:
+                ticks += 1
+        if ticks:
+            damage = base_ratio * efficiency * state.base_atk
+            damage *= state.global_multiplier * state.special_damage_multiplier
+            state.total_damage += damage * hits * ticks
+            state.damage_breakdown['六合镜-回响'] += damage * hits * ticks
+
+    def _handle_pulse_echo(self, state: CombatState, plan: DeckPlan, slot: int):
+        """处理六合镜回响脉冲"""
+        echo = self._echo_slots[slot]
+        base_ratio, efficiency, hits, origin, fired = echo
+        damage = base_ratio * efficiency * state.base_atk
+        damage *= state.global_multiplier * state.special_damage_multiplier
+        state.total_damage += damage * hits
+        state.damage_breakdown['六合镜-回响'] += damage * hits
+        fired += 1
+        echo[4] = fired
+        if fired < 6:
+            self._schedule_event(origin + fired + 1, EventType.PULSE_ECHO, slot)
+    
+    def _handle_burn_explode(self, state: CombatState, plan: DeckPlan, slot: int):
         """处理爆燃"""
         state.burn_explode_pending = False
 
@@ -560,7 +1452,7 @@ class DanqingEventSimulator:
             return
         state.explode_count += 1
 
-        damage_per_stack = self._calculate_card_value(event.source_card, self.level, 'explode_ratio') * state.base_atk
+        damage_per_stack = plan.explode_ratio * state.base_atk
         total_damage = damage_per_stack * state.burn_stacks
         total_damage *= state.global_multiplier * state.special_damage_multiplier
 
@@ -569,26 +1461,107 @@ class DanqingEventSimulator:
         state.burn_stacks = 0
         state.burn_dot_next_time = None
     
-    def _trigger_ice_arrow_effects(self, state: CombatState, deck: List[dict]):
+    def _binomial_cdf(self, n: int, p: float) -> List[float]:
+        """二项分布 B(n, p) 在 0..n-1 处的累积概率（按 (n, p) 缓存）"""
+        cdf = self._binomial_cdfs.get((n, p))
+        if cdf is None:
+            q = 1.0 - p
+            cdf = []
+            total = 0.0
+            for k in range(n):
+                total += math.comb(n, k) * p ** k * q ** (n - k)
+                cdf.append(total)
+            self._binomial_cdfs[(n, p)] = cdf
+        return cdf
+
+    def _draw_successes(self, n: int, p: float, source: Optional[str] = None) -> int:
+        """n 次概率为 p 的独立判定的成功次数：用一个均匀随机数查二项分布的累积表
+
+        source 标明判定来自哪张卡的哪种效果，这里不区分，全部取自 self.rng。
+        """
+        if n <= 0 or p <= 0.0:
+            return 0
+        if p >= 1.0:
+            return n
+        return bisect.bisect_right(self._binomial_cdf(n, p), self.rng.random())
+
+    def _count_successes(self, n: int, p: float, source: Optional[str] = None) -> int:
+        """逐次掷骰统计成功次数（与 _draw_successes 同分布，用于对照）"""
+        rng = self.rng
+        hits = 0
+        for _ in range(n):
+            if rng.random() < p:
+                hits += 1
+        return hits
+
+    def _trigger_ice_arrow_effects(self, state: CombatState, plan: DeckPlan):
         """触发冰箭相关效果"""
         # 雪地熊叠加
-        for card in deck:
-            if card['id'] == 'bear':
-                buff_mult = float(self._calculate_card_value(card, self.level))
-                if buff_mult <= 0:
-                    continue
-                if state.bear_stack_multiplier == 1.0:
-                    state.bear_stack_multiplier = buff_mult
-                state.bear_stack_expires.append(state.current_time + 10.0)
+        for buff_mult in plan.bear_multipliers:
+            if state.bear_stack_multiplier == 1.0:
+                state.bear_stack_multiplier = buff_mult
+                state.bear_stack_powers = [1.0]
+            state.bear_stack_expires.append(state.current_time + 10.0)
     
-    def _apply_burn(self, state: CombatState, deck: List[dict], stacks: int):
+    def _apply_burn(self, state: CombatState, plan: DeckPlan, stacks: int):
         """施加燃烧"""
-        self._schedule_event(Event(
-            time=state.current_time,
-            event_type=EventType.BURN_APPLY,
-            data={'stacks': stacks},
-            priority=1
-        ))
+        slot = plan.burn_proc_slots.get(stacks)
+        if slot is None:
+            slot = plan.add_burn_slot(stacks)
+            plan.burn_proc_slots[stacks] = slot
+        self._schedule_event(state.current_time, EventType.BURN_APPLY, slot, priority=1)
+    
+    def _compile_deck(self, deck: List[dict]) -> DeckPlan:
+        """把卡组编译成事件处理用的参数表（每次模拟只做一次）"""
+        plan = DeckPlan()
+        for card in deck:
+            card_id = card.get('id')
+            if card_id == 'linfeng':
+                plan.linfeng_arrow_chances.append(self._calculate_card_value(card, self.level, 'ice_arrow_chance'))
+                plan.linfeng_burn_chances.append(self._calculate_card_value(card, self.level, 'extra_burn_chance'))
+            elif card_id == 'shangguance':
+                plan.shangguance_burn_chances.append(self._calculate_card_value(card, self.level, 'burn_chance'))
+            elif card_id == 'twotails':
+                plan.twotails_ratios.append(self._calculate_card_value(card, self.level))
+            elif card_id == 'dice':
+                plan.dice_ratios.append(self._calculate_card_value(card, self.level, 'dice_ratio'))
+            elif card_id == 'suishou':
+                plan.suishou_burn_chances.append(self._calculate_card_value(card, self.level, 'suishou_burn_chance'))
+            elif card_id == 'mirror':
+                plan.mirror_efficiencies.append(self._calculate_card_value(card, self.level, 'mirror_efficiency'))
+                if plan.mirror_card is None:
+                    plan.mirror_card = card
+            elif card_id == 'bear':
+                buff_mult = float(self._calculate_card_value(card, self.level))
+                if buff_mult > 0:
+                    plan.bear_multipliers.append(buff_mult)
+            elif card_id == 'ant' and not plan.has_ant:
+                plan.has_ant = True
+                plan.burn_tick_ratio = self._calculate_card_value(card, self.level, 'burn_tick_ratio')
+                plan.burn_damage_key = '猩红巨蚁-燃烧'
+            elif card_id == 'sixtails' and plan.sixtails_card is None:
+                plan.sixtails_card = card
+                plan.explode_ratio = self._calculate_card_value(card, self.level, 'explode_ratio')
+            elif card_id == 'icearrow_card' and plan.ice_sword_threshold is None:
+                plan.ice_sword_threshold = int(self._calculate_card_value(card, self.level, 'interval') or 0)
+            elif card_id == 'fan':
+                plan.fan_pulse_ratio = self._calculate_card_value(card, self.level, 'pulse_ratio')
+
+            if card_id not in plan.skill_casts:
+                card_name = card.get('name') or card_id or '未知'
+                if card_id == 'yanhong':
+                    cast = (self._calculate_card_value(card, self.level), f"{card_name}-冰箭", 'ICE_ARROW')
+                elif card_id == 'qihao':
+                    cast = (self._calculate_card_value(card, self.level), f"{card_name}-玄冰风暴", 'STORM')
+                else:
+                    cast = (self._calculate_card_value(card, self.level), card_name, None)
+                plan.skill_casts[card_id] = cast
+
+        if not plan.has_ant:
+            plan.burn_tick_ratio = 0.014 + 0.001 * self.level
+        plan.pulse_slots.append((False, 1, None))
+        plan.ice_sword_pulse_slot = len(plan.pulse_slots) - 1
+        return plan
     
     def _calculate_card_value(self, card: dict, level: int, value_type: str = 'damage') -> float:
         """计算卡牌数值"""
@@ -600,141 +1573,356 @@ class DanqingEventSimulator:
                 pass
             if level < 0:
                 level = 0
-            if level > 6:
-                level = 6
-        model = card.get('dpsModel') or {}
-        scaling = model.get('scaling') or {}
-        base = scaling.get('base', 0)
-        step = scaling.get('step', 0)
-        value = float(base) + level * float(step)
-        
-        # 特殊处理
-        if value_type == 'interval' and card['id'] == 'wenmin':
-            return 16 - level
-        elif value_type == 'interval' and card['id'] == 'icearrow_card':
-            return 16 - level
-        elif value_type == 'burn_chance' and card['id'] == 'shangguance':
-            return 0.38 + 0.02 * level
-        elif value_type == 'ice_arrow_chance' and card['id'] == 'linfeng':
-            return 0.70 + 0.05 * level
-        elif value_type == 'extra_burn_chance' and card['id'] == 'linfeng':
-            return 0.42 + 0.03 * level
-        elif value_type == 'burn_tick_ratio' and card['id'] == 'ant':
-            return 0.014 + 0.001 * level
-        elif value_type == 'explode_ratio' and card['id'] == 'sixtails':
-            return 0.52 + 0.03 * level
-        elif value_type == 'pulse_ratio' and card['id'] == 'fan':
-            return 0.52 + 0.02 * level
-        elif value_type == 'dice_ratio' and card['id'] == 'dice':
-            return 0.7 + 0.05 * level
-        elif value_type == 'mirror_efficiency' and card['id'] == 'mirror':
-            return 1.4 + 0.1 * level
-        elif value_type == 'suishou_burn_chance' and card['id'] == 'suishou':
-            return 0.70 + 0.05 * level
-        
-        return value
+            if level > MAX_CARD_LEVEL:
+                level = MAX_CARD_LEVEL
+        table = self.value_table
+        if table is not None and 0 <= level <= MAX_CARD_LEVEL:
+            card_index = table.index.get(card_id)
+            if card_index is not None:
+                return table.lookup(card_index, level, value_type)
+        return card_value(card, level, value_type)
 
     def _get_ice_arrow_multiplier(self, state: CombatState) -> float:
         if not state.bear_stack_expires:
             return 1.0
         now = state.current_time
-        state.bear_stack_expires = [t for t in state.bear_stack_expires if float(t) > now]
-        stacks = len(state.bear_stack_expires)
+        expires = state.bear_stack_expires
+        while expires and expires[0] <= now:
+            expires.popleft()
+        stacks = len(expires)
         if stacks <= 0:
             return 1.0
-        return float(state.bear_stack_multiplier) ** stacks
+        powers = state.bear_stack_powers
+        while len(powers) <= stacks:
+            powers.append(float(state.bear_stack_multiplier) ** len(powers))
+        return powers[stacks]
 
-    def _check_ice_sword_trigger(self, state: CombatState, deck: List[dict]):
-        threshold = None
-        for card in deck:
-            if card['id'] == 'icearrow_card':
-                threshold = self._calculate_card_value(card, self.level, 'interval')
-                break
-        if threshold is None:
-            return
-        threshold = int(threshold or 0)
-        if threshold <= 0:
+    def _check_ice_sword_trigger(self, state: CombatState, plan: DeckPlan):
+        threshold = plan.ice_sword_threshold
+        if threshold is None or threshold <= 0:
             return
         while state.ice_arrow_sword_counter >= threshold:
             state.ice_arrow_sword_counter -= threshold
-            self._schedule_event(Event(
-                time=state.current_time + 0.1,
-                event_type=EventType.PULSE,
-                source_card={'id': 'icearrow_card'},
-                data={'count': 1}
-            ))
+            self._schedule_event(state.current_time + 0.1, EventType.PULSE, plan.ice_sword_pulse_slot)
     
-    def _schedule_event(self, event: Event):
+    def _schedule_event(self, time: float, kind: EventType, slot: int = 0, priority: int = 0):
         """调度事件"""
-        heapq.heappush(self.event_queue, event)
+        self._push((time, priority, next(self._seq), kind, slot))
     
-    def _handle_buff_expire(self, event: Event, state: CombatState):
+    def _handle_buff_expire(self, state: CombatState, plan: DeckPlan, slot: int):
         """处理Buff过期"""
-        aura_name = event.data['aura_name']
+        aura_name = plan.aura_names[slot]
         state.remove_aura(aura_name)
 
-def optimize_decks(base_atk: float, base_dps: float, cards_data: dict) -> dict:
-    """优化卡组配置"""
-    simulator = DanqingEventSimulator(base_atk, base_dps)
+def count_subsets(costs: List[int], max_cost: int) -> List[List[int]]:
+    """counts[j][r]：从第 j 张起的卡牌中恰好凑出费用 r 的组合数"""
+    n = len(costs)
+    counts = [[0] * (max_cost + 1) for _ in range(n + 1)]
+    counts[n][0] = 1
+    for j in range(n - 1, -1, -1):
+        for r in range(max_cost + 1):
+            counts[j][r] = counts[j + 1][r]
+            if costs[j] <= r:
+                counts[j][r] += counts[j + 1][r - costs[j]]
+    return counts
+
+@lru_cache(maxsize=64)
+def _shard_prefixes(costs: tuple, target_cost: int, n_shards: int) -> tuple:
+    """把组合树切成前缀子树分给各分片：每个分片的 (前缀, 是否含子树) 列表（按前缀升序）
+
+    从根开始反复把组合数最多的子树拆成它的各个子前缀（前缀本身恰好凑满时单独成一项），
+    直到每棵子树不超过总数的 1/(8*n_shards)；再按组合数从大到小依次分给当前组合数最少的分片。
+    """
+    n = len(costs)
+    counts = count_subsets(list(costs), target_cost)
+    total = counts[0][target_cost]
+    limit = max(1, -(-total // (8 * n_shards)))
+    units = []  # (组合数, 前缀, 是否含子树)
+    # 待拆分的子树：(-组合数, 前缀, 剩余费用)
+    heap = [(-total, (), target_cost)]
+    while heap:
+        negative, prefix, budget = heapq.heappop(heap)
+        start = prefix[-1] + 1 if prefix else 0
+        if -negative <= limit or start >= n:
+            units.append((-negative, prefix, True))
+            continue
+        if prefix and budget == 0:
+            units.append((1, prefix, False))
+        for j in range(start, n):
+            rest = budget - costs[j]
+            if rest >= 0 and counts[j + 1][rest]:
+                heapq.heappush(heap, (-counts[j + 1][rest], prefix + (j,), rest))
+    units.sort(key=lambda u: (-u[0], u[1], u[2]))
+    loads = [(0, shard) for shard in range(n_shards)]
+    assigned: List[list] = [[] for _ in range(n_shards)]
+    for size, prefix, extend in units:
+        load, shard = heapq.heappop(loads)
+        assigned[shard].append((prefix, extend))
+        heapq.heappush(loads, (load + size, shard))
+    return tuple(tuple(sorted(items)) for items in assigned)
+
+def _walk_combinations(costs: List[int], suffix: List[int], target_cost: int, prefix: tuple, after: Optional[tuple], extend: bool = True):
+    """按字典序生成以 prefix 开头、费用恰为 target_cost 的组合；after 给出时从它之后继续"""
+    combo = [int(i) for i in (after or prefix)]
+    budget = target_cost - sum(int(costs[i]) for i in combo)
+    if budget < 0:
+        raise ValueError("游标组合的费用超过目标费用")
+    if after is None and combo and budget == 0:
+        yield tuple(combo)
+    if not extend:
+        return
+    floor = len(prefix)
+    n = len(costs)
+    start = combo[-1] + 1 if combo else 0
+    while True:
+        # 在 start 之后找第一张放得下且剩余费用还能凑满的卡
+        chosen = -1
+        if budget <= suffix[start]:
+            for i in range(start, n):
+                cost = int(costs[i])
+                if cost <= budget and budget - cost <= suffix[i + 1]:
+                    chosen = i
+                    break
+        if chosen >= 0:
+            combo.append(chosen)
+            budget -= int(costs[chosen])
+            start = chosen + 1
+            if budget == 0:
+                yield tuple(combo)
+            continue
+        # 回溯：撤掉最后一张，改试它后面的卡（不越过前缀）
+        if len(combo) <= floor:
+            return
+        last = combo.pop()
+        budget += int(costs[last])
+        start = last + 1
+
+def iter_deck_combinations(costs: List[int], target_cost: int, after: Optional[tuple] = None, shard: int = 0, n_shards: int = 1):
+    """按字典序惰性生成费用恰为 target_cost 的卡牌下标组合（下标升序）
+
+    只保存当前组合，内存与卡组大小成正比。after 为上次生成的组合（游标），
+    从它之后继续；n_shards > 1 时只遍历分给 shard 的前缀子树（见 _shard_prefixes），各分片互不相交。
+    """
+    n = len(costs)
+    target_cost = int(target_cost)
+    n_shards = max(1, int(n_shards))
+    # suffix[i]：下标 i 起所有卡牌的费用之和，用于剪掉凑不满的分支
+    suffix = [0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        suffix[i] = suffix[i + 1] + int(costs[i])
+    after = tuple(int(i) for i in after) if after else None
+    if n_shards == 1:
+        yield from _walk_combinations(costs, suffix, target_cost, (), after)
+        return
+    for prefix, extend in _shard_prefixes(tuple(int(c) for c in costs), target_cost, n_shards)[shard]:
+        if after is not None:
+            if after[:len(prefix)] == prefix and (extend or len(after) == len(prefix)):
+                # 游标所在的子树：从游标之后继续
+                yield from _walk_combinations(costs, suffix, target_cost, prefix, after, extend)
+                after = None
+                continue
+            if prefix < after:
+                continue
+            after = None
+        yield from _walk_combinations(costs, suffix, target_cost, prefix, None, extend)
+
+# 优化器工作进程的常驻数据（每个进程只加载一次卡牌数据）
+_OPTIMIZER_WORKER: dict = {}
+
+def _optimizer_cards(cards_path: Optional[str], cards_data: Optional[dict]) -> tuple:
+    """(卡牌列表, 数值表)：给出 cards_path 时取进程内共享的卡牌目录，否则由 cards_data 构建"""
+    if cards_path:
+        from tools.danqing.core.catalog import CardCatalog
+
+        catalog = CardCatalog.load(cards_path)
+        return list(catalog.cards), catalog.value_table
+    cards = (cards_data or {}).get('cards') or []
+    return cards, CardValueTable(cards)
+
+def _optimizer_worker_init(cards_path: Optional[str], cards_data: Optional[dict], base_atk: float, base_dps: float, max_time: float, seed: Optional[int]):
+    """工作进程初始化：加载卡牌数据并创建模拟器"""
+    cards, value_table = _optimizer_cards(cards_path, cards_data)
+    _OPTIMIZER_WORKER['cards'] = cards
+    _OPTIMIZER_WORKER['costs'] = [int(card.get('cost', 0) or 0) for card in cards]
+    _OPTIMIZER_WORKER['simulator'] = DanqingEventSimulator(base_atk, base_dps, value_table=value_table)
+    _OPTIMIZER_WORKER['max_time'] = float(max_time)
+    _OPTIMIZER_WORKER['seed'] = seed
+
+def _optimizer_evaluate_chunk(task: tuple) -> tuple:
+    """从分片游标起模拟至多 chunk_size 个组合，返回 (top_k 条目, 新游标或None, 模拟数)"""
+    target_cost, shard, n_shards, after, chunk_size, top_k = task
+    cards = _OPTIMIZER_WORKER['cards']
+    simulator = _OPTIMIZER_WORKER['simulator']
+    heap: List[tuple] = []
+    cursor = None
+    count = 0
+    for combo in iter_deck_combinations(_OPTIMIZER_WORKER['costs'], target_cost, after, shard, n_shards):
+        deck = [cards[i] for i in combo]
+        result = simulator.simulate(deck, max_time=_OPTIMIZER_WORKER['max_time'], seed=_OPTIMIZER_WORKER['seed'])
+        entry = (result['deck_dps'], combo, result)
+        if len(heap) < top_k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+        count += 1
+        if count >= chunk_size:
+            cursor = combo
+            break
+    return heap, cursor, count
+
+def _merge_top_k(heap: List[tuple], entries: List[tuple], top_k: int):
+    """把工作进程返回的 top_k 合并进父进程的有界堆"""
+    for entry in entries:
+        if len(heap) < top_k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+def optimize_decks(base_atk: float, base_dps: float, cards_data: dict, workers: Optional[int] = None, top_k: int = 10, min_cost: int = 10, max_cost: int = 25, chunk_size: int = 2000, cards_path: Optional[str] = None, max_time: float = 300.0, seed: Optional[int] = None, search: str = 'exhaustive', shards: Optional[int] = None, checkpoint_path: Optional[str] = None, bound_slack: float = 1.2) -> dict:
+    """优化卡组配置
+
+    search='exhaustive' 按分片流式生成全部组合并多进程评估，checkpoint_path 指定时
+    每块评估完成后保存各分片游标与当前 top_k，中断后以相同参数再次调用即可续跑，结果是精确的 top_k；
+    search='approx' 在本进程内做近似搜索，只模拟启发式上界可能进入 top_k 的卡组。
+    上界取固定种子下少数语境卡组里各伤害来源的最高累计伤害，再乘以 bound_slack，
+    并不保证覆盖所有协同链与随机路径，极端情况下可能漏掉真正的 top_k，因此每个结果都带 approximate=True；
+    bound_slack 越大越保守、剪枝越少。
+    """
     cards = cards_data['cards']
+    if search == 'approx':
+        if bound_slack <= 0:
+            raise ValueError("bound_slack 必须为正数")
+        return _optimize_decks_approx(base_atk, base_dps, cards, top_k, min_cost, max_cost, max_time, seed, cards_path=cards_path, bound_slack=bound_slack)
+    if search == 'bnb':
+        raise ValueError("search='bnb' 已改名为 'approx'：它的上界是启发式的，结果是近似的 top_k")
+    if search != 'exhaustive':
+        raise ValueError(f"未知的搜索方式: {search}")
+    workers = int(workers or os.cpu_count() or 1)
+    top_k = max(1, int(top_k))
+    chunk_size = max(1, int(chunk_size))
+    init_args = (cards_path, None if cards_path else cards_data, float(base_atk), float(base_dps), float(max_time), seed)
+    # 各分片只遍历分给自己的前缀子树；单进程时不分片，多进程时取进程数的若干倍让负载更均匀
+    n_shards = max(1, int(shards or (workers * 4 if workers > 1 else 1)))
+    params = {
+        'base_atk': float(base_atk), 'base_dps': float(base_dps), 'max_time': float(max_time), 'seed': seed,
+        'top_k': top_k, 'n_shards': n_shards, 'sharding': 'prefix', 'card_ids': [card.get('id') for card in cards],
+    }
+    checkpoint = _load_optimizer_checkpoint(checkpoint_path, params)
     
-    results = defaultdict(list)
-    
-    # 生成有效组合的优化算法
-    def generate_combinations_dp(cards: List[dict], target_cost: int) -> List[List[int]]:
-        """使用动态规划生成组合"""
-        n = len(cards)
-        dp = [[] for _ in range(target_cost + 1)]
-        dp[0] = [[]]  # 空组合
-        
-        for i in range(n):
-            card_cost = cards[i]['cost']
-            for cost in range(target_cost, card_cost - 1, -1):
-                for combo in dp[cost - card_cost]:
-                    new_combo = combo + [i]
-                    dp[cost].append(new_combo)
-        
-        return dp[target_cost]
-    
-    # 为每个cost等级寻找最优组合
-    for cost_limit in range(10, 26):
-        print(f"正在优化 {cost_limit} cost 卡组...")
-        
-        combinations = generate_combinations_dp(cards, cost_limit)
-        print(f"找到 {len(combinations)} 个有效组合")
-        
-        # 模拟每个组合
-        for combo_indices in combinations[:1000]:  # 限制数量避免过长计算
-            deck = [cards[i] for i in combo_indices]
-            
-            # 重置模拟器状态
-            simulator.event_queue = []
+    results = {}
+
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_optimizer_worker_init, initargs=init_args)
+    else:
+        _optimizer_worker_init(*init_args)
+    try:
+        # 为每个cost等级寻找最优组合
+        for cost_limit in range(int(min_cost), int(max_cost) + 1):
+            print(f"正在优化 {cost_limit} cost 卡组...")
+            tier = checkpoint['tiers'].setdefault(str(cost_limit), {'cursors': {}, 'top': [], 'evaluated': 0})
+            heap: List[tuple] = [(dps, tuple(combo), result) for dps, combo, result in tier['top']]
+            heapq.heapify(heap)
+            # 每个分片顺序推进：一块模拟完成后从返回的游标继续提交下一块
+            pending = {}
+            for shard in range(n_shards):
+                cursor = tier['cursors'].get(str(shard), [])
+                if cursor is None:
+                    continue
+                pending[shard] = (cost_limit, shard, n_shards, tuple(cursor) or None, chunk_size, top_k)
+            futures = {}
+            while pending or futures:
+                if executor is None:
+                    shard, task = pending.popitem()
+                    outcomes = [(shard, _optimizer_evaluate_chunk(task))]
+                else:
+                    for shard, task in pending.items():
+                        futures[executor.submit(_optimizer_evaluate_chunk, task)] = shard
+                    pending = {}
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    outcomes = [(futures.pop(future), future.result()) for future in done]
+                for shard, (entries, cursor, count) in outcomes:
+                    _merge_top_k(heap, entries, top_k)
+                    tier['evaluated'] += count
+                    tier['cursors'][str(shard)] = list(cursor) if cursor is not None else None
+                    if cursor is not None:
+                        pending[shard] = (cost_limit, shard, n_shards, cursor, chunk_size, top_k)
+                tier['top'] = [[dps, list(combo), result] for dps, combo, result in heap]
+                _save_optimizer_checkpoint(checkpoint_path, checkpoint)
+            print(f"评估了 {tier['evaluated']} 个有效组合")
             
-            # 运行模拟
-            result = simulator.simulate(deck)
+            # 按DPS排序
+            ranked = []
+            for _, combo, result in sorted(heap, key=lambda x: x[:2], reverse=True):
+                deck = [cards[i] for i in combo]
+                result['deck_names'] = [card['name'] for card in deck]
+                result['deck_ids'] = [card['id'] for card in deck]
+                ranked.append(result)
+            results[cost_limit] = ranked
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    return results
+
+def _load_optimizer_checkpoint(checkpoint_path: Optional[str], params: dict) -> dict:
+    """读取优化器检查点；参数不一致时拒绝续跑，避免混入不同设置的结果"""
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return {'params': params, 'tiers': {}}
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('params') != json.loads(json.dumps(params)):
+        raise ValueError(f"检查点参数与本次优化不一致: {checkpoint_path}")
+    checkpoint.setdefault('tiers', {})
+    return checkpoint
+
+def _save_optimizer_checkpoint(checkpoint_path: Optional[str], checkpoint: dict):
+    """原子地写入优化器检查点（先写临时文件再替换）"""
+    if not checkpoint_path:
+        return
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, checkpoint_path)
+
+def _optimize_decks_approx(base_atk: float, base_dps: float, cards: List[dict], top_k: int, min_cost: int, max_cost: int, max_time: float, seed: Optional[int], cards_path: Optional[str] = None, bound_slack: float = 1.2) -> dict:
+    """近似搜索版 optimize_decks（启发式上界剪枝，见 optimize_decks），返回格式相同，每个结果另带 approximate=True"""
+    from tools.danqing.core.deck_search import HeuristicBound, approximate_deck_search
+
+    if cards_path:
+        cards, value_table = _optimizer_cards(cards_path, None)
+    else:
+        value_table = CardValueTable(cards)
+    simulator = DanqingEventSimulator(base_atk, base_dps, value_table=value_table)
+    bounds = HeuristicBound(simulator, cards, float(max_time), seed, bound_slack=float(bound_slack))
+    results = {}
+    for cost_limit in range(int(min_cost), int(max_cost) + 1):
+        print(f"正在优化 {cost_limit} cost 卡组（近似搜索，不保证是精确的 top {max(1, int(top_k))}）...")
+        res = approximate_deck_search(simulator, cards, cost_limit, top_k=max(1, int(top_k)), max_time=float(max_time), seed=seed, bounds=bounds)
+        print(f"共 {res['total']} 个有效组合：模拟 {res['evaluated']} 个，剪枝 {res['pruned']} 个")
+        ranked = []
+        for (_, combo), result in zip(res['ranked'], res['results']):
+            deck = [cards[i] for i in combo]
             result['deck_names'] = [card['name'] for card in deck]
             result['deck_ids'] = [card['id'] for card in deck]
-            
-            results[cost_limit].append(result)
-        
-        # 按DPS排序
-        results[cost_limit].sort(key=lambda x: x['deck_dps'], reverse=True)
-        results[cost_limit] = results[cost_limit][:10]
-    
-    return dict(results)
+            result['approximate'] = True
+            ranked.append(result)
+        results[cost_limit] = ranked
+    return results
 
 # 使用示例
 if __name__ == "__main__":
     # 加载卡牌数据
-    with open('cards_export.json', 'r', encoding='utf-8') as f:
-        cards_data = json.load(f)
+    from tools.danqing.core.catalog import CardCatalog
+
+    cards_data = CardCatalog.load('cards_export.json').export()
     
     # 设置参数
     base_atk = 10000
     base_dps = 50000
     
     # 运行优化
-    optimal_results = optimize_decks(base_atk, base_dps, cards_data)
+    optimal_results = optimize_decks(base_atk, base_dps, cards_data, cards_path='cards_export.json')
     
     # 输出结果
     for cost, decks in optimal_results.items():
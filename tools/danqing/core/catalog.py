@@ -0,0 +1,114 @@
+"""丹青卡牌目录
+
+cards_export.json 在一个进程内只解析一次：CardCatalog.load 按路径缓存目录，文件的修改时间或大小
+变化时重新读取，内容哈希也相同则沿用原目录。目录构建时一次性建好按 ID、名称、种族、标签、
+dpsModel 类型的索引、按费用的 statsTable 以及卡牌数值表；索引与列表都是只读视图，卡牌字典
+在各处共享，调用方不应修改。
+"""
+import hashlib
+import json
+import os
+import threading
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+from tools.danqing.core.cards_sim_ver1 import CardValueTable
+
+
+def _group_by(cards, keys_of) -> Mapping[str, tuple]:
+    groups: Dict[str, list] = {}
+    for card in cards:
+        for key in keys_of(card):
+            if isinstance(key, str) and key:
+                groups.setdefault(key, []).append(card)
+    return MappingProxyType({k: tuple(v) for k, v in groups.items()})
+
+
+class CardCatalog:
+    """卡牌数据的只读索引（cards 保持文件中的顺序）"""
+
+    _cache: Dict[str, Tuple[tuple, "CardCatalog"]] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, data: dict, path: str = "", digest: str = ""):
+        if not isinstance(data, dict):
+            raise ValueError("cards_export.json 格式不正确：根节点应为对象")
+        raw_cards = data.get("cards")
+        if not isinstance(raw_cards, list) or not raw_cards:
+            raise ValueError("cards_export.json 格式不正确：缺少 cards 数组或为空")
+        self.path = path
+        self.digest = digest
+        self.data = MappingProxyType(data)
+        self.cards: Tuple[dict, ...] = tuple(c for c in raw_cards if isinstance(c, dict))
+
+        by_id: Dict[str, dict] = {}
+        by_name: Dict[str, dict] = {}
+        for card in self.cards:
+            card_id = card.get("id")
+            if isinstance(card_id, str) and card_id and card_id not in by_id:
+                by_id[card_id] = card
+            name = str(card.get("name", "") or "").strip()
+            if name and name not in by_name:
+                by_name[name] = card
+        if not by_id:
+            raise ValueError("cards_export.json 中没有可用的卡牌数据")
+        self.by_id: Mapping[str, dict] = MappingProxyType(by_id)
+        self.by_name: Mapping[str, dict] = MappingProxyType(by_name)
+        self.by_category = _group_by(self.cards, lambda c: (c.get("category"),))
+        self.by_tag = _group_by(self.cards, lambda c: c.get("tags") if isinstance(c.get("tags"), list) else ())
+        self.by_model_type = _group_by(self.cards, lambda c: ((c.get("dpsModel") or {}).get("type"),) if isinstance(c.get("dpsModel"), dict) else ())
+
+        stats_table: Dict[int, tuple] = {}
+        raw_stats = data.get("statsTable")
+        if isinstance(raw_stats, dict):
+            for key, rows in raw_stats.items():
+                try:
+                    cost = int(key)
+                except (TypeError, ValueError):
+                    continue
+                if isinstance(rows, list):
+                    rows = tuple(r for r in rows if isinstance(r, dict))
+                    if rows:
+                        stats_table[cost] = rows
+        self.stats_table: Mapping[int, tuple] = MappingProxyType(stats_table)
+        self.value_table = CardValueTable(list(self.cards))
+
+    @classmethod
+    def load(cls, path: str) -> "CardCatalog":
+        """读取 path 处的卡牌目录；同一文件未变化时返回进程内缓存的同一个对象"""
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            raise FileNotFoundError(f"找不到数据文件: {path}")
+        signature = (st.st_mtime_ns, st.st_size)
+        with cls._lock:
+            cached = cls._cache.get(path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        with cls._lock:
+            cached = cls._cache.get(path)
+            if cached is not None and cached[1].digest == digest:
+                # 只是修改时间变了，内容相同
+                cls._cache[path] = (signature, cached[1])
+                return cached[1]
+        catalog = cls(json.loads(raw.decode("utf-8")), path=path, digest=digest)
+        with cls._lock:
+            cls._cache[path] = (signature, catalog)
+        return catalog
+
+    @classmethod
+    def invalidate(cls, path: Optional[str] = None) -> None:
+        """丢弃缓存（不给 path 时全部丢弃）"""
+        with cls._lock:
+            if path is None:
+                cls._cache.clear()
+            else:
+                cls._cache.pop(os.path.abspath(path), None)
+
+    def export(self) -> dict:
+        """原始 JSON 对象（只读视图转回普通字典，内部列表与卡牌仍是共享的）"""
+        return dict(self.data)
@@ -0,0 +1,285 @@
+"""卡组近似搜索（启发式上界剪枝）
+
+按固定费用搜索 deck_dps 较高的 top_k 个卡组（与 optimize_decks 相同，模拟达标即停）。
+每个部分卡组用启发式上界估计能达到的最高 DPS，上界低于当前第 K 名的分支整体剪掉。
+
+上界的构成：
+- 各伤害统计键在单卡、两两组合、全部伤害卡及其去掉一张的语境中，
+  到各个时间点为止的最高累计伤害，按统计键归属汇总成每张卡的乐观贡献；
+- 部分卡组还能加入的卡按分数背包取贡献，乘以可能达到的最大全局/特殊倍率；
+- 达标即停使战斗时长与 DPS 互相约束：DPS 越高战斗越短，累计伤害也越少。
+
+这个上界是启发式的而不是严格证明的：语境卡组只用一个固定种子模拟，覆盖不到所有协同链与随机路径，
+靠余量系数 bound_slack（默认 1.2）和达标时 2% 的越界余量兜底。因此搜索结果是近似的：
+实测与穷举结果一致，但不保证在任意属性与卡池下都是精确的 top_k；需要精确结果时用穷举搜索。
+"""
+import heapq
+from typing import Dict, List, Optional
+
+from tools.danqing.core.cards_sim_ver1 import DanqingEventSimulator, count_subsets
+
+# 与 DanqingEventSimulator._calculate_static_modifiers 一致的乘区卡牌
+RACE_MULTIPLIER_IDS = ('zhouyixian', 'tiger', 'banner')
+GLOBAL_MULTIPLIER_IDS = ('woodsword',)
+# 未指定种子时语境卡组使用的种子：上界只取决于卡池与属性，同样的参数每次剪枝相同
+BOUND_SEED = 0
+
+
+def multiplier_kind(card: dict) -> Optional[str]:
+    """卡牌提供的乘区：'race'（按同类数量）、'global'、'special' 或 None"""
+    model = card.get('dpsModel') or {}
+    model_type = model.get('type')
+    card_id = card.get('id')
+    if model_type is None and card_id in RACE_MULTIPLIER_IDS + GLOBAL_MULTIPLIER_IDS:
+        model_type = 'GLOBAL_MULTIPLIER'
+    if model_type == 'GLOBAL_MULTIPLIER' and card_id in RACE_MULTIPLIER_IDS:
+        return 'race'
+    if model_type == 'GLOBAL_MULTIPLIER' and card_id in GLOBAL_MULTIPLIER_IDS:
+        return 'global'
+    if model_type == 'SPECIAL_DMG_MULTIPLIER':
+        return 'special'
+    return None
+
+
+class HeuristicBound:
+    """每张卡在各时间点的乐观累计伤害与乘区参数，用于估计部分卡组的 DPS 上界（启发式，见模块说明）"""
+
+    def __init__(self, simulator: DanqingEventSimulator, cards: List[dict], max_time: float, seed: Optional[int], bound_slack: float = 1.2, overshoot: float = 0.02, n_horizons: int = 40):
+        self.cards = cards
+        self.kinds = [multiplier_kind(card) for card in cards]
+        self.bonuses = [float(simulator._calculate_card_value(card, simulator.level)) if kind else 0.0 for card, kind in zip(cards, self.kinds)]
+        self.categories = [card.get('category') for card in cards]
+        self.base_dps = max(0.0, float(simulator.base_dps))
+        self.target = float(simulator.target_damage)
+        # 达标时最后一次伤害可能越过目标的比例上限
+        self.overshoot = float(overshoot)
+        self.simulations = 0
+        self._simulator = simulator
+        self._seed = BOUND_SEED if seed is None else seed
+
+        # 任何卡组的战斗都不会长过只靠基础DPS打满目标伤害的时间
+        max_time = float(max_time)
+        if self.base_dps > 0:
+            max_time = min(max_time, self.target / self.base_dps)
+        n_horizons = max(1, int(n_horizons))
+        self.horizons = [max_time * (j + 1) / n_horizons for j in range(n_horizons)]
+        self._key_damage: Dict[str, List[float]] = {}
+        self._key_owners: Dict[str, set] = {}
+        # values[j][i]：卡牌 i 到 horizons[j] 为止的乐观累计伤害（不含乘区）
+        self.values = self._card_values(float(bound_slack))
+        self.t_min = self._min_combat_time()
+
+    def multipliers(self, indices) -> tuple:
+        """卡组的 (全局倍率, 特殊伤害倍率)"""
+        composition: Dict[str, int] = {}
+        for i in indices:
+            cat = self.categories[i]
+            if cat:
+                composition[cat] = composition.get(cat, 0) + 1
+        global_mult = 1.0
+        special_mult = 1.0
+        for i in indices:
+            kind = self.kinds[i]
+            if kind == 'race':
+                cat = self.categories[i]
+                global_mult *= 1 + self.bonuses[i] * (composition.get(cat, 0) if cat else 0)
+            elif kind == 'global':
+                global_mult *= 1 + self.bonuses[i]
+            elif kind == 'special':
+                special_mult *= 1 + self.bonuses[i]
+        return global_mult, special_mult
+
+    def _observe(self, indices: List[int]):
+        """模拟一个只含伤害卡的语境卡组，记录每个统计键到各时间点的最高累计伤害"""
+        combo = sorted(indices)
+        deck = [self.cards[i] for i in combo]
+        names = {self.cards[i].get('name'): i for i in combo}
+        for j, horizon in enumerate(self.horizons):
+            self.simulations += 1
+            result = self._simulator.simulate(deck, max_time=horizon, seed=self._seed, stop_on_target=False)
+            for key, damage in result['damage_breakdown'].items():
+                if key == 'base_dps' or damage <= 0:
+                    continue
+                series = self._key_damage.setdefault(key, [0.0] * len(self.horizons))
+                if damage > series[j]:
+                    series[j] = damage
+                owner = names.get(key.split('-')[0])
+                owners = self._key_owners.setdefault(key, set())
+                if owner is not None:
+                    owners.add(owner)
+                elif len(combo) <= 2:
+                    # 没有署名的统计键（如燃烧DOT）归给产生它的小语境里的每张卡
+                    owners.update(combo)
+
+    def _card_values(self, slack: float) -> List[List[float]]:
+        """按统计键归属汇总每张卡在各时间点的乐观累计伤害，再乘以余量系数"""
+        n = len(self.cards)
+        damage = [i for i in range(n) if self.kinds[i] is None]
+        for a in damage:
+            self._observe([a])
+            for b in damage:
+                if b > a:
+                    self._observe([a, b])
+        self._observe(damage)
+        for i in damage:
+            self._observe([j for j in damage if j != i])
+        values = [[0.0] * n for _ in self.horizons]
+        for key, series in self._key_damage.items():
+            # 累计伤害随时间不减
+            running = 0.0
+            for j, damage_j in enumerate(series):
+                running = max(running, damage_j)
+                for i in self._key_owners.get(key, ()):
+                    values[j][i] += slack * running
+        return values
+
+    def min_combat_time(self, global_mult: float, mult: float, damage_at) -> float:
+        """战斗时长下界：基础DPS与乐观累计伤害之和最早在何时达到目标伤害
+
+        damage_at(j) 返回到 horizons[j] 为止的乐观累计伤害，随 j 不减，因此可以二分。
+        """
+        base_rate = self.base_dps * global_mult
+        horizons = self.horizons
+        lo, hi = 0, len(horizons)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if base_rate * horizons[mid] + mult * damage_at(mid) >= self.target:
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo >= len(horizons):
+            return horizons[-1]
+        start = horizons[lo - 1] if lo > 0 else 0.0
+        if base_rate <= 0:
+            return start
+        return max(start, (self.target - mult * damage_at(lo)) / base_rate)
+
+    def _min_combat_time(self) -> float:
+        """所有卡组的战斗时长下界：全部卡牌与最大倍率下也要打满目标伤害"""
+        global_mult, special_mult = self.multipliers(range(len(self.cards)))
+        totals = [sum(row) for row in self.values]
+        return self.min_combat_time(global_mult, global_mult * special_mult, totals.__getitem__)
+
+    def bound(self, global_mult: float, mult: float, damage_at) -> float:
+        """给定倍率上界与各时间点的乐观累计伤害，返回 deck_dps 上界
+
+        战斗时长 T 不短于 min_combat_time；T 落在 (horizons[j-1], horizons[j]] 时，
+        DPS 不超过累计伤害除以 T，且达标即停要求 (基础DPS + DPS) * T
+        不超过目标伤害加上越过量。后一项随 T 递减，超过已有上界即可停止。
+        """
+        t_min = max(self.t_min, self.min_combat_time(global_mult, mult, damage_at))
+        if t_min <= 0:
+            return float('inf')
+        limit = self.target * (1.0 + self.overshoot)
+        best = 0.0
+        start = 0.0
+        for j, horizon in enumerate(self.horizons):
+            lo = max(start, t_min)
+            start = horizon
+            if lo > horizon:
+                continue
+            cap = limit / lo - self.base_dps
+            if cap <= best:
+                break
+            best = max(best, min(mult * damage_at(j) / lo, cap))
+        return best
+
+
+def approximate_deck_search(simulator: DanqingEventSimulator, cards: List[dict], target_cost: int, top_k: int = 10, max_time: float = 300.0, seed: Optional[int] = None, bound_slack: float = 1.2, bounds: Optional[HeuristicBound] = None) -> dict:
+    """在费用恰为 target_cost 的卡组中近似搜索 deck_dps 最高的 top_k 个（可能漏掉被启发式上界误剪的卡组）
+
+    返回 {'ranked': [(deck_dps, 组合下标), ...], 'results': [...], 'evaluated', 'pruned', 'total', 'bound_simulations'}。
+    组合下标按卡牌原始顺序升序，与穷举评估的排序键一致。
+    """
+    target_cost = int(target_cost)
+    top_k = max(1, int(top_k))
+    if bounds is None:
+        bounds = HeuristicBound(simulator, cards, max_time, seed, bound_slack)
+    kinds = bounds.kinds
+    final_values = bounds.values[-1]
+    n_horizons = len(bounds.horizons)
+
+    # 先按单位费用贡献从高到低分支伤害卡，让高 DPS 卡组尽早成为剪枝基准；再分支乘区卡，最后是无伤害的卡
+    def branch_rank(i: int) -> tuple:
+        group = 1 if kinds[i] is not None else (0 if final_values[i] > 0 else 2)
+        return group, -final_values[i] / max(1, int(cards[i].get('cost', 0) or 0)), i
+
+    order = sorted(range(len(cards)), key=branch_rank)
+    costs = [int(cards[i].get('cost', 0) or 0) for i in order]
+    values = [[row[i] for i in order] for row in bounds.values]
+    counts = count_subsets(costs, target_cost)
+    # 分数背包的候选顺序：每个时间点上剩余伤害卡按单位费用贡献排列
+    ratio_orders = [
+        sorted((p for p in range(len(order)) if kinds[order[p]] is None and row[p] > 0), key=lambda p: -row[p] / max(1, costs[p]))
+        for row in values
+    ]
+
+    heap: List[tuple] = []
+    stats = {'evaluated': 0, 'pruned': 0}
+    chosen: List[int] = []
+
+    def upper_bound(pos: int, budget: int, chosen_damage: tuple) -> float:
+        # 还能加入的乘区卡全部按最大同类数量计入
+        possible = chosen + [order[p] for p in range(pos, len(order)) if costs[p] <= budget]
+        global_mult, special_mult = bounds.multipliers(possible)
+        cache: Dict[int, float] = {}
+
+        def damage_at(j: int) -> float:
+            # 第 j 个时间点上剩余预算的分数背包
+            if j in cache:
+                return cache[j]
+            row = values[j]
+            extra = 0.0
+            room = budget
+            for p in ratio_orders[j]:
+                if room <= 0:
+                    break
+                if p < pos or costs[p] > budget:
+                    continue
+                if costs[p] <= room:
+                    extra += row[p]
+                    room -= costs[p]
+                else:
+                    extra += row[p] * room / costs[p]
+                    room = 0
+            cache[j] = chosen_damage[j] + extra
+            return cache[j]
+
+        return bounds.bound(global_mult, global_mult * special_mult, damage_at)
+
+    def evaluate():
+        combo = tuple(sorted(chosen))
+        result = simulator.simulate([cards[i] for i in combo], max_time=max_time, seed=seed)
+        stats['evaluated'] += 1
+        entry = (result['deck_dps'], combo, result)
+        if len(heap) < top_k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+    def search(pos: int, budget: int, chosen_damage: tuple):
+        if budget == 0:
+            evaluate()
+            return
+        if pos >= len(order) or counts[pos][budget] == 0:
+            return
+        if len(heap) >= top_k and upper_bound(pos, budget, chosen_damage) < heap[0][0]:
+            stats['pruned'] += counts[pos][budget]
+            return
+        if costs[pos] <= budget:
+            chosen.append(order[pos])
+            search(pos + 1, budget - costs[pos], tuple(d + row[pos] for d, row in zip(chosen_damage, values)))
+            chosen.pop()
+        search(pos + 1, budget, chosen_damage)
+
+    search(0, target_cost, (0.0,) * n_horizons)
+    ranked = sorted(heap, key=lambda x: x[:2], reverse=True)
+    return {
+        'ranked': [(dps, combo) for dps, combo, _ in ranked],
+        'results': [result for _, _, result in ranked],
+        'evaluated': stats['evaluated'],
+        'pruned': stats['pruned'],
+        'total': counts[0][target_cost],
+        'bound_simulations': bounds.simulations,
+    }
+
@@ -0,0 +1,129 @@
+"""丹青模拟器的事件队列后端
+
+条目为 (时间, 优先级, 序号, 事件类型, 槽位)，按元组大小出队。
+各后端提供 push(entry)、pop()、peek_time()、entries() 与 len()，push/pop 为可直接调用的属性，
+模拟器主循环把它们取成局部变量以减少属性查找。
+"""
+import heapq
+from functools import partial
+from typing import List, Optional
+
+QUEUE_BACKENDS = ("heap", "wheel")
+
+
+class HeapEventQueue:
+    """heapq 二叉堆"""
+
+    __slots__ = ("heap", "push", "pop")
+
+    def __init__(self):
+        self.heap: List[tuple] = []
+        # partial 包装的是 C 实现，入队/出队不经过 Python 帧
+        self.push = partial(heapq.heappush, self.heap)
+        self.pop = partial(heapq.heappop, self.heap)
+
+    def peek_time(self) -> Optional[float]:
+        heap = self.heap
+        return heap[0][0] if heap else None
+
+    def entries(self) -> List[tuple]:
+        """队列中全部条目（无序）"""
+        return list(self.heap)
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+
+class TimerWheelQueue:
+    """分桶时间轮（日历队列）
+
+    时间按 resolution 分桶，n_slots 个桶组成一圈；超出一圈的条目暂存在溢出堆中，
+    游标前进时迁回时间轮。桶内仍是按完整元组排序的小堆，所以出队顺序与二叉堆完全一致。
+    """
+
+    __slots__ = ("resolution", "_inv", "_mask", "_slots", "_cursor", "_size", "_overflow", "push", "pop")
+
+    def __init__(self, resolution: float = 1.0, n_slots: int = 64):
+        if resolution <= 0:
+            raise ValueError("resolution 必须为正数")
+        if n_slots <= 0 or n_slots & (n_slots - 1):
+            raise ValueError("n_slots 必须为 2 的幂")
+        self.resolution = float(resolution)
+        self._inv = 1.0 / self.resolution
+        self._mask = n_slots - 1
+        self._slots: List[List[tuple]] = [[] for _ in range(n_slots)]
+        # 游标为当前桶的绝对编号；时间轮中的条目编号都在 [游标, 游标 + n_slots) 内
+        self._cursor = 0
+        self._size = 0
+        self._overflow: List[tuple] = []
+        self.push = self._push
+        self.pop = self._pop
+
+    def _push(self, entry: tuple):
+        index = int(entry[0] * self._inv)
+        cursor = self._cursor
+        if index < cursor:
+            index = cursor
+        if index - cursor <= self._mask:
+            heapq.heappush(self._slots[index & self._mask], entry)
+            self._size += 1
+        else:
+            heapq.heappush(self._overflow, entry)
+
+    def _advance(self) -> Optional[List[tuple]]:
+        """把游标移到第一个非空桶并返回该桶，队列为空时返回 None"""
+        slots = self._slots
+        mask = self._mask
+        cursor = self._cursor
+        if not self._size:
+            if not self._overflow:
+                return None
+            # 时间轮已空：直接跳到溢出堆中最早条目所在的桶
+            cursor = max(cursor, int(self._overflow[0][0] * self._inv))
+        else:
+            bucket = slots[cursor & mask]
+            if bucket:
+                return bucket
+            cursor += 1
+            while not slots[cursor & mask]:
+                cursor += 1
+        self._cursor = cursor
+        overflow = self._overflow
+        if overflow:
+            inv = self._inv
+            limit = cursor + mask
+            while overflow and int(overflow[0][0] * inv) <= limit:
+                entry = heapq.heappop(overflow)
+                heapq.heappush(slots[max(cursor, int(entry[0] * inv)) & mask], entry)
+                self._size += 1
+        return slots[cursor & mask]
+
+    def _pop(self) -> tuple:
+        bucket = self._advance()
+        if bucket is None:
+            raise IndexError("pop from empty event queue")
+        self._size -= 1
+        return heapq.heappop(bucket)
+
+    def peek_time(self) -> Optional[float]:
+        bucket = self._advance()
+        return bucket[0][0] if bucket else None
+
+    def entries(self) -> List[tuple]:
+        """队列中全部条目（无序）"""
+        items = list(self._overflow)
+        for bucket in self._slots:
+            items.extend(bucket)
+        return items
+
+    def __len__(self) -> int:
+        return self._size + len(self._overflow)
+
+
+def make_event_queue(kind: str = "heap"):
+    """按名称创建事件队列后端"""
+    if kind == "heap":
+        return HeapEventQueue()
+    if kind == "wheel":
+        return TimerWheelQueue()
+    raise ValueError(f"未知的事件队列后端: {kind}")
@@ -0,0 +1,228 @@
+"""丹青模拟器的期望值引擎
+
+固定时长（不在达标时提前结束）的战斗中，全部随机性都来自 _successes(n, p) 的二项判定。
+这里不掷骰：在每次判定处按二项分布把当前分支分裂成所有可能的结果，带权推进，
+后续走向完全相同的分支随时合并。伤害与计数在每个事件后按分支权重计入期望并清零，
+不参与状态比较，所以分支数只取决于燃烧层数、DOT/爆燃时刻、冰箭计数和队列内容等状态。
+"""
+import heapq
+import itertools
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from tools.danqing.core.cards_sim_ver1 import CardValueTable, CombatState, DanqingEventSimulator, EventType
+from tools.danqing.core.event_queue import HeapEventQueue
+
+# 处理过程中会做概率判定的事件类型
+BRANCHING_EVENTS = frozenset((EventType.ICE_ARROW, EventType.BURN_APPLY, EventType.PULSE))
+
+
+class _Branch(Exception):
+    """处理事件时遇到尚未确定结果的判定"""
+
+    def __init__(self, n: int, p: float):
+        super().__init__(n, p)
+        self.n = n
+        self.p = p
+
+
+class _Particle:
+    """一个带权分支：战斗状态、事件队列与下一个调度序号"""
+
+    __slots__ = ("weight", "state", "queue", "seq", "signature")
+
+    def __init__(self, weight: float, state: CombatState, queue: HeapEventQueue, seq: int):
+        self.weight = weight
+        self.state = state
+        self.queue = queue
+        self.seq = seq
+        self.signature = None
+
+
+def _binomial_pmf(n: int, p: float) -> List[tuple]:
+    q = 1.0 - p
+    return [(k, math.comb(n, k) * p ** k * q ** (n - k)) for k in range(n + 1)]
+
+
+class ExpectedValueSimulator:
+    """按概率分布精确计算固定时长战斗的期望伤害
+
+    结果字段与 DanqingEventSimulator.simulate 相同（计数为期望值），另含 states_peak。
+    分支数超过 max_states 时抛出 ValueError，此时应改用蒙特卡洛批量模拟。
+    """
+
+    def __init__(self, base_atk: float, base_dps: float, base_hp: float = 200000.0, value_table: Optional[CardValueTable] = None, max_states: int = 4096):
+        self.simulator = DanqingEventSimulator(base_atk, base_dps, base_hp, value_table=value_table, analytic=True, queue='heap')
+        self.max_states = max(1, int(max_states))
+        self._decisions: List[int] = []
+        self._cursor = 0
+
+    def _successes(self, n: int, p: float, source: Optional[str] = None) -> int:
+        """按预先给定的结果回放判定；结果用完时抛出 _Branch 让调用方分裂"""
+        if n <= 0 or p <= 0.0:
+            return 0
+        if p >= 1.0:
+            return n
+        index = self._cursor
+        if index < len(self._decisions):
+            self._cursor = index + 1
+            return self._decisions[index]
+        raise _Branch(n, p)
+
+    def simulate(self, deck: List[dict], level: int = 6, max_time: float = 300.0, card_levels: Optional[dict] = None) -> dict:
+        """计算期望结果（等价于无穷多次 stop_on_target=False 模拟的平均）"""
+        sim = self.simulator
+        max_time = float(max_time)
+        saved_successes = sim._successes
+        sim._successes = self._successes
+        try:
+            state, plan = sim._begin_simulation(deck, level, max_time, False, card_levels)
+            return self._run(deck, state, plan, max_time)
+        finally:
+            sim._successes = saved_successes
+
+    def _run(self, deck: List[dict], state: CombatState, plan, max_time: float) -> dict:
+        sim = self.simulator
+        handlers = sim._event_handlers
+        totals = {"damage": 0.0, "ice_arrow": 0.0, "burn_add": 0.0, "pulse": 0.0, "explode": 0.0}
+        breakdown: Dict[str, float] = defaultdict(float)
+        cast_counts: Dict[str, float] = defaultdict(float)
+        # 齐昊的冷却缩减只看冰箭总数是否超过冷却，超出部分不影响后续，截断后才能合并分支
+        arrow_cap = max((int(math.ceil(cd)) for card, cd in plan.cast_slots if card.get('id') == 'qihao'), default=0)
+        # 没有寒冰剑时冰箭计数器只增不用
+        tracks_sword = bool(plan.ice_sword_threshold and plan.ice_sword_threshold > 0)
+
+        def harvest(particle: _Particle, arrows_before: int):
+            st = particle.state
+            w = particle.weight
+            totals["damage"] += w * st.total_damage
+            st.total_damage = 0.0
+            for k, v in st.damage_breakdown.items():
+                breakdown[k] += w * v
+            st.damage_breakdown.clear()
+            for k, v in st.cast_counts.items():
+                cast_counts[k] += w * v
+            st.cast_counts.clear()
+            totals["ice_arrow"] += w * (st.ice_arrow_total - arrows_before)
+            st.ice_arrow_total = min(st.ice_arrow_total, arrow_cap)
+            if not tracks_sword:
+                st.ice_arrow_sword_counter = 0
+            totals["burn_add"] += w * st.burn_add_total
+            totals["pulse"] += w * st.pulse_count
+            totals["explode"] += w * st.explode_count
+            st.burn_add_total = st.pulse_count = st.explode_count = 0
+            # 已过期的雪地熊层在下次查询前一定会被移除，提前移除以便合并
+            expires = st.bear_stack_expires
+            while expires and expires[0] <= st.current_time:
+                expires.popleft()
+
+        def signature(particle: _Particle) -> tuple:
+            st = particle.state
+            queue = tuple((e[0], e[1], e[3], e[4]) for e in sorted(particle.queue.heap))
+            return (
+                queue, st.burn_stacks, st.burn_dot_next_time, st.burn_explode_pending,
+                st.ice_arrow_total, st.ice_arrow_sword_counter, st.bear_stack_multiplier, tuple(st.bear_stack_expires),
+            )
+
+        def run_handler(particle: _Particle, kind, slot: int, event_time: float, decisions: List[int]):
+            queue = particle.queue
+            sim.event_queue = queue
+            sim._push = queue.push
+            sim._seq = itertools.count(particle.seq)
+            self._decisions = decisions
+            self._cursor = 0
+            particle.state.current_time = event_time
+            handlers[kind](particle.state, plan, slot)
+            particle.seq = next(sim._seq)
+
+        def advance(particle: _Particle) -> List[_Particle]:
+            event_time, _, _, kind, slot = heapq.heappop(particle.queue.heap)
+            arrows_before = particle.state.ice_arrow_total
+            if kind not in BRANCHING_EVENTS:
+                run_handler(particle, kind, slot, event_time, [])
+                harvest(particle, arrows_before)
+                return [particle]
+            base_state = particle.state
+            base_heap = particle.queue.heap
+            children = []
+            work = [([], 1.0)]
+            while work:
+                decisions, prob = work.pop()
+                queue = HeapEventQueue()
+                queue.heap.extend(base_heap)
+                child = _Particle(particle.weight * prob, base_state.copy(), queue, particle.seq)
+                try:
+                    run_handler(child, kind, slot, event_time, decisions)
+                except _Branch as branch:
+                    for k, pk in _binomial_pmf(branch.n, branch.p):
+                        if pk > 0.0:
+                            work.append((decisions + [k], prob * pk))
+                    continue
+                harvest(child, arrows_before)
+                children.append(child)
+            return children
+
+        initial = state.copy()
+        # 初始事件安排期间的伤害（如有）直接计入
+        first = _Particle(1.0, state, sim.event_queue, next(sim._seq))
+        harvest(first, 0)
+        first.signature = signature(first)
+        particles = {first.signature: first}
+        states_peak = 1
+        while particles:
+            times = [p.queue.heap[0][0] for p in particles.values() if p.queue.heap]
+            if not times:
+                break
+            now = min(times)
+            if now > max_time:
+                break
+            merged: Dict[tuple, _Particle] = {}
+            for particle in particles.values():
+                heap = particle.queue.heap
+                if heap and heap[0][0] == now:
+                    children = advance(particle)
+                    for child in children:
+                        child.signature = signature(child)
+                else:
+                    children = [particle]
+                for child in children:
+                    existing = merged.get(child.signature)
+                    if existing is None:
+                        merged[child.signature] = child
+                    else:
+                        existing.weight += child.weight
+            particles = merged
+            states_peak = max(states_peak, len(particles))
+            if states_peak > self.max_states:
+                raise ValueError(f"期望值引擎的分支数超过上限 {self.max_states}，请改用蒙特卡洛模拟")
+
+        # 确定性周期来源与基础秒伤与分支无关，按整场时长一次计入
+        closing = initial
+        closing.total_damage = 0.0
+        closing.damage_breakdown = defaultdict(float)
+        closing.cast_counts = defaultdict(int)
+        closing.ice_arrow_total = closing.burn_add_total = closing.pulse_count = closing.explode_count = 0
+        closing.current_time = max_time
+        sim._apply_analytic_sources(closing, plan, max_time)
+        harvest(_Particle(1.0, closing, HeapEventQueue(), 0), 0)
+
+        base_rate = state.base_dps * state.global_multiplier
+        base_damage = base_rate * max_time
+        totals["damage"] += base_damage
+        breakdown['base_dps'] += base_damage
+
+        total_dps = totals["damage"] / max_time if max_time > 0 else 0.0
+        return {
+            'combat_time': max_time,
+            'total_damage': totals["damage"],
+            'total_dps': total_dps,
+            'deck_dps': total_dps - base_rate,
+            'base_dps_contribution': base_rate,
+            'global_multiplier': state.global_multiplier,
+            'damage_breakdown': dict(breakdown),
+            'cast_counts': dict(cast_counts),
+            'event_counts': {k: totals[k] for k in ('ice_arrow', 'burn_add', 'pulse', 'explode')},
+            'total_cost': sum(int(card.get('cost', 0) or 0) for card in deck),
+            'states_peak': states_peak,
+        }
@@ -0,0 +1,370 @@
+"""丹青模拟的锁步向量化后端
+
+事件引擎一次只推进一场战斗，大批量重复时解释器开销占了绝大部分时间。这里把 N 次重复放进
+长度为 N 的 numpy 数组，在固定 0.1 秒的时间格上同步推进：每个时间格按事件引擎的优先级顺序
+（爆燃、技能释放、冰箭、脉冲、回响、燃烧 DOT、燃烧施加）一次处理全部重复，触发判定用
+numpy 的二项分布向量化抽样。卡组现有的事件时刻都落在 0.1 秒的网格上，没有事件的时间格直接跳过。
+
+与事件引擎的差别只在同一时间格内的合并：
+- 同一时刻的多次燃烧施加合并为一次（林峰的额外判定按总层数抽样，与逐次判定同分布）；
+- 同一时刻的多次技能释放按卡组顺序处理，不按入队先后；
+- 达标即停时，达标所在时间格里剩余的事件也会处理完，伤害略有超出。
+爆燃清空层数后旧的 DOT 事件仍会触发、从而可能同时存在多条 DOT 链，这一点按 DOT 相位
+（时刻模 3 秒）记录每条链的条数来复现。随机数由 numpy 生成，与事件引擎逐次的结果不同，只保证分布一致。
+"""
+import math
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from tools.danqing.core.cards_sim_ver1 import CardValueTable, DanqingEventSimulator, EventType, summarize_samples
+
+TICK = 0.1
+
+
+class _LockstepRun:
+    """一批重复的向量状态；各 _handle_* 与 DanqingEventSimulator 中同名处理函数一一对应"""
+
+    def __init__(self, sim: 'LockstepSimulator', state, plan, initial: List[tuple], n: int, rng: np.random.Generator, max_time: float, stop_on_target: bool):
+        self.plan = plan
+        self.n = n
+        self.rng = rng
+        self.ticks = sim.ticks
+        self.max_time = float(max_time)
+        self.tick = sim.tick
+        self.horizon = int(math.floor(self.max_time / sim.tick + 1e-9))
+        self.target = float(sim.target_damage)
+        atk = state.base_atk
+        self.atk = atk
+        self.global_multiplier = state.global_multiplier
+        self.special_multiplier = state.special_damage_multiplier
+        self.multiplier = state.global_multiplier * state.special_damage_multiplier
+        self.base_rate = state.base_dps * state.global_multiplier
+        self.period = self.ticks(3.0)
+
+        self.damage = np.zeros(n)
+        self.breakdown: Dict[str, np.ndarray] = {}
+        self.cast_counts: Dict[str, np.ndarray] = {}
+        self.events = {key: np.zeros(n, dtype=np.int64) for key in ('ice_arrow', 'burn_add', 'pulse', 'explode')}
+        self.alive = np.ones(n) if stop_on_target else None
+        self.stop_time = np.full(n, self.max_time)
+
+        # 冰箭与雪地熊：bear_added 为按时刻递增的 (施加时间格, 每次重复的层数)
+        self.arrow_total = np.zeros(n, dtype=np.int64)
+        self.sword_counter = np.zeros(n, dtype=np.int64)
+        self.bear_stacks = np.zeros(n, dtype=np.int64)
+        self.bear_added = deque()
+        self.bear_window = self.ticks(10.0)
+
+        # 燃烧：chains[相位] 为该相位上的 DOT 链条数，dot_next 为 -1 表示没有待触发的 DOT
+        self.stacks = np.zeros(n, dtype=np.int64)
+        self.dot_next = np.full(n, -1, dtype=np.int64)
+        self.chains = np.zeros((self.period, n), dtype=np.int64)
+        self.live_phases = set()
+        self.explode_pending = np.zeros(n, dtype=bool)
+        self.proc_burns = np.zeros(n, dtype=np.int64)
+
+        # 按时间格登记的待处理事件
+        self.explode_at: Dict[int, np.ndarray] = {}
+        self.sword_at: Dict[int, np.ndarray] = {}
+        self.echo_at: Dict[int, np.ndarray] = {}
+        self.scheduled: Dict[int, List[tuple]] = {}
+        self.cast_next: List[np.ndarray] = []
+        self.cast_slots: List[int] = []
+        for time, _, _, kind, slot in initial:
+            if kind == EventType.SKILL_CAST:
+                self.cast_slots.append(slot)
+                self.cast_next.append(np.full(n, self.ticks(time), dtype=np.int64))
+            else:
+                self.scheduled.setdefault(self.ticks(time), []).append((kind, slot))
+        self.cast_min = [int(a[0]) for a in self.cast_next]
+
+    def add(self, key: str, values):
+        if self.alive is not None:
+            values = values * self.alive
+        acc = self.breakdown.get(key)
+        if acc is None:
+            acc = self.breakdown[key] = np.zeros(self.n)
+        acc += values
+        self.damage += values
+
+    def count(self, counter: np.ndarray, values):
+        if self.alive is not None:
+            values = values * self.alive.astype(np.int64)
+        counter += values
+
+    def _bear_multiplier(self, k: int) -> np.ndarray:
+        self._expire_bear(k)
+        return np.power(self.plan.bear_multipliers[0], self.bear_stacks) if self.plan.bear_multipliers else np.ones(self.n)
+
+    def _expire_bear(self, k: int):
+        added = self.bear_added
+        while added and added[0][0] + self.bear_window <= k:
+            self.bear_stacks -= added.popleft()[1]
+
+    def _ice_arrows(self, k: int, arrows: np.ndarray):
+        """冰箭计数、寒冰剑计数与雪地熊叠层（_trigger_ice_arrow_effects + _check_ice_sword_trigger）"""
+        self.arrow_total += arrows
+        self.count(self.events['ice_arrow'], arrows)
+        self.sword_counter += arrows
+        if self.plan.bear_multipliers:
+            self._expire_bear(k)
+            stacks = arrows * len(self.plan.bear_multipliers)
+            self.bear_added.append((k, stacks))
+            self.bear_stacks += stacks
+        threshold = self.plan.ice_sword_threshold
+        if threshold:
+            swords = self.sword_counter // threshold
+            if swords.any():
+                self.sword_counter -= swords * threshold
+                at = k + self.ticks(0.1)
+                pending = self.sword_at.get(at)
+                self.sword_at[at] = swords if pending is None else pending + swords
+
+    def _handle_skill_cast(self, k: int, index: int):
+        plan = self.plan
+        card, cooldown = plan.cast_slots[self.cast_slots[index]]
+        card_id = card.get('id')
+        damage_ratio, damage_key, dmg_type = plan.skill_casts[card_id]
+        nxt = self.cast_next[index]
+        due = nxt == k
+        damage = damage_ratio * self.atk * self.global_multiplier
+        if dmg_type in ('ICE_ARROW', 'STORM'):
+            damage *= self.special_multiplier
+        if dmg_type == 'ICE_ARROW':
+            damage = damage * self._bear_multiplier(k)
+        self.add(damage_key, damage * due)
+        counts = self.cast_counts.get(damage_key)
+        if counts is None:
+            counts = self.cast_counts[damage_key] = np.zeros(self.n, dtype=np.int64)
+        self.count(counts, due.astype(np.int64))
+        if dmg_type == 'ICE_ARROW':
+            self._ice_arrows(k, due.astype(np.int64))
+        if card_id == 'qihao':
+            cd = np.where(self.arrow_total > 0, np.maximum(1.0, cooldown - self.arrow_total), float(cooldown))
+            nxt[due] += np.rint(cd[due] / self.tick).astype(np.int64)
+        else:
+            nxt[due] += self.ticks(cooldown)
+        self.cast_min[index] = int(nxt.min())
+
+    def _handle_ice_arrow(self, k: int, slot: int):
+        plan = self.plan
+        count, interval = plan.arrow_slots[slot]
+        count = np.full(self.n, count, dtype=np.int64)
+        for extra_chance in plan.linfeng_arrow_chances:
+            count += self.rng.binomial(count, extra_chance)
+        for burn_chance in plan.shangguance_burn_chances:
+            self.proc_burns += self.rng.binomial(count, burn_chance)
+        self._ice_arrows(k, count)
+        self.scheduled.setdefault(k + self.ticks(interval), []).append((EventType.ICE_ARROW, slot))
+
+    def _handle_pulse(self, k: int, is_fan: bool, count):
+        plan = self.plan
+        rng = self.rng
+        n = self.n
+        self.count(self.events['pulse'], count)
+        if is_fan:
+            self.add('折扇-脉冲', plan.fan_pulse_ratio * count * self.atk * self.multiplier)
+        for extra_ratio in plan.dice_ratios:
+            hits = rng.binomial(count, 0.5, size=n)
+            self.add('神木骰-追加', extra_ratio * self.atk * self.multiplier * hits)
+        for burn_chance in plan.suishou_burn_chances:
+            self.proc_burns += 3 * rng.binomial(count, burn_chance, size=n)
+        if is_fan and plan.fan_pulse_ratio > 0:
+            for efficiency in plan.mirror_efficiencies:
+                hits = rng.binomial(count, 0.5, size=n)
+                echo = plan.fan_pulse_ratio * efficiency * self.atk * self.multiplier * hits
+                for i in range(6):
+                    at = k + self.ticks(i + 1)
+                    if at <= self.horizon:
+                        pending = self.echo_at.get(at)
+                        self.echo_at[at] = echo if pending is None else pending + echo
+
+    def _handle_dot_tick(self, k: int):
+        phase = k % self.period
+        chains = self.chains[phase]
+        fired = chains > 0
+        burning = fired & (self.stacks > 0)
+        burn_damage = self.plan.burn_tick_ratio * self.atk * self.multiplier * self.stacks * chains
+        self.add(self.plan.burn_damage_key, np.where(burning, burn_damage, 0.0))
+        chains[~burning] = 0
+        self.dot_next[fired] = np.where(burning[fired], k + self.period, -1)
+        if not chains.any():
+            self.live_phases.discard(phase)
+
+    def _handle_burn_apply(self, k: int, stacks: np.ndarray):
+        plan = self.plan
+        applied = stacks > 0
+        if not applied.any():
+            return
+        for extra_burn_chance in plan.linfeng_burn_chances:
+            stacks = stacks + self.rng.binomial(stacks, extra_burn_chance)
+        for trigger_ratio in plan.twotails_ratios:
+            self.add('二尾妖狐-被动', trigger_ratio * stacks * self.atk * self.multiplier)
+        self.count(self.events['burn_add'], stacks)
+        self.stacks = np.minimum(self.stacks + stacks, 12)
+        start = applied & (self.stacks > 0) & ((self.dot_next < 0) | (self.dot_next <= k))
+        if start.any():
+            at = k + self.period
+            self.chains[at % self.period] += start
+            self.live_phases.add(at % self.period)
+            self.dot_next[start] = at
+        if plan.sixtails_card is not None:
+            explode = applied & (self.stacks >= 8) & ~self.explode_pending
+            if explode.any():
+                self.explode_pending |= explode
+                at = k + self.ticks(1.5)
+                pending = self.explode_at.get(at)
+                self.explode_at[at] = explode if pending is None else pending | explode
+
+    def _handle_burn_explode(self, due: np.ndarray):
+        self.explode_pending &= ~due
+        explode = due & (self.stacks > 0)
+        self.count(self.events['explode'], explode.astype(np.int64))
+        self.add('六尾魔狐-爆燃', np.where(explode, self.plan.explode_ratio * self.atk * self.multiplier * self.stacks, 0.0))
+        self.stacks[explode] = 0
+        self.dot_next[explode] = -1
+
+    def _stop_by_base(self, t: float):
+        """基础秒伤在 t 之前让伤害达标的重复，按线性插值求出达标时刻并停止"""
+        reached = (self.alive > 0) & (self.damage + self.base_rate * t >= self.target)
+        if reached.any():
+            self.stop_time[reached] = (self.target - self.damage[reached]) / self.base_rate
+            self.alive[reached] = 0.0
+
+    def run(self) -> dict:
+        plan = self.plan
+        stopping = self.alive is not None
+        for k in range(self.horizon + 1):
+            due = self.scheduled.pop(k, None)
+            explode = self.explode_at.pop(k, None)
+            swords = self.sword_at.pop(k, None)
+            echo = self.echo_at.pop(k, None)
+            casts = [i for i, m in enumerate(self.cast_min) if m == k]
+            dot = k % self.period in self.live_phases
+            if not (due or casts or dot or explode is not None or swords is not None or echo is not None):
+                continue
+            t = k * self.tick
+            if stopping:
+                self._stop_by_base(t)
+            if explode is not None:
+                self._handle_burn_explode(explode)
+            for i in casts:
+                self._handle_skill_cast(k, i)
+            burn_applies = []
+            for kind, slot in due or ():
+                if kind == EventType.ICE_ARROW:
+                    self._handle_ice_arrow(k, slot)
+            for kind, slot in due or ():
+                if kind == EventType.PULSE:
+                    is_fan, count, interval = plan.pulse_slots[slot]
+                    self._handle_pulse(k, is_fan, count)
+                    if interval is not None:
+                        self.scheduled.setdefault(k + self.ticks(interval), []).append((kind, slot))
+                elif kind == EventType.BURN_APPLY:
+                    burn_applies.append(slot)
+            if swords is not None:
+                self._handle_pulse(k, False, swords)
+            if echo is not None:
+                self.add('六合镜-回响', echo)
+            if dot:
+                self._handle_dot_tick(k)
+            # 巨蚁的周期性燃烧（优先级 0）在触发的燃烧（优先级 1）之前，合并为一次施加
+            stacks = self.proc_burns
+            for slot in burn_applies:
+                burn_stacks, interval = plan.burn_slots[slot]
+                stacks = stacks + burn_stacks
+                if interval is not None and interval > 0:
+                    self.scheduled.setdefault(k + self.ticks(interval), []).append((EventType.BURN_APPLY, slot))
+            self._handle_burn_apply(k, stacks)
+            self.proc_burns = np.zeros(self.n, dtype=np.int64)
+            if stopping:
+                reached = (self.alive > 0) & (self.damage + self.base_rate * t >= self.target)
+                self.stop_time[reached] = t
+                self.alive[reached] = 0.0
+                if not self.alive.any():
+                    break
+        if stopping and self.base_rate > 0:
+            self._stop_by_base(self.max_time)
+
+        combat_time = self.stop_time
+        base_damage = self.base_rate * combat_time
+        total_damage = self.damage + base_damage
+        breakdown = {'base_dps': base_damage}
+        breakdown.update((key, values) for key, values in self.breakdown.items() if values.any())
+        total_dps = np.divide(total_damage, combat_time, out=np.zeros(self.n), where=combat_time > 0)
+        return {
+            'combat_time': combat_time,
+            'total_damage': total_damage,
+            'total_dps': total_dps,
+            'deck_dps': total_dps - self.base_rate,
+            'damage_breakdown': breakdown,
+            'cast_counts': {key: values for key, values in self.cast_counts.items() if values.any()},
+            'event_counts': self.events,
+        }
+
+
+class LockstepSimulator:
+    """锁步向量化的批量模拟器：simulate_batch 的参数与返回值与 DanqingEventSimulator 相同
+
+    卡组编译与静态修正沿用 DanqingEventSimulator；每 chunk_size 次重复一起推进，限制内存占用。
+    """
+
+    def __init__(self, base_atk: float, base_dps: float, base_hp: float = 200000.0, value_table: Optional[CardValueTable] = None, tick: float = TICK, chunk_size: int = 8192):
+        if tick <= 0:
+            raise ValueError("时间格必须为正数")
+        self.base_atk = base_atk
+        self.base_dps = base_dps
+        self.base_hp = base_hp
+        self.value_table = value_table
+        self.tick = float(tick)
+        self.chunk_size = max(1, int(chunk_size))
+        self.target_damage = 10_000_000
+
+    def ticks(self, seconds: float) -> int:
+        """时长对应的时间格数（就近取整）"""
+        return int(round(float(seconds) / self.tick))
+
+    def simulate_batch(self, deck: List[dict], n_runs: int, level: int = 6, max_time: float = 300.0, seed: Optional[int] = None, stop_on_target: bool = True, card_levels: Optional[dict] = None, steady_state=None, timeline: Optional[float] = None, ci_stop: Optional[float] = None, min_runs: int = 5) -> dict:
+        """n_runs 次重复一起按时间格推进；不支持稳态外推、伤害时间线与 ci_stop 提前停止"""
+        n_runs = int(n_runs)
+        if n_runs <= 0:
+            raise ValueError("n_runs 必须为正整数")
+        if steady_state is not None or timeline is not None or ci_stop is not None:
+            raise ValueError("锁步后端不支持稳态外推、伤害时间线与 ci_stop 提前停止")
+        compiler = DanqingEventSimulator(self.base_atk, self.base_dps, self.base_hp, value_table=self.value_table, analytic=False)
+        state, plan = compiler._begin_simulation(deck, level, max_time, False, card_levels)
+        initial = sorted(compiler.event_queue.entries())
+        rng = np.random.default_rng(seed)
+
+        chunks = []
+        for start in range(0, n_runs, self.chunk_size):
+            run = _LockstepRun(self, state, plan, initial, min(self.chunk_size, n_runs - start), rng, max_time, stop_on_target)
+            chunks.append(run.run())
+
+        def joined(key: str) -> np.ndarray:
+            return np.concatenate([c[key] for c in chunks])
+
+        def mean_of(field: str) -> dict:
+            keys = list(dict.fromkeys(k for c in chunks for k in c[field]))
+            return {k: float(sum(c[field][k].sum() for c in chunks if k in c[field])) / n_runs for k in keys}
+
+        dps_samples = joined('total_dps').tolist()
+        base_contribution = state.base_dps * state.global_multiplier
+        return {
+            'n_runs': n_runs,
+            'seed': seed,
+            'dps': summarize_samples(dps_samples),
+            'deck_dps': summarize_samples(joined('deck_dps').tolist()),
+            'dps_samples': dps_samples,
+            'combat_time': float(joined('combat_time').mean()),
+            'total_damage': float(joined('total_damage').mean()),
+            'base_dps_contribution': base_contribution,
+            'global_multiplier': state.global_multiplier,
+            'damage_breakdown': mean_of('damage_breakdown'),
+            'cast_counts': mean_of('cast_counts'),
+            'event_counts': mean_of('event_counts'),
+            'total_cost': sum(int(card.get('cost', 0) or 0) for card in deck),
+            'backend': 'lockstep',
+        }
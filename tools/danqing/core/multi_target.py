@@ -0,0 +1,251 @@
+"""丹青模拟器的多目标模式
+
+0 号为主目标。按卡牌描述划分作用范围：
+- 单体：技能、冰箭（含上官策的燃烧）、玄冰风暴只作用于主目标；
+- 范围：巨蚁的燃烧、各类脉冲（折扇、神木骰、岁兽、六合镜回响）作用于所有目标，
+  六尾魔狐的爆燃按引爆的层数对所有目标造成伤害。
+燃烧层数、DOT 时刻与爆燃标记按目标存成数组；同一时刻被同一效果命中的目标组成一个目标组，
+事件只携带目标组序号，处理时对整组做数组运算，不逐个目标循环。
+雪地熊的层数只由命中主目标的冰箭施加、也只作用于这些冰箭，仍按单目标方式记录。
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from tools.danqing.core.cards_sim_ver1 import CardValueTable, CombatState, DanqingEventSimulator, DeckPlan, EventType
+
+# 主目标所在的目标组序号
+PRIMARY_GROUP = 0
+
+
+class MultiTargetState(CombatState):
+    """多目标战斗状态：按目标的燃烧层数、下次 DOT 时刻（无则为 nan）与爆燃标记"""
+
+    def __init__(self, base_atk: float, base_dps: float, base_hp: float, n_targets: int):
+        super().__init__(base_atk, base_dps, base_hp)
+        self.n_targets = n_targets
+        self.target_burn_stacks = np.zeros(n_targets, dtype=np.int64)
+        self.target_dot_next = np.full(n_targets, np.nan)
+        self.target_explode_pending = np.zeros(n_targets, dtype=bool)
+
+    def copy(self) -> 'MultiTargetState':
+        other = super().copy()
+        other.target_burn_stacks = self.target_burn_stacks.copy()
+        other.target_dot_next = self.target_dot_next.copy()
+        other.target_explode_pending = self.target_explode_pending.copy()
+        return other
+
+
+class MultiTargetSimulator(DanqingEventSimulator):
+    """同时面对 n_targets 个目标的事件模拟器，结果为所有目标受到的伤害之和
+
+    n_targets 为 1 时与 DanqingEventSimulator 的结果与随机流完全一致。
+    不支持稳态外推与快照（begin/advance/fork）。
+    """
+
+    def __init__(self, base_atk: float, base_dps: float, base_hp: float = 200000.0, value_table: Optional[CardValueTable] = None, analytic: bool = True, binomial: bool = True, queue: str = 'heap', n_targets: int = 1):
+        super().__init__(base_atk, base_dps, base_hp, value_table=value_table, analytic=analytic, binomial=binomial, queue=queue)
+        self.n_targets = int(n_targets)
+        if self.n_targets <= 0:
+            raise ValueError("n_targets 必须为正整数")
+        # 目标组：序号 -> 目标下标数组；下标字节串 -> 序号
+        self._groups: List[np.ndarray] = []
+        self._group_ids: Dict[bytes, int] = {}
+        self._all_group = PRIMARY_GROUP
+        # 多个目标分别判定时使用的 numpy 随机流，首次需要时由 rng 派生
+        self._np_rng: Optional[np.random.Generator] = None
+
+    def _with_stats(self, base_atk: float, base_dps: float) -> 'MultiTargetSimulator':
+        return MultiTargetSimulator(base_atk, base_dps, self.base_hp, value_table=self.value_table, analytic=self.analytic, binomial=self.binomial, queue=self.queue, n_targets=self.n_targets)
+
+    def _new_state(self) -> MultiTargetState:
+        return MultiTargetState(self.base_atk, self.base_dps, self.base_hp, self.n_targets)
+
+    def _begin_simulation(self, deck: List[dict], level: int, max_time: float, stop_on_target: bool, card_levels: Optional[dict]) -> tuple:
+        self._groups = []
+        self._group_ids = {}
+        self._np_rng = None
+        self._group(np.array([0]))
+        self._all_group = self._group(np.arange(self.n_targets))
+        return super()._begin_simulation(deck, level, max_time, stop_on_target, card_levels)
+
+    def _compile_deck(self, deck: List[dict]) -> DeckPlan:
+        plan = super()._compile_deck(deck)
+        # 燃烧槽位 -> 目标组
+        plan.burn_slot_groups = {}
+        return plan
+
+    def _initialize_events(self, deck: List[dict], state: CombatState, plan: DeckPlan, stop_on_target: bool = False):
+        super()._initialize_events(deck, state, plan, stop_on_target)
+        # 开局登记的燃烧槽位只有巨蚁的周期燃烧，它引燃所有目标
+        for slot in range(len(plan.burn_slots)):
+            plan.burn_slot_groups[slot] = self._all_group
+        # 折扇脉冲命中所有目标
+        n = self.n_targets
+        plan.analytic_sources = [src[:2] + (src[2] * n,) + src[3:] if src[3] == '折扇-脉冲' else src for src in plan.analytic_sources]
+
+    def _run_steady_state(self, state: CombatState, plan: DeckPlan, max_time: float, detector):
+        raise ValueError("多目标模式不支持稳态外推")
+
+    def _capture(self, *args):
+        raise ValueError("多目标模式不支持快照")
+
+    @staticmethod
+    def _build_result(deck: List[dict], state: CombatState) -> dict:
+        result = DanqingEventSimulator._build_result(deck, state)
+        result['n_targets'] = state.n_targets
+        return result
+
+    def _group(self, targets: np.ndarray) -> int:
+        """目标下标数组（升序）对应的目标组序号，没有时登记"""
+        key = targets.tobytes()
+        group = self._group_ids.get(key)
+        if group is None:
+            group = len(self._groups)
+            self._groups.append(targets)
+            self._group_ids[key] = group
+        return group
+
+    def _successes_each(self, n, p: float, size: int, source: Optional[str] = None) -> np.ndarray:
+        """size 个目标各自做 n 次（n 可为数组）概率为 p 的判定的成功次数；单个目标时用标量判定"""
+        if size == 1:
+            return np.array([self._successes(int(np.asarray(n).reshape(-1)[0]), p, source)])
+        if p <= 0.0:
+            return np.zeros(size, dtype=np.int64)
+        if p >= 1.0:
+            return np.broadcast_to(np.asarray(n, dtype=np.int64), (size,)).copy()
+        if self._np_rng is None:
+            self._np_rng = np.random.default_rng(self.rng.getrandbits(64))
+        return self._np_rng.binomial(n, p, size=size)
+
+    def _apply_burn(self, state: CombatState, plan: DeckPlan, stacks: int, group: int = PRIMARY_GROUP):
+        """对目标组施加燃烧"""
+        key = (stacks, group)
+        slot = plan.burn_proc_slots.get(key)
+        if slot is None:
+            slot = plan.add_burn_slot(stacks)
+            plan.burn_proc_slots[key] = slot
+            plan.burn_slot_groups[slot] = group
+        self._schedule_event(state.current_time, EventType.BURN_APPLY, slot, priority=1)
+
+    def _handle_burn_apply(self, state: MultiTargetState, plan: DeckPlan, slot: int):
+        """对目标组施加燃烧：各目标独立判定林峰的额外层数，二尾妖狐按每个目标的层数造成伤害"""
+        stacks, interval = plan.burn_slots[slot]
+        if stacks <= 0:
+            return
+        now = float(state.current_time)
+        targets = self._groups[plan.burn_slot_groups[slot]]
+        added = np.full(len(targets), stacks, dtype=np.int64)
+
+        for extra_burn_chance in plan.linfeng_burn_chances:
+            added += self._successes_each(added, extra_burn_chance, len(targets), 'linfeng-燃烧')
+        total_added = int(added.sum())
+
+        for trigger_ratio in plan.twotails_ratios:
+            trigger_damage = trigger_ratio * total_added * state.base_atk
+            trigger_damage *= state.global_multiplier * state.special_damage_multiplier
+            state.total_damage += trigger_damage
+            state.damage_breakdown['二尾妖狐-被动'] += trigger_damage
+
+        state.burn_add_total += total_added
+        burn_stacks = np.minimum(state.target_burn_stacks[targets] + added, 12)
+        state.target_burn_stacks[targets] = burn_stacks
+
+        # 没有待处理 DOT 的目标从现在起计时（nan 比较为假，即没有 DOT）
+        dot_next = state.target_dot_next[targets]
+        starting = targets[(burn_stacks > 0) & ~(dot_next > now + 1e-9)]
+        if len(starting):
+            next_time = now + 3.0
+            state.target_dot_next[starting] = next_time
+            self._schedule_event(next_time, EventType.DOT_TICK, self._group(starting))
+
+        if plan.sixtails_card is not None:
+            exploding = targets[(burn_stacks >= 8) & ~state.target_explode_pending[targets]]
+            if len(exploding):
+                state.target_explode_pending[exploding] = True
+                self._schedule_event(now + 1.5, EventType.BURN_EXPLODE, self._group(exploding), priority=-1)
+
+        if interval is not None and interval > 0:
+            self._schedule_event(now + interval, EventType.BURN_APPLY, slot)
+
+    def _handle_dot_tick(self, state: MultiTargetState, plan: DeckPlan, slot: int):
+        """目标组的燃烧DOT：仍有燃烧的目标造成伤害并继续计时"""
+        now = float(state.current_time)
+        targets = self._groups[slot]
+        state.target_dot_next[targets] = np.nan
+        burn_stacks = state.target_burn_stacks[targets]
+        burning = targets[burn_stacks > 0]
+        if len(burning):
+            burn_damage = plan.burn_tick_ratio * state.base_atk * int(burn_stacks.sum())
+            burn_damage *= state.global_multiplier * state.special_damage_multiplier
+            state.total_damage += burn_damage
+            state.damage_breakdown[plan.burn_damage_key] += burn_damage
+
+            next_time = now + 3.0
+            state.target_dot_next[burning] = next_time
+            self._schedule_event(next_time, EventType.DOT_TICK, self._group(burning))
+
+    def _handle_burn_explode(self, state: MultiTargetState, plan: DeckPlan, slot: int):
+        """目标组爆燃：每引爆一层对所有目标造成伤害"""
+        targets = self._groups[slot]
+        state.target_explode_pending[targets] = False
+        exploding = targets[state.target_burn_stacks[targets] > 0]
+        if not len(exploding):
+            return
+        state.explode_count += len(exploding)
+
+        damage_per_stack = plan.explode_ratio * state.base_atk
+        total_damage = damage_per_stack * int(state.target_burn_stacks[exploding].sum()) * state.n_targets
+        total_damage *= state.global_multiplier * state.special_damage_multiplier
+
+        state.total_damage += total_damage
+        state.damage_breakdown['六尾魔狐-爆燃'] += total_damage
+        state.target_burn_stacks[exploding] = 0
+        state.target_dot_next[exploding] = np.nan
+
+    def _handle_pulse(self, state: MultiTargetState, plan: DeckPlan, slot: int):
+        """脉冲命中所有目标"""
+        is_fan, count, interval = plan.pulse_slots[slot]
+        n = state.n_targets
+        base_ratio = 0.0
+
+        state.pulse_count += count
+        successes = self._successes
+
+        if is_fan:
+            pulse_ratio = plan.fan_pulse_ratio
+            damage = pulse_ratio * count * state.base_atk * n
+            damage *= state.global_multiplier * state.special_damage_multiplier
+            state.total_damage += damage
+            state.damage_breakdown['折扇-脉冲'] += damage
+            base_ratio = pulse_ratio
+
+        # 每个目标的每次命中独立判定，伤害只取决于总次数
+        for extra_ratio in plan.dice_ratios:
+            hits = successes(count * n, 0.5, 'dice')
+            if hits:
+                extra_damage = extra_ratio * state.base_atk
+                extra_damage *= state.global_multiplier * state.special_damage_multiplier
+                state.total_damage += extra_damage * hits
+                state.damage_breakdown['神木骰-追加'] += extra_damage * hits
+
+        # 岁兽：第 k 次施加落在成功次数不少于 k 的目标上
+        for burn_chance in plan.suishou_burn_chances:
+            hits = self._successes_each(count, burn_chance, n, 'suishou')
+            for k in range(int(hits.max())):
+                self._apply_burn(state, plan, 3, self._group(np.flatnonzero(hits > k)))
+
+        # 六合镜的回响同样命中所有目标
+        if base_ratio > 0:
+            for efficiency in plan.mirror_efficiencies:
+                hits = successes(count, 0.5, 'mirror')
+                if not hits:
+                    continue
+                if self._echo_horizon is not None:
+                    self._settle_echo(state, base_ratio, efficiency, hits * n)
+                else:
+                    self._echo_slots.append([base_ratio, efficiency, hits * n, state.current_time, 0])
+                    self._schedule_event(state.current_time + 1, EventType.PULSE_ECHO, len(self._echo_slots) - 1)
+
+        if interval is not None:
+            self._schedule_event(state.current_time + interval, EventType.PULSE, slot)
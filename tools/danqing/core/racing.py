@@ -0,0 +1,118 @@
+"""丹青卡组的赛跑式评估
+
+从一批候选卡组中选出平均 DPS 最高的 top_k 个，不给每个卡组相同的模拟次数：
+所有卡组先各模拟 initial_runs 次；之后每一轮只有置信区间仍与 top_k 边界重叠的卡组
+（前 top_k 名中下界低于其余卡组最高上界的，以及其余卡组中上界高于前 top_k 名最低下界的）
+继续模拟，次数翻倍（逐次减半式的预算分配，边界判定同 LUCB），直到没有重叠或都达到 max_runs。
+所有卡组用同一组种子，且每个触发来源有自己的随机流（见 variance.StreamedSimulator），
+相同种子下卡组之间的比较更稳定。
+"""
+import random
+import statistics
+from statistics import NormalDist
+from typing import List, Optional
+
+from tools.danqing.core.cards_sim_ver1 import CardValueTable, ci_half_width, spawn_seeds
+from tools.danqing.core.variance import StreamedSimulator
+
+
+class _Entrant:
+    """一个候选卡组的样本与当前置信区间"""
+
+    __slots__ = ("index", "deck", "samples", "mean", "half_width")
+
+    def __init__(self, index: int, deck: List[dict]):
+        self.index = index
+        self.deck = deck
+        self.samples: List[float] = []
+        self.mean = 0.0
+        self.half_width = float('inf')
+
+    @property
+    def lower(self) -> float:
+        return self.mean - self.half_width
+
+    @property
+    def upper(self) -> float:
+        return self.mean + self.half_width
+
+
+def race_decks(decks: List[List[dict]], top_k: int, base_atk: float, base_dps: float, base_hp: float = 200000.0, value_table: Optional[CardValueTable] = None, level: int = 6, max_time: float = 300.0, seed: Optional[int] = None, card_levels: Optional[dict] = None, stop_on_target: bool = False, initial_runs: int = 4, max_runs: int = 64, confidence: float = 0.95) -> dict:
+    """赛跑式选出平均 DPS（stop_on_target 为真时为 deck_dps，否则 total_dps）最高的 top_k 个卡组
+
+    返回全部卡组按均值排序的结果（各自的模拟次数、均值、置信区间半宽、是否入选），
+    以及总模拟次数与每个卡组都模拟 max_runs 次相比节省的次数。
+    """
+    if not decks:
+        raise ValueError("至少需要一个卡组")
+    top_k = max(1, int(top_k))
+    max_runs = int(max_runs)
+    initial_runs = min(max(2, int(initial_runs)), max_runs)
+    if max_runs < 2:
+        raise ValueError("max_runs 至少为 2")
+    if not 0.0 < confidence < 1.0:
+        raise ValueError("confidence 需在 0 与 1 之间")
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    metric = 'deck_dps' if stop_on_target else 'total_dps'
+    sim = StreamedSimulator(base_atk, base_dps, base_hp, value_table=value_table)
+    run_seeds = spawn_seeds(seed, max_runs)
+    card_levels = dict(card_levels or {})
+
+    def extend(entrant: _Entrant, runs: int):
+        for run_seed in run_seeds[len(entrant.samples):runs]:
+            result = sim.simulate(entrant.deck, level=level, max_time=max_time, stop_on_target=stop_on_target, card_levels=card_levels, rng=random.Random(run_seed))
+            entrant.samples.append(result[metric])
+        entrant.mean = statistics.fmean(entrant.samples)
+        entrant.half_width = ci_half_width(entrant.samples, z)
+
+    entrants = [_Entrant(i, deck) for i, deck in enumerate(decks)]
+    for entrant in entrants:
+        extend(entrant, initial_runs)
+
+    rounds = 0
+    while True:
+        entrants.sort(key=lambda e: e.mean, reverse=True)
+        top, rest = entrants[:top_k], entrants[top_k:]
+        if not rest:
+            break
+        top_floor = min(e.lower for e in top)
+        rest_ceiling = max(e.upper for e in rest)
+        active = [e for e in top if e.lower < rest_ceiling] + [e for e in rest if e.upper > top_floor]
+        active = [e for e in active if len(e.samples) < max_runs]
+        if not active:
+            break
+        rounds += 1
+        for entrant in active:
+            extend(entrant, min(max_runs, 2 * len(entrant.samples)))
+
+    entrants.sort(key=lambda e: e.mean, reverse=True)
+    simulations = sum(len(e.samples) for e in entrants)
+    fixed = max_runs * len(entrants)
+    ranking = []
+    for rank, e in enumerate(entrants):
+        others = entrants[top_k:] if rank < top_k else entrants[:top_k]
+        if rank < top_k:
+            decided = all(e.lower >= o.upper for o in others)
+        else:
+            decided = all(e.upper <= o.lower for o in others)
+        ranking.append({
+            'index': e.index,
+            'deck_ids': [card.get('id') for card in e.deck],
+            'runs': len(e.samples),
+            'mean': e.mean,
+            'half_width': e.half_width,
+            'selected': rank < top_k,
+            'decided': decided,
+        })
+    return {
+        'top_k': top_k,
+        'metric': metric,
+        'confidence': confidence,
+        'initial_runs': initial_runs,
+        'max_runs': max_runs,
+        'rounds': rounds,
+        'simulations': simulations,
+        'fixed_simulations': fixed,
+        'saved_simulations': fixed - simulations,
+        'ranking': ranking,
+    }
@@ -0,0 +1,121 @@
+"""丹青模拟器的累计伤害时间线
+
+按固定分辨率在网格时刻 0, r, 2r, ... （以及不对齐时的 max_time）记录各伤害来源的累计伤害，
+某一时刻的值包含恰好发生在该时刻的事件。事件之间只有基础秒伤在变化，所以模拟只推进到
+下一个事件所在的网格点并采样一次，没有事件的网格点沿用上一次的值；基础秒伤与确定性
+周期来源的列最后按闭式解整列填充。
+"""
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def grid_times(resolution: float, max_time: float) -> List[float]:
+    """[0, max_time] 上的网格时刻，max_time 不在网格上时追加在末尾"""
+    if resolution <= 0:
+        raise ValueError("时间线分辨率必须为正数")
+    n = int(math.floor(max_time / resolution + 1e-9)) + 1
+    times = [k * resolution for k in range(n)]
+    times[-1] = min(times[-1], max_time)
+    if max_time - times[-1] > 1e-9:
+        times.append(max_time)
+    return times
+
+
+class TimelineRecorder:
+    """模拟过程中按网格采样伤害明细"""
+
+    __slots__ = ("times", "_starts", "_samples")
+
+    def __init__(self, resolution: float, max_time: float):
+        self.times = grid_times(float(resolution), float(max_time))
+        # 每段的起始网格序号与该段的累计伤害明细，段内各网格点之间没有事件
+        self._starts: List[int] = []
+        self._samples: List[Dict[str, float]] = []
+
+    def record(self, index: int, breakdown: Dict[str, float]):
+        """处理完 times[index]（含）之前的事件后调用：从该网格点起取当前累计值"""
+        if self._starts and self._starts[-1] == index:
+            self._samples[-1] = dict(breakdown)
+        else:
+            self._starts.append(index)
+            self._samples.append(dict(breakdown))
+
+    def finish(self, base_rate: float, analytic_sources: List[tuple]) -> "DamageTimeline":
+        """补上基础秒伤与确定性周期来源的列，返回时间线"""
+        samples = self._samples
+        keys = sorted({k for sample in samples for k in sample} | {'base_dps'} | {src[3] for src in analytic_sources if src[3] is not None})
+        column = {k: j for j, k in enumerate(keys)}
+        values = np.array([[sample.get(k, 0.0) for k in keys] for sample in samples])
+        # 每个网格点属于起始序号不大于它的最后一段
+        lengths = np.diff(np.append(self._starts, len(self.times)))
+        cumulative = np.repeat(values, lengths, axis=0)
+        times = np.asarray(self.times)
+        cumulative[:, column['base_dps']] = base_rate * times
+        for first_time, interval, damage, damage_key, *_ in analytic_sources:
+            if damage_key is None:
+                continue
+            counts = np.maximum(0.0, np.floor((times - first_time) / interval + 1e-9) + 1.0)
+            cumulative[:, column[damage_key]] += damage * counts
+        return DamageTimeline(times, keys, cumulative)
+
+
+class DamageTimeline:
+    """累计伤害时间线：cumulative[i, j] 为 times[i] 时刻（含）之前 keys[j] 造成的累计伤害"""
+
+    def __init__(self, times: np.ndarray, keys: List[str], cumulative: np.ndarray):
+        self.times = times
+        self.keys = keys
+        self.cumulative = cumulative
+        self.total = cumulative.sum(axis=1)
+
+    @property
+    def resolution(self) -> float:
+        return float(self.times[1] - self.times[0]) if len(self.times) > 1 else 0.0
+
+    def damage_at(self, t: float) -> float:
+        """t 时刻之前最近一个网格点的累计总伤害"""
+        index = int(np.searchsorted(self.times, t + 1e-9, side='right')) - 1
+        return float(self.total[max(0, index)])
+
+    def time_to_damage(self, target: float) -> Optional[float]:
+        """累计伤害首次达到 target 的网格时刻（不早于实际时刻，误差不超过分辨率）；整场未达到时返回 None"""
+        index = int(np.searchsorted(self.total, target, side='left'))
+        if index >= len(self.times):
+            return None
+        return float(self.times[index])
+
+    def dps(self, window: float) -> np.ndarray:
+        """各网格时刻向前 window 秒内的平均秒伤（开头不足一个窗口时按已有时长计算）"""
+        resolution = self.resolution
+        if window <= 0 or resolution <= 0:
+            raise ValueError("窗口长度必须为正数")
+        steps = max(1, int(round(window / resolution)))
+        earlier = np.maximum(np.arange(len(self.times)) - steps, 0)
+        elapsed = self.times - self.times[earlier]
+        gained = self.total - self.total[earlier]
+        return np.divide(gained, elapsed, out=np.zeros_like(gained), where=elapsed > 0)
+
+    @classmethod
+    def mean(cls, timelines: List["DamageTimeline"]) -> "DamageTimeline":
+        """同一网格上多条时间线的逐点平均（各条的伤害来源取并集）"""
+        if not timelines:
+            raise ValueError("至少需要一条时间线")
+        times = timelines[0].times
+        keys = sorted({k for tl in timelines for k in tl.keys})
+        column = {k: j for j, k in enumerate(keys)}
+        cumulative = np.zeros((len(times), len(keys)))
+        for tl in timelines:
+            if len(tl.times) != len(times):
+                raise ValueError("时间线的网格不一致")
+            cumulative[:, [column[k] for k in tl.keys]] += tl.cumulative
+        return cls(times, keys, cumulative / len(timelines))
+
+    def to_dict(self) -> dict:
+        """可 JSON 序列化的形式"""
+        return {
+            "resolution": self.resolution,
+            "times": self.times.tolist(),
+            "cumulative": {k: self.cumulative[:, j].tolist() for j, k in enumerate(self.keys)},
+        }
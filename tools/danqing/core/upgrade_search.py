@@ -0,0 +1,198 @@
+"""卡牌升级分配搜索
+
+固定卡组与升级预算，寻找期望 DPS 最高的各卡等级分配（逐卡 card_levels）。
+穷举 7^N 种分配不可行，这里先按单位花费的边际收益贪心升级，再做局部搜索：
+把一级从一张卡挪到另一张卡、或用剩余预算再升一级，有提升就接受，直到没有更好的邻居。
+每一轮的候选分配并行评估；所有分配共用同一组随机流（公共随机数），收益差不受
+随机流不同的噪声影响，评估结果按分配缓存。
+"""
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from tools.danqing.core.cards_sim_ver1 import MAX_CARD_LEVEL, CardValueTable, DanqingEventSimulator, spawn_seeds
+
+# 工作进程的常驻数据（每个进程只创建一次模拟器）
+_UPGRADE_WORKER: dict = {}
+
+
+def _upgrade_worker_init(deck: List[dict], base_atk: float, base_dps: float, base_hp: float, max_time: float, run_seeds: List[int]):
+    """工作进程初始化：创建模拟器并记下卡组与随机流"""
+    _UPGRADE_WORKER['deck'] = deck
+    _UPGRADE_WORKER['ids'] = [card['id'] for card in deck]
+    _UPGRADE_WORKER['simulator'] = DanqingEventSimulator(base_atk, base_dps, base_hp, value_table=CardValueTable(deck))
+    _UPGRADE_WORKER['max_time'] = float(max_time)
+    _UPGRADE_WORKER['run_seeds'] = list(run_seeds)
+
+
+def _upgrade_evaluate(levels: tuple) -> float:
+    """一种等级分配在全部随机流上的平均 DPS"""
+    simulator = _UPGRADE_WORKER['simulator']
+    deck = _UPGRADE_WORKER['deck']
+    card_levels = dict(zip(_UPGRADE_WORKER['ids'], levels))
+    max_time = _UPGRADE_WORKER['max_time']
+    return statistics.fmean(
+        simulator.simulate(deck, max_time=max_time, stop_on_target=False, card_levels=card_levels, rng=random.Random(run_seed))['total_dps']
+        for run_seed in _UPGRADE_WORKER['run_seeds']
+    )
+
+
+class AllocationEvaluator:
+    """等级分配 -> 平均 DPS，结果缓存；workers > 1 时用进程池并行评估一批分配"""
+
+    def __init__(self, deck: List[dict], base_atk: float, base_dps: float, base_hp: float = 200000.0, n_runs: int = 20, max_time: float = 300.0, seed: Optional[int] = None, workers: int = 1):
+        n_runs = int(n_runs)
+        if n_runs <= 0:
+            raise ValueError("n_runs 必须为正整数")
+        # 主种子为 None 时也只派生一次，保证所有分配使用同一组随机流
+        init_args = (list(deck), float(base_atk), float(base_dps), float(base_hp), float(max_time), spawn_seeds(seed, n_runs))
+        self.n_runs = n_runs
+        self.cache: Dict[tuple, float] = {}
+        self._executor = None
+        if int(workers or 1) > 1:
+            self._executor = ProcessPoolExecutor(max_workers=int(workers), initializer=_upgrade_worker_init, initargs=init_args)
+        else:
+            _upgrade_worker_init(*init_args)
+
+    def evaluate(self, allocations: Sequence[tuple]) -> List[float]:
+        """一批分配的平均 DPS（未缓存的去重后一起评估）"""
+        pending = list(dict.fromkeys(a for a in allocations if a not in self.cache))
+        if pending:
+            if self._executor is None:
+                values = [_upgrade_evaluate(a) for a in pending]
+            else:
+                chunksize = max(1, len(pending) // (4 * self._executor._max_workers))
+                values = list(self._executor.map(_upgrade_evaluate, pending, chunksize=chunksize))
+            self.cache.update(zip(pending, values))
+        return [self.cache[a] for a in allocations]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def _level_cost(level_costs: Sequence[float], level: int) -> float:
+    """从 level 升到 level + 1 的花费"""
+    return float(level_costs[level])
+
+
+def _allocation_cost(levels: tuple, start: tuple, level_costs: Sequence[float]) -> float:
+    return sum(_level_cost(level_costs, k) for lo, hi in zip(start, levels) for k in range(lo, hi))
+
+
+def optimize_upgrades(base_atk: float, base_dps: float, deck: List[dict], budget: float, start_levels: Optional[dict] = None, level_costs: Optional[Sequence[float]] = None, base_hp: float = 200000.0, n_runs: int = 20, max_time: float = 300.0, seed: Optional[int] = None, workers: int = 1, local_search: bool = True, max_moves: int = 50) -> dict:
+    """在升级预算内为固定卡组分配各卡等级，使平均 DPS 最高
+
+    start_levels 为各卡当前等级（缺省为 0），level_costs[k] 为从 k 级升到 k + 1 级的花费
+    （缺省每级花费 1，此时 budget 即可升的总级数）。返回的 path 是从当前等级到最终分配的
+    升级顺序：每一步升哪张卡、升到几级、花费、升级后的 DPS 与这一步的收益。
+    """
+    cards: List[dict] = []
+    seen = set()
+    for card in deck:
+        card_id = card.get('id')
+        if isinstance(card_id, str) and card_id and card_id not in seen:
+            seen.add(card_id)
+            cards.append(card)
+    if not cards:
+        raise ValueError("卡组为空")
+    level_costs = [1.0] * MAX_CARD_LEVEL if level_costs is None else [float(c) for c in level_costs]
+    if len(level_costs) < MAX_CARD_LEVEL or any(c <= 0 for c in level_costs[:MAX_CARD_LEVEL]):
+        raise ValueError(f"level_costs 需要给出 0~{MAX_CARD_LEVEL - 1} 级各自升一级的正数花费")
+    budget = float(budget)
+    if budget < 0:
+        raise ValueError("升级预算不能为负")
+    ids = [card['id'] for card in cards]
+    start_levels = start_levels or {}
+    start = tuple(min(MAX_CARD_LEVEL, max(0, int(start_levels.get(card_id, 0)))) for card_id in ids)
+    n = len(cards)
+    eps = 1e-9
+
+    def upgrades(levels: tuple, spent: float) -> List[tuple]:
+        """在剩余预算内只升一级的邻居：(卡牌序号, 新分配, 花费)"""
+        out = []
+        for i in range(n):
+            if levels[i] < MAX_CARD_LEVEL:
+                cost = _level_cost(level_costs, levels[i])
+                if spent + cost <= budget + eps:
+                    out.append((i, levels[:i] + (levels[i] + 1,) + levels[i + 1:], cost))
+        return out
+
+    def best_step(levels: tuple, dps: float, moves: List[tuple]) -> Optional[tuple]:
+        """单位花费收益最高的一步 (卡牌序号, 新分配, 花费, DPS)；没有正收益时返回 None"""
+        values = evaluator.evaluate([alloc for _, alloc, _ in moves])
+        best = None
+        for (i, alloc, cost), value in zip(moves, values):
+            ratio = (value - dps) / cost
+            if ratio > eps * max(1.0, abs(dps)) and (best is None or ratio > best[0]):
+                best = (ratio, i, alloc, cost, value)
+        return best[1:] if best is not None else None
+
+    evaluator = AllocationEvaluator(cards, base_atk, base_dps, base_hp, n_runs=n_runs, max_time=max_time, seed=seed, workers=workers)
+    try:
+        start_dps = evaluator.evaluate([start])[0]
+
+        # 贪心：每次升单位花费收益最高的卡，直到预算不够或再升级没有收益
+        levels, dps, spent = start, start_dps, 0.0
+        while True:
+            step = best_step(levels, dps, upgrades(levels, spent))
+            if step is None:
+                break
+            _, levels, cost, dps = step
+            spent += cost
+        greedy_levels = levels
+
+        # 局部搜索：把一级从 a 挪到 b，或用剩余预算再升一级
+        moves = 0
+        while local_search and moves < max_moves:
+            candidates = [alloc for _, alloc, _ in upgrades(levels, spent)]
+            for a in range(n):
+                if levels[a] <= start[a]:
+                    continue
+                lowered = levels[:a] + (levels[a] - 1,) + levels[a + 1:]
+                freed = spent - _level_cost(level_costs, levels[a] - 1)
+                candidates.extend(alloc for b, alloc, _ in upgrades(lowered, freed) if b != a)
+            values = evaluator.evaluate(candidates)
+            best = max(range(len(candidates)), key=values.__getitem__, default=None)
+            if best is None or values[best] <= dps + eps * max(1.0, abs(dps)):
+                break
+            levels, dps = candidates[best], values[best]
+            spent = _allocation_cost(levels, start, level_costs)
+            moves += 1
+
+        # 升级顺序：只在通往最终分配的升级里，每次选单位花费收益最高的一步
+        path = []
+        current, current_dps = start, start_dps
+        while current != levels:
+            steps = [(i, current[:i] + (current[i] + 1,) + current[i + 1:], _level_cost(level_costs, current[i])) for i in range(n) if current[i] < levels[i]]
+            values = evaluator.evaluate([alloc for _, alloc, _ in steps])
+            k = max(range(len(steps)), key=lambda j: (values[j] - current_dps) / steps[j][2])
+            i, current, cost = steps[k]
+            path.append({
+                'card_id': ids[i],
+                'card_name': cards[i].get('name', ids[i]),
+                'level': current[i],
+                'cost': cost,
+                'dps': values[k],
+                'gain': values[k] - current_dps,
+            })
+            current_dps = values[k]
+    finally:
+        evaluator.close()
+
+    return {
+        'deck_ids': ids,
+        'budget': budget,
+        'spent': _allocation_cost(levels, start, level_costs),
+        'n_runs': evaluator.n_runs,
+        'start_levels': dict(zip(ids, start)),
+        'start_dps': start_dps,
+        'greedy_levels': dict(zip(ids, greedy_levels)),
+        'levels': dict(zip(ids, levels)),
+        'dps': dps,
+        'local_search_moves': moves,
+        'path': path,
+        'evaluations': len(evaluator.cache),
+    }
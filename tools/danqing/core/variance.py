@@ -0,0 +1,166 @@
+"""丹青模拟器的方差缩减
+
+比较相近的卡组时，独立随机模拟的噪声常常盖过卡组之间的 DPS 差异。这里提供三种手段：
+- 公共随机数：每个触发来源（林峰、上官策、岁兽……）有自己的随机流，由本次模拟的种子和
+  来源名派生；不同卡组用同一组种子时，同一来源取到相同的均匀随机数序列，
+  加减其他卡牌不会打乱它，卡组之间的差值只剩卡组本身造成的部分；
+- 对偶：每个种子再用 1 - u 模拟一遍，两次取平均作为一个样本；
+- 控制变量：每次判定的成功次数减去期望次数 n*p，按来源累加成残差，其期望严格为 0，
+  按样本回归系数从 DPS 中扣掉与残差相关的部分。
+"""
+import bisect
+import math
+import random
+import statistics
+from statistics import NormalDist
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from tools.danqing.core.cards_sim_ver1 import CardValueTable, DanqingEventSimulator, spawn_seeds
+
+
+class StreamedSimulator(DanqingEventSimulator):
+    """每个触发来源独立随机流的模拟器，结果附带各来源的判定残差 proc_residuals
+
+    antithetic 为真时所有均匀随机数取 1 - u。一次模拟的随机性完全由传入的种子或 rng 决定。
+    """
+
+    def __init__(self, base_atk: float, base_dps: float, base_hp: float = 200000.0, value_table: Optional[CardValueTable] = None, analytic: bool = True, queue: str = 'heap', antithetic: bool = False):
+        super().__init__(base_atk, base_dps, base_hp, value_table=value_table, analytic=analytic, binomial=True, queue=queue)
+        self.antithetic = antithetic
+        self._streams: Dict[Optional[str], random.Random] = {}
+        self._stream_seed = 0
+        self.proc_residuals: Dict[str, float] = {}
+
+    def _begin_simulation(self, deck: List[dict], level: int, max_time: float, stop_on_target: bool, card_levels: Optional[dict]) -> tuple:
+        self._streams = {}
+        self._stream_seed = self.rng.getrandbits(64)
+        self.proc_residuals = {}
+        return super()._begin_simulation(deck, level, max_time, stop_on_target, card_levels)
+
+    def _draw_successes(self, n: int, p: float, source: Optional[str] = None) -> int:
+        """从 source 自己的随机流取一个均匀随机数查二项分布累积表，并记下残差"""
+        if n <= 0 or p <= 0.0:
+            return 0
+        if p >= 1.0:
+            return n
+        stream = self._streams.get(source)
+        if stream is None:
+            stream = self._streams[source] = random.Random(f"{self._stream_seed}:{source}")
+        u = stream.random()
+        if self.antithetic:
+            u = 1.0 - u
+        hits = bisect.bisect_right(self._binomial_cdf(n, p), u)
+        key = source or ''
+        self.proc_residuals[key] = self.proc_residuals.get(key, 0.0) + hits - n * p
+        return hits
+
+    def _with_stats(self, base_atk: float, base_dps: float) -> 'StreamedSimulator':
+        return StreamedSimulator(base_atk, base_dps, self.base_hp, value_table=self.value_table, analytic=self.analytic, queue=self.queue, antithetic=self.antithetic)
+
+    def simulate(self, deck: List[dict], *args, **kwargs) -> dict:
+        result = super().simulate(deck, *args, **kwargs)
+        result['proc_residuals'] = dict(self.proc_residuals)
+        return result
+
+
+def control_variate_adjust(samples: List[float], controls: List[Dict[str, float]]) -> List[float]:
+    """用期望为 0 的控制变量修正样本：减去按最小二乘回归得到的 beta · 控制变量
+
+    有效来源（样本间有变化的列）太多时合并为一列总残差；样本不足以估计系数时原样返回。
+    """
+    n = len(samples)
+    keys = sorted({k for c in controls for k in c})
+    if n < 3 or not keys:
+        return list(samples)
+    x = np.array([[c.get(k, 0.0) for k in keys] for c in controls])
+    x = x[:, x.std(axis=0) > 1e-12]
+    if x.shape[1] == 0:
+        return list(samples)
+    if x.shape[1] > n - 2:
+        x = x.sum(axis=1, keepdims=True)
+    y = np.asarray(samples, dtype=float)
+    beta = np.linalg.lstsq(x - x.mean(axis=0), y - y.mean(), rcond=None)[0]
+    return (y - x @ beta).tolist()
+
+
+def _stderr(values: List[float]) -> float:
+    return statistics.stdev(values) / math.sqrt(len(values)) if len(values) > 1 else float('inf')
+
+
+def rank_decks(decks: List[List[dict]], n_runs: int, base_atk: float, base_dps: float, base_hp: float = 200000.0, value_table: Optional[CardValueTable] = None, level: int = 6, max_time: float = 300.0, seed: Optional[int] = None, card_levels: Optional[dict] = None, stop_on_target: bool = False, crn: bool = True, antithetic: bool = True, control_variates: bool = True) -> dict:
+    """按平均 DPS（stop_on_target 为真时为 deck_dps，否则 total_dps）给卡组排名，附带排名置信度
+
+    每个卡组模拟 n_runs 次。crn 为真时所有卡组共用同一组种子与按来源划分的随机流，
+    排名相邻的两个卡组按同种子样本的差值估计误差；否则每个卡组用各自独立的种子
+    （即不做方差缩减的普通做法）。antithetic 把每两次模拟配成一对对偶样本（n_runs 需为偶数）。
+    每个卡组的 confidence 为它的期望 DPS 高于排在它后面一名的概率（正态近似）。
+    """
+    n_runs = int(n_runs)
+    if n_runs <= 0:
+        raise ValueError("n_runs 必须为正整数")
+    if antithetic and n_runs % 2:
+        raise ValueError("对偶抽样时 n_runs 需为偶数")
+    if not decks:
+        raise ValueError("至少需要一个卡组")
+    metric = 'deck_dps' if stop_on_target else 'total_dps'
+    n_units = n_runs // 2 if antithetic else n_runs
+    streamed = crn or antithetic or control_variates
+    if streamed:
+        sims = [StreamedSimulator(base_atk, base_dps, base_hp, value_table=value_table, antithetic=flip) for flip in ((False, True) if antithetic else (False,))]
+    else:
+        sims = [DanqingEventSimulator(base_atk, base_dps, base_hp, value_table=value_table)]
+    shared_seeds = spawn_seeds(seed, n_units)
+    deck_seeds = random.Random(seed)
+
+    entries = []
+    for index, deck in enumerate(decks):
+        unit_seeds = shared_seeds if crn else spawn_seeds(deck_seeds.getrandbits(64), n_units)
+        raw: List[float] = []
+        controls: List[Dict[str, float]] = []
+        for unit_seed in unit_seeds:
+            values = []
+            residuals: Dict[str, float] = {}
+            for sim in sims:
+                result = sim.simulate(deck, level=level, max_time=max_time, stop_on_target=stop_on_target, card_levels=card_levels, rng=random.Random(unit_seed))
+                values.append(result[metric])
+                for k, v in result.get('proc_residuals', {}).items():
+                    residuals[k] = residuals.get(k, 0.0) + v / len(sims)
+            raw.append(statistics.fmean(values))
+            controls.append(residuals)
+        adjusted = control_variate_adjust(raw, controls) if control_variates else raw
+        entries.append({
+            'index': index,
+            'deck_ids': [card.get('id') for card in deck],
+            'mean': statistics.fmean(adjusted),
+            'stderr': _stderr(adjusted),
+            'raw_mean': statistics.fmean(raw),
+            'raw_stderr': _stderr(raw),
+            '_samples': adjusted,
+        })
+
+    entries.sort(key=lambda e: e['mean'], reverse=True)
+    normal = NormalDist()
+    for upper, lower in zip(entries, entries[1:]):
+        if crn:
+            gap_se = _stderr([a - b for a, b in zip(upper['_samples'], lower['_samples'])])
+        else:
+            gap_se = math.hypot(upper['stderr'], lower['stderr'])
+        gap = upper['mean'] - lower['mean']
+        upper['gap_stderr'] = gap_se
+        upper['confidence'] = normal.cdf(gap / gap_se) if gap_se > 0 else (1.0 if gap > 0 else 0.5)
+    entries[-1]['gap_stderr'] = None
+    entries[-1]['confidence'] = None
+    for entry in entries:
+        del entry['_samples']
+    return {
+        'n_runs': n_runs,
+        'seed': seed,
+        'metric': metric,
+        'crn': crn,
+        'antithetic': antithetic,
+        'control_variates': control_variates,
+        'simulations': n_runs * len(decks),
+        'ranking': entries,
+    }
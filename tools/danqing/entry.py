@@ -2,6 +2,7 @@ import os
 import sys
 
 _VER1_MODULE = None
+_ENGINE_VERSION = None
 
 
 def _runtime_root() -> str:
@@ -22,42 +23,33 @@ def _load_ver1_module():
     _VER1_MODULE = mod
     return mod
 
-def load_cards_export() -> dict:
+def _cards_export_path() -> str:
     local_json = os.path.join(_runtime_root(), "tools", "danqing", "data", "cards_export.json")
     if not os.path.exists(local_json):
         local_json = os.path.abspath(os.path.join(os.path.dirname(__file__), "data", "cards_export.json"))
-    if not os.path.exists(local_json):
-        raise FileNotFoundError(f"找不到数据文件: {local_json}")
-    import json
-    with open(local_json, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    if not isinstance(data, dict):
-        raise ValueError("cards_export.json 格式不正确：根节点应为对象")
-    cards = data.get("cards")
-    if not isinstance(cards, list) or not cards:
-        raise ValueError("cards_export.json 格式不正确：缺少 cards 数组或为空")
-    return data
+    return local_json
+
+def load_card_catalog():
+    """进程内共享的卡牌目录（数据文件变化后自动重新读取）"""
+    from tools.danqing.core.catalog import CardCatalog
+
+    return CardCatalog.load(_cards_export_path())
+
+def load_cards_export() -> dict:
+    return load_card_catalog().export()
 
 def _load_cards_data():
-    data = load_cards_export()
-    cards = data.get('cards') or []
-    out = {}
-    for c in cards:
-        if not isinstance(c, dict):
-            continue
-        cid = c.get('id')
-        if not isinstance(cid, str) or not cid:
-            continue
-        out[cid] = c
-    if not out:
-        raise ValueError("cards_export.json 中没有可用的卡牌数据")
-    return out
+    return load_card_catalog().by_id
+
+def build_value_table(cards):
+    mod = _load_ver1_module()
+    return mod.CardValueTable([c for c in (cards or []) if isinstance(c, dict)])
 
 def run_demo():
     mod = _load_ver1_module()
-    cards_map = _load_cards_data()
-    deck_cards = [cards_map["yanhong"]]
-    sim = mod.DanqingEventSimulator(10000.0, 50000.0, 200000.0)
+    catalog = load_card_catalog()
+    deck_cards = [catalog.by_id["yanhong"]]
+    sim = mod.DanqingEventSimulator(10000.0, 50000.0, 200000.0, value_table=catalog.value_table)
     result = sim.simulate(deck_cards, level=6, max_time=60.0, seed=42, stop_on_target=False, card_levels={})
     return {
         "dps": int((result.get("total_damage") or 0) / (result.get("combat_time") or 60)),
@@ -65,28 +57,254 @@ def run_demo():
         "details": result.get("damage_breakdown")
     }
 
-def run(deck_ids, level=6, base_atk=10000.0, base_hp=200000.0, base_dps=50000.0, max_time=180.0, seed=None):
-    mod = _load_ver1_module()
-    cards_map = _load_cards_data()
+def _engine_version() -> str:
+    global _ENGINE_VERSION
+    if _ENGINE_VERSION is None:
+        from tools.danqing.cache import engine_version
+
+        _ENGINE_VERSION = engine_version()
+    return _ENGINE_VERSION
+
+def run(deck_ids, level=6, base_atk=10000.0, base_hp=200000.0, base_dps=50000.0, max_time=180.0, seed=None, runs=1, card_levels=None, cache=None, steady_state=False, timeline=None, n_targets=1, ci_stop=None, backend="event"):
+    """运行模拟；传入 cache（ResultCache）且指定 seed 时，相同参数直接返回缓存结果
+
+    steady_state 为真时伤害收敛后按稳态外推剩余时长，结果中的 steady_state 给出检测时刻与误差界。
+    timeline 为分辨率（秒）时结果附带累计伤害时间线（多次模拟时为平均值），不能与 steady_state 同时使用。
+    n_targets > 1 时按多目标模式模拟（范围效果命中所有目标，结果为伤害总和），不能与 steady_state 同时使用。
+    ci_stop（如 0.01）在多次模拟时生效：DPS 均值的 95% 置信区间半宽不超过均值的该比例即停止，runs 为上限。
+    backend="lockstep" 时多次模拟改用锁步向量化后端（只保证分布与事件引擎一致，不支持多目标、稳态外推、时间线与 ci_stop）。
+    """
+    key = None
+    if cache is not None and seed is not None:
+        from tools.danqing.cache import make_cache_key
+
+        key = make_cache_key({
+            "deck_ids": deck_ids, "level": level, "card_levels": card_levels,
+            "base_atk": base_atk, "base_hp": base_hp, "base_dps": base_dps,
+            "max_time": max_time, "seed": int(seed), "runs": max(1, int(runs or 1)),
+            "engine": _engine_version(), "cards": load_card_catalog().digest,
+            "steady_state": bool(steady_state),
+            "timeline": timeline,
+            "n_targets": n_targets,
+            "ci_stop": ci_stop,
+            "backend": backend,
+        })
+        cached = cache.get(key)
+        if cached is not None:
+            cached["deck"] = [str(x).strip() for x in deck_ids if str(x).strip()]
+            cached["cached"] = True
+            return cached
+    result = _run_uncached(deck_ids, level, base_atk, base_hp, base_dps, max_time, seed, runs, card_levels, steady_state, timeline, n_targets, ci_stop, backend)
+    if key is not None:
+        cache.put(key, result)
+    return result
+
+def _resolve_deck(deck_ids, cards_map):
     raw_ids = [str(x).strip() for x in (deck_ids or []) if str(x).strip()]
     if not raw_ids:
         raise ValueError("请先输入卡组ID（用英文逗号分隔）")
     unknown = [cid for cid in raw_ids if cid not in cards_map]
-    deck_cards = [cards_map[cid] for cid in raw_ids if cid in cards_map]
+    # 卡组是无序的：按ID排序后模拟，同一组卡不论输入顺序在相同种子下结果一致（缓存键也按排序后的ID计算）
+    deck_cards = [cards_map[cid] for cid in sorted(raw_ids) if cid in cards_map]
     if not deck_cards:
         raise ValueError(f"没有找到任何有效卡牌ID：{', '.join(unknown[:12])}{'…' if len(unknown) > 12 else ''}")
-    sim = mod.DanqingEventSimulator(float(base_atk), float(base_dps), float(base_hp))
-    result = sim.simulate(deck_cards, level=int(level), max_time=float(max_time), seed=seed, stop_on_target=False, card_levels={})
+    return raw_ids, unknown, deck_cards
+
+def stat_sweep(deck_ids, atk_values, dps_values, level=6, base_hp=200000.0, max_time=180.0, seed=None, runs=1, card_levels=None, step=1000.0):
+    """一次模拟换算整张 (攻击, 基础秒伤) 网格的 DPS，并给出每 step 点属性的 DPS 收益"""
+    mod = _load_ver1_module()
+    catalog = load_card_catalog()
+    raw_ids, unknown, deck_cards = _resolve_deck(deck_ids, catalog.by_id)
+    sim = mod.DanqingEventSimulator(1.0, 1.0, float(base_hp), value_table=catalog.value_table)
+    profile = sim.linear_profile(deck_cards, level=int(level), max_time=float(max_time), seed=seed, card_levels=dict(card_levels or {}), n_runs=max(1, int(runs or 1)))
+    atk_values = [float(x) for x in (atk_values or [])]
+    dps_values = [float(x) for x in (dps_values or [])]
+    return {
+        "deck": raw_ids,
+        "level": int(level),
+        "unknown": unknown,
+        "runs": max(1, int(runs or 1)),
+        "combat_time": profile.combat_time,
+        "atk_values": atk_values,
+        "dps_values": dps_values,
+        "dps_grid": [[int(v) for v in row] for row in profile.sweep(atk_values, dps_values)],
+        "stat_weights": profile.stat_weights(step),
+        "dps_per_atk": {k: v / profile.combat_time for k, v in profile.atk_coefficients.items()} if profile.combat_time > 0 else {},
+    }
+
+def horizon_sweep(deck_ids, horizons=(60.0, 120.0, 180.0, 300.0), level=6, base_atk=10000.0, base_hp=200000.0, base_dps=50000.0, seed=None, runs=1, card_levels=None):
+    """同一卡组在多个战斗时长下的 DPS：每个随机流只推进一遍，依次取各时长的结果"""
+    mod = _load_ver1_module()
+    catalog = load_card_catalog()
+    raw_ids, unknown, deck_cards = _resolve_deck(deck_ids, catalog.by_id)
+    sim = mod.DanqingEventSimulator(float(base_atk), float(base_dps), float(base_hp), value_table=catalog.value_table)
+    horizons = [float(h) for h in (horizons or [])]
+    runs = max(1, int(runs or 1))
+    run_seeds = mod.spawn_seeds(seed, runs) if runs > 1 else [seed]
+    samples = [[] for _ in horizons]
+    for run_seed in run_seeds:
+        results = sim.simulate_horizons(deck_cards, horizons, level=int(level), seed=run_seed, card_levels=dict(card_levels or {}))
+        for column, result in zip(samples, results):
+            column.append((result.get("total_damage") or 0) / result["combat_time"] if result.get("combat_time") else 0.0)
+    out = {
+        "deck": raw_ids,
+        "level": int(level),
+        "unknown": unknown,
+        "runs": runs,
+        "horizons": horizons,
+        "dps": [int(sum(column) / len(column)) for column in samples],
+    }
+    if runs > 1:
+        out["dps_stats"] = [{k: int(v) for k, v in mod.summarize_samples(column).items() if k in ("stdev", "p5", "p50", "p95")} for column in samples]
+    return out
+
+def ttk_sweep(deck_ids, targets, level=6, base_atk=10000.0, base_hp=200000.0, base_dps=50000.0, max_time=300.0, seed=None, runs=1, card_levels=None, resolution=0.1):
+    """多个目标血量的击杀时间分布（秒）：每次模拟记录一条累计伤害曲线，从中读出全部目标"""
+    mod = _load_ver1_module()
+    catalog = load_card_catalog()
+    raw_ids, unknown, deck_cards = _resolve_deck(deck_ids, catalog.by_id)
+    sim = mod.DanqingEventSimulator(float(base_atk), float(base_dps), float(base_hp), value_table=catalog.value_table)
+    runs = max(1, int(runs or 1))
+    dist = sim.ttk_distribution(deck_cards, [float(x) for x in (targets or [])], runs, level=int(level), max_time=float(max_time), seed=seed, card_levels=dict(card_levels or {}), resolution=float(resolution))
+    return {
+        "deck": raw_ids,
+        "level": int(level),
+        "unknown": unknown,
+        "runs": runs,
+        "max_time": float(max_time),
+        "resolution": dist["resolution"],
+        "targets": dist["targets"],
+        "ttk": dist["ttk"],
+    }
+
+def upgrade_plan(deck_ids, budget, start_levels=None, level_costs=None, base_atk=10000.0, base_hp=200000.0, base_dps=50000.0, max_time=180.0, seed=None, runs=20, workers=1):
+    """在升级预算内为卡组分配各卡等级：返回最终等级与逐步升级顺序（每步升哪张卡及 DPS 收益）"""
+    from tools.danqing.core.upgrade_search import optimize_upgrades
+
+    catalog = load_card_catalog()
+    raw_ids, unknown, deck_cards = _resolve_deck(deck_ids, catalog.by_id)
+    res = optimize_upgrades(float(base_atk), float(base_dps), deck_cards, float(budget), start_levels=dict(start_levels or {}), level_costs=level_costs, base_hp=float(base_hp), n_runs=max(1, int(runs or 1)), max_time=float(max_time), seed=seed, workers=max(1, int(workers or 1)))
+    return {
+        "deck": raw_ids,
+        "unknown": unknown,
+        "runs": res["n_runs"],
+        "budget": res["budget"],
+        "spent": res["spent"],
+        "start_levels": res["start_levels"],
+        "levels": res["levels"],
+        "start_dps": int(res["start_dps"]),
+        "dps": int(res["dps"]),
+        "path": [dict(step, dps=int(step["dps"]), gain=int(step["gain"])) for step in res["path"]],
+    }
+
+def rank_decks(deck_id_lists, level=6, base_atk=10000.0, base_hp=200000.0, base_dps=50000.0, max_time=180.0, seed=None, runs=32, card_levels=None):
+    """多个卡组按平均 DPS 排名：公共随机数 + 对偶 + 控制变量，附带每个卡组高于下一名的置信度"""
+    from tools.danqing.core.variance import rank_decks as rank
+
+    catalog = load_card_catalog()
+    resolved = [_resolve_deck(deck_ids, catalog.by_id) for deck_ids in (deck_id_lists or [])]
+    runs = max(2, int(runs or 2))
+    res = rank([deck_cards for _, _, deck_cards in resolved], runs + runs % 2, float(base_atk), float(base_dps), float(base_hp), value_table=catalog.value_table, level=int(level), max_time=float(max_time), seed=seed, card_levels=dict(card_levels or {}))
+    return {
+        "level": int(level),
+        "runs": res["n_runs"],
+        "ranking": [{
+            "deck": resolved[e["index"]][0],
+            "unknown": resolved[e["index"]][1],
+            "dps": int(e["mean"]),
+            "stderr": round(e["stderr"], 1),
+            "confidence": e["confidence"],
+        } for e in res["ranking"]],
+    }
+
+def race_decks(deck_id_lists, top_k=3, level=6, base_atk=10000.0, base_hp=200000.0, base_dps=50000.0, max_time=180.0, seed=None, initial_runs=4, max_runs=64, card_levels=None):
+    """赛跑式选出平均 DPS 最高的 top_k 个卡组：只给与入选边界分不开的卡组追加模拟，附带节省的模拟次数"""
+    from tools.danqing.core.racing import race_decks as race
+
+    catalog = load_card_catalog()
+    resolved = [_resolve_deck(deck_ids, catalog.by_id) for deck_ids in (deck_id_lists or [])]
+    res = race([deck_cards for _, _, deck_cards in resolved], int(top_k), float(base_atk), float(base_dps), float(base_hp), value_table=catalog.value_table, level=int(level), max_time=float(max_time), seed=seed, card_levels=dict(card_levels or {}), initial_runs=int(initial_runs), max_runs=int(max_runs))
     return {
+        "level": int(level),
+        "top_k": res["top_k"],
+        "simulations": res["simulations"],
+        "fixed_simulations": res["fixed_simulations"],
+        "saved_simulations": res["saved_simulations"],
+        "ranking": [{
+            "deck": resolved[e["index"]][0],
+            "unknown": resolved[e["index"]][1],
+            "runs": e["runs"],
+            "dps": int(e["mean"]),
+            "ci_half_width": round(e["half_width"], 1),
+            "selected": e["selected"],
+            "decided": e["decided"],
+        } for e in res["ranking"]],
+    }
+
+def _run_uncached(deck_ids, level, base_atk, base_hp, base_dps, max_time, seed, runs, card_levels, steady_state=False, timeline=None, n_targets=1, ci_stop=None, backend="event"):
+    mod = _load_ver1_module()
+    catalog = load_card_catalog()
+    raw_ids, unknown, deck_cards = _resolve_deck(deck_ids, catalog.by_id)
+    n_targets = max(1, int(n_targets or 1))
+    runs = max(1, int(runs or 1))
+    if backend not in ("event", "lockstep"):
+        raise ValueError(f"未知的模拟后端: {backend}")
+    if backend == "lockstep" and runs > 1:
+        if n_targets > 1:
+            raise ValueError("锁步后端不支持多目标模式")
+        from tools.danqing.core.lockstep import LockstepSimulator
+
+        sim = LockstepSimulator(float(base_atk), float(base_dps), float(base_hp), value_table=catalog.value_table)
+    elif n_targets > 1:
+        from tools.danqing.core.multi_target import MultiTargetSimulator
+
+        sim = MultiTargetSimulator(float(base_atk), float(base_dps), float(base_hp), value_table=catalog.value_table, n_targets=n_targets)
+    else:
+        sim = mod.DanqingEventSimulator(float(base_atk), float(base_dps), float(base_hp), value_table=catalog.value_table)
+    detector = mod.SteadyStateDetector() if steady_state else None
+    if runs > 1:
+        batch = sim.simulate_batch(deck_cards, runs, level=int(level), max_time=float(max_time), seed=seed, stop_on_target=False, card_levels=dict(card_levels or {}), steady_state=detector, timeline=timeline, ci_stop=float(ci_stop) if ci_stop else None)
+        stats = batch.get("dps") or {}
+        out = {
+            "deck": raw_ids,
+            "level": int(level),
+            "base_atk": float(base_atk),
+            "base_hp": float(base_hp),
+            "base_dps": float(base_dps),
+            "unknown": unknown,
+            "runs": int(batch.get("n_runs") or runs),
+            "n_targets": n_targets,
+            "dps": int(stats.get("mean") or 0),
+            "dps_stats": {k: int(stats.get(k) or 0) for k in ("stdev", "p5", "p50", "p95")},
+            "combat_time": float(batch.get("combat_time") or max_time),
+            "total_cost": int(batch.get("total_cost") or 0),
+            "events": batch.get("event_counts"),
+            "details": batch.get("damage_breakdown")
+        }
+        if detector is not None:
+            out["steady_state"] = batch.get("steady_state")
+        if "ci_stop" in batch:
+            out["ci_stop"] = batch["ci_stop"]
+        if timeline is not None:
+            out["timeline"] = batch["timeline"].to_dict()
+        return out
+    result = sim.simulate(deck_cards, level=int(level), max_time=float(max_time), seed=seed, stop_on_target=False, card_levels=dict(card_levels or {}), steady_state=detector, timeline=timeline)
+    out = {
         "deck": raw_ids,
         "level": int(level),
         "base_atk": float(base_atk),
         "base_hp": float(base_hp),
         "base_dps": float(base_dps),
         "unknown": unknown,
+        "n_targets": n_targets,
         "dps": int((result.get("total_damage") or 0) / (result.get("combat_time") or max_time)),
         "combat_time": float(result.get("combat_time") or max_time),
         "total_cost": int(result.get("total_cost") or 0),
         "events": result.get("event_counts"),
         "details": result.get("damage_breakdown")
     }
+    if detector is not None:
+        out["steady_state"] = result.get("steady_state")
+    if timeline is not None:
+        out["timeline"] = result["timeline"].to_dict()
+    return out